@@ -0,0 +1,81 @@
+# Benchmark the bytes transferred by ORM queries with and without column deferral
+#
+# Queries a sample of ds_generated_review_final rows through the ORM twice:
+# loading every column (as before the large columns were deferred) and with
+# the default deferred loading, optionally undeferring some column groups.
+# The payload of the returned rows and the time taken are reported.
+#
+# Usage (from the repository root, with the db_* variables of the .env file):
+#   python benchmarks/bench_column_deferral.py [--rows 1000] [--groups review]
+
+from dotenv import load_dotenv
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy.orm import undefer
+from sqlalchemy import select
+from utils.db_utils import DatabaseConnection
+from models import DS_Generated_Review_Final, load_column_groups
+
+def payload_size(entities) -> int:
+    '''
+    Compute the size in bytes of the column values loaded into the entities returned by a query.
+    Deferred columns that were not loaded are missing from the __dict__ of each entity.
+
+    :param entities: The ORM entities returned by the query
+
+    :return: The number of bytes
+    '''
+    size = 0
+    for entity in entities:
+        for key, value in entity.__dict__.items():
+            if key != '_sa_instance_state' and value is not None:
+                size += len(str(value).encode('utf-8'))
+    return size
+
+def measure(db: DatabaseConnection, options: list, limit: int) -> tuple[int, float]:
+    '''
+    Run the query with the given loader options
+
+    :param db: The database connection
+    :param options: The loader options
+    :param limit: The number of rows
+
+    :return: The payload size in bytes and the time taken in seconds
+    '''
+    with db.SessionLocal() as session:
+        statement = select(DS_Generated_Review_Final).options(*options).order_by(DS_Generated_Review_Final.sha).limit(limit)
+        start = time.perf_counter()
+        entities = session.scalars(statement).all()
+        elapsed = time.perf_counter() - start
+        return payload_size(entities), elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark column deferral on ds_generated_review_final')
+    parser.add_argument('--rows', type=int, default=1000, help='Number of rows queried')
+    parser.add_argument('--groups', nargs='*', default=[], help='Column groups loaded in the deferred query')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = DatabaseConnection(
+        db_host=os.getenv('db_host'),
+        db_user=os.getenv('db_user'),
+        db_password=os.getenv('db_password'),
+        db_port=os.getenv('db_port'),
+        db_name=os.getenv('db_name')
+    )
+
+    before, before_time = measure(db, [undefer('*')], args.rows)
+    after, after_time = measure(db, load_column_groups(*args.groups), args.rows)
+
+    print(f'All columns:         {before / 1024:.1f} KiB in {before_time:.3f}s')
+    print(f'Deferred {args.groups or "(none)"}: {after / 1024:.1f} KiB in {after_time:.3f}s')
+    if before:
+        print(f'Transferred {100 * after / before:.1f}% of the bytes')
+
+if __name__ == '__main__':
+    main()
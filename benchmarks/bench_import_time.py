@@ -0,0 +1,77 @@
+# Check the startup cost of the lightweight entry points
+#
+# Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+# `utils` and `filter`, reports the cumulative import time and fails if it is
+# over the budget or if a heavy dependency that should only be imported on
+# demand (database, HTTP clients, LLM providers) was pulled in.
+#
+# Usage (from the repository root):
+#   python benchmarks/bench_import_time.py [--budget-ms 300] [--repeat 3]
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MODULES = ['utils', 'filter']
+
+# Top-level packages that must not be imported by `import utils` / `import filter`
+FORBIDDEN = [
+    'sqlalchemy', 'psycopg2', 'aiohttp', 'requests',
+    'transformers', 'torch', 'bitsandbytes', 'accelerate', 'openai', 'anthropic',
+]
+
+def import_time(module: str) -> tuple[float, set[str]]:
+    '''
+    Import a module in a fresh interpreter with -X importtime
+
+    :param module: The module to import
+
+    :return: The cumulative import time of the module in milliseconds and the
+             set of top-level packages imported
+    '''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+
+    cumulative = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = [part.strip() for part in line[len('import time:'):].split('|')]
+        if not parts[0].isdigit():
+            continue
+        name = parts[2]
+        imported.add(name.split('.')[0])
+        if name == module:
+            cumulative = int(parts[1]) / 1000
+    return cumulative, imported
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time of utils and filter')
+    parser.add_argument('--budget-ms', type=float, default=300, help='Maximum cumulative import time per module')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per module, the best one is kept')
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        runs = [import_time(module) for _ in range(args.repeat)]
+        best = min(ms for ms, _ in runs)
+        heavy = sorted(set(FORBIDDEN) & runs[0][1])
+        status = 'ok' if best <= args.budget_ms and not heavy else 'FAIL'
+        print(f'import {module}: {best:.1f}ms (budget {args.budget_ms:.0f}ms) {status}')
+        if heavy:
+            print(f'  imports {", ".join(heavy)} eagerly')
+        failed = failed or status == 'FAIL'
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
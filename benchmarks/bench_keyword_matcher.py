@@ -0,0 +1,80 @@
+# Benchmark the single-pass KeywordMatcher against filter.contains_keyword
+#
+# A synthetic corpus of commit messages is generated from a fixed vocabulary
+# with a fraction of the messages containing one or more security keywords.
+# Both implementations classify the same corpus, the results are compared and
+# the time taken by each one is reported.
+#
+# Usage (from the repository root):
+#   python benchmarks/bench_keyword_matcher.py [--messages 1000000] [--seed 0]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from filter import KeywordMatcher, contains_keyword, get_all_security_keywords_files, get_security_keywords
+
+VOCABULARY = [
+    'fix', 'update', 'refactor', 'add', 'remove', 'test', 'tests', 'build', 'docs', 'readme',
+    'parser', 'handler', 'request', 'response', 'client', 'server', 'cache', 'config', 'null',
+    'pointer', 'exception', 'logging', 'bump', 'version', 'merge', 'branch', 'pull', 'typo',
+    'cleanup', 'method', 'class', 'field', 'user', 'input', 'output', 'stream', 'thread',
+]
+
+def generate_corpus(amount: int, keywords: list[str], seed: int = 0, keyword_ratio: float = 0.1) -> list[str]:
+    '''
+    Generate a synthetic corpus of commit messages
+
+    :param amount: The number of messages to generate
+    :param keywords: The security keywords to sprinkle into the messages
+    :param seed: The seed for the random generator
+    :param keyword_ratio: The fraction of messages that contain at least one keyword
+
+    :return: A list of commit messages
+    '''
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(amount):
+        words = rng.choices(VOCABULARY, k=rng.randint(4, 40))
+        if rng.random() < keyword_ratio:
+            for _ in range(rng.randint(1, 3)):
+                words.insert(rng.randrange(len(words) + 1), rng.choice(keywords).upper() if rng.random() < 0.2 else rng.choice(keywords))
+        corpus.append(' '.join(words).capitalize())
+    return corpus
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark KeywordMatcher against contains_keyword')
+    parser.add_argument('--messages', type=int, default=1_000_000, help='Number of synthetic commit messages')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic corpus')
+    parser.add_argument('--path', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'), help='Folder with the security_keywords_*.txt files')
+    args = parser.parse_args()
+
+    keywords = []
+    for f in sorted(get_all_security_keywords_files(args.path)):
+        keywords.extend(get_security_keywords(os.path.join(args.path, f)))
+
+    corpus = generate_corpus(args.messages, [k for k in keywords if k], seed=args.seed)
+    print(f'{len(corpus)} messages, {len(keywords)} keywords')
+
+    start = time.perf_counter()
+    expected = [contains_keyword(message, keywords) for message in corpus]
+    legacy_time = time.perf_counter() - start
+    print(f'contains_keyword: {legacy_time:.2f}s')
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(keywords)
+    results = [matcher.match(message) for message in corpus]
+    matcher_time = time.perf_counter() - start
+    print(f'KeywordMatcher:   {matcher_time:.2f}s (x{legacy_time / matcher_time:.1f})')
+
+    mismatches = sum(1 for a, b in zip(expected, results) if a != b)
+    print(f'Matches: {sum(1 for found, _ in results if found)}, mismatches: {mismatches}')
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
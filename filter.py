@@ -1,3 +1,9 @@
+from collections import deque
+from itertools import islice
+from typing import Iterable, Iterator
+import multiprocessing
+import threading
+import json
 import os
 import re
 
@@ -21,6 +27,93 @@ def contains_keyword(message: str, security_keywords: list) -> tuple[bool, list[
             keywords.append(keyword)
     return len(keywords) > 0, keywords
 
+class KeywordMatcher:
+    '''
+    Match a fixed list of security keywords against commit messages in a single pass.
+
+    The keywords are compiled once into one trie-shaped regex wrapped in a lookahead, so every
+    position where any keyword starts is found in a single scan of the lowercased message.
+    Only the keywords sharing the first character of a hit are then checked, which keeps
+    overlapping keywords (e.g. "stack overflow" and "overflow") reported exactly like
+    contains_keyword does.
+    '''
+
+    def __init__(self, security_keywords: list[str]):
+        '''
+        Build the matcher
+
+        :param security_keywords: The list of security keywords, as returned by get_security_keywords
+        '''
+        self.keywords = list(security_keywords)
+        self._empty = []
+        self._candidates = {}
+        patterns = {}
+        for index, keyword in enumerate(self.keywords):
+            lowered = keyword.lower()
+            if lowered == '':
+                # r'\b\b' matches any message with a word boundary
+                self._empty.append(index)
+                continue
+            if lowered not in patterns:
+                patterns[lowered] = (re.compile(r'\b' + re.escape(lowered) + r'\b'), [])
+                self._candidates.setdefault(lowered[0], []).append(patterns[lowered])
+            patterns[lowered][1].append(index)
+
+        self._scanner = re.compile(r'(?=\b' + self._trie_pattern(patterns) + r'\b)') if patterns else None
+
+    @staticmethod
+    def _trie_pattern(keywords) -> str:
+        '''
+        Build a regular expression equivalent to the alternation of the keywords, factored
+        as a trie so the engine does not retry every keyword at every position.
+
+        :param keywords: The lowercased keywords
+
+        :return: The regular expression source
+        '''
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def build(node: dict) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != '']
+            if not branches:
+                return ''
+            pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            return '(?:' + pattern + ')?' if '' in node else pattern
+
+        return build(trie)
+
+    def __call__(self, message: str) -> tuple[bool, list[str]]:
+        return self.match(message)
+
+    def match(self, message: str) -> tuple[bool, list[str]]:
+        '''
+        Check if the commit message contains a security keyword
+
+        :param message: The commit message
+
+        :return: The same tuple contains_keyword returns: a boolean indicating if the message
+                 contains a keyword and the list of keywords found, in keyword-list order
+        '''
+        text = message.lower()
+        found = set()
+        if self._empty and re.search(r'\b', text):
+            found.update(self._empty)
+
+        if self._scanner is not None:
+            for hit in self._scanner.finditer(text):
+                position = hit.start()
+                for pattern, indexes in self._candidates[text[position]]:
+                    if pattern.match(text, position):
+                        found.update(indexes)
+
+        keywords = [self.keywords[i] for i in sorted(found)]
+        return len(keywords) > 0, keywords
+
 def get_security_keywords(file_path: str) -> list[str]:
     '''
     Load security keywords from a file
@@ -44,6 +137,196 @@ def get_all_security_keywords_files(path: str = './') -> list[str]:
     files = os.listdir(path)
     return [f for f in files if f.startswith('security_keywords_') and f.endswith('.txt')]
 
+KEYWORDS_CACHE_FILE = '.security_keywords_cache.json'
+_KEYWORDS_CACHE_VERSION = 2
+_keywords_cache = {}
+
+def _keywords_files_key(path: str) -> list:
+    '''
+    Build the cache key of the security keywords files in a folder: their names, sizes and mtimes
+    '''
+    entries = []
+    for f in sorted(get_all_security_keywords_files(path)):
+        stat = os.stat(os.path.join(path, f))
+        entries.append([f, stat.st_size, stat.st_mtime_ns])
+    return entries
+
+def _merge_security_keywords(path: str, files: list[str]) -> list[str]:
+    '''
+    Merge the keywords of several files, deduplicated case-insensitively
+
+    :param path: The folder with the security keywords files
+    :param files: The names of the files, in merge order
+
+    :return: The keywords, with the spelling of their first occurrence (e.g. "CVE")
+    '''
+    keywords = {}
+    for f in files:
+        for keyword in get_security_keywords(os.path.join(path, f)):
+            if keyword:
+                keywords.setdefault(keyword.lower(), keyword)
+    return list(keywords.values())
+
+def load_keyword_matcher(path: str = './', cache_file: str = KEYWORDS_CACHE_FILE) -> KeywordMatcher:
+    '''
+    Load the merged security keywords of every security_keywords_*.txt file in a folder
+    as a compiled KeywordMatcher. Keywords are stripped and deduplicated case-insensitively,
+    keeping their original spelling, which is the one reported in the labels.
+
+    The merged keyword list is saved as JSON to cache_file inside the folder with the names,
+    sizes and mtimes of the keyword files, so the files are only read again when one of them
+    is added, removed or modified. The matcher is compiled from it once per process.
+
+    :param path: The folder with the security keywords files
+    :param cache_file: The name of the cache file inside the folder (None disables the disk cache)
+
+    :return: The keyword matcher, its keywords attribute holds the merged keyword list
+    '''
+    key = _keywords_files_key(path)
+    cached = _keywords_cache.get(os.path.abspath(path))
+    if cached and cached[0] == key:
+        return cached[1]
+
+    cache_path = os.path.join(path, cache_file) if cache_file else None
+    keywords = None
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored['version'] == _KEYWORDS_CACHE_VERSION and stored['files'] == key:
+                keywords = stored['keywords']
+        except (OSError, ValueError, KeyError, TypeError):
+            keywords = None
+
+    if keywords is None:
+        keywords = _merge_security_keywords(path, [f for f, _, _ in key])
+
+        if cache_path:
+            # Write then rename, so concurrent workers never read a partial file; the temporary
+            # file is unique per thread, as the threads of a process may load the matcher at once
+            tmp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'version': _KEYWORDS_CACHE_VERSION, 'files': key, 'keywords': keywords}, f)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    matcher = KeywordMatcher(keywords)
+    _keywords_cache[os.path.abspath(path)] = (key, matcher)
+    return matcher
+
+def load_security_keywords(path: str = './', cache_file: str = KEYWORDS_CACHE_FILE) -> list[str]:
+    '''
+    Load the merged and deduplicated security keywords of a folder,
+    using the same cache as load_keyword_matcher
+
+    :param path: The folder with the security keywords files
+    :param cache_file: The name of the cache file inside the folder (None disables the disk cache)
+
+    :return: A list of security keywords
+    '''
+    return list(load_keyword_matcher(path, cache_file).keywords)
+
+def iter_jsonl_messages(file_path: str, sha_field: str = 'sha', message_field: str = 'message') -> Iterator[tuple[str, str]]:
+    '''
+    Lazily read commit messages from a JSONL file
+
+    :param file_path: The path to the JSONL file
+    :param sha_field: The field holding the commit SHA
+    :param message_field: The field holding the commit message
+
+    :return: A generator of (sha, message) tuples
+    '''
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield row[sha_field], row[message_field] or ''
+
+def _as_sha_message(row) -> tuple[str, str]:
+    '''
+    Normalize a row (tuple, DB row or dict) into a (sha, message) tuple
+    '''
+    if isinstance(row, dict):
+        return row['sha'], row['message'] or ''
+    return row[0], row[1] or ''
+
+def _chunked(rows: Iterable, chunk_size: int) -> Iterator[list[tuple[str, str]]]:
+    '''
+    Split an iterable of rows into lists of at most chunk_size (sha, message) tuples
+    '''
+    iterator = iter(rows)
+    while True:
+        chunk = [_as_sha_message(row) for row in islice(iterator, chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+
+_worker_matcher = None
+
+def _init_worker(security_keywords: list[str]):
+    '''
+    Build the matcher once per worker process
+    '''
+    global _worker_matcher
+    _worker_matcher = KeywordMatcher(security_keywords)
+
+def _classify_chunk(chunk: list[tuple[str, str]]) -> list[tuple[str, list[str]]]:
+    '''
+    Classify a chunk of messages inside a worker process
+    '''
+    return [(sha, _worker_matcher.match(message)[1]) for sha, message in chunk]
+
+def classify_messages(rows: Iterable, matcher: KeywordMatcher, processes: int = 1, chunk_size: int = 1000) -> Iterator[tuple[str, list[str]]]:
+    '''
+    Lazily classify commit messages, keeping the input order
+
+    :param rows: An iterable of (sha, message) tuples, DB rows or dicts with 'sha' and 'message'
+    :param matcher: The keyword matcher to use
+    :param processes: The number of worker processes (1 classifies in the current process)
+    :param chunk_size: The number of messages sent to a worker at once
+
+    :return: A generator of (sha, matched_keywords) tuples
+    '''
+    if processes <= 1:
+        for sha, message in map(_as_sha_message, rows):
+            yield sha, matcher.match(message)[1]
+        return
+
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(matcher.keywords,)) as pool:
+        # Bound the chunks in flight so a huge input is never fully materialized
+        pending = deque()
+        for chunk in _chunked(rows, chunk_size):
+            pending.append(pool.apply_async(_classify_chunk, (chunk,)))
+            if len(pending) >= processes * 2:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+def label_commits(db, matcher: KeywordMatcher, processes: int = 1, chunk_size: int = 1000, batch_size: int = 5000, only_unlabeled: bool = False) -> int:
+    '''
+    Classify the messages of ds_commit and store the matched keywords in its keywords column
+
+    :param db: The DatabaseConnection to read from and write to
+    :param matcher: The keyword matcher to use
+    :param processes: The number of worker processes
+    :param chunk_size: The number of messages sent to a worker at once
+    :param batch_size: The number of rows written to the database per bulk update
+    :param only_unlabeled: If True, only the commits with a null keywords column are classified
+
+    :return: The number of commits labeled
+    '''
+    total = 0
+    results = classify_messages(db.iter_commit_messages(only_unlabeled=only_unlabeled), matcher, processes, chunk_size)
+    while True:
+        batch = list(islice(results, batch_size))
+        if not batch:
+            return total
+        db.update_commit_keywords(batch)
+        total += len(batch)
+
 def get_sample_number(amount: int, confidence: int = 95, margin_of_error: float = 0.05) -> int:
     '''
     Calculate the sample size needed for a given amount of data using finite population correction.
@@ -0,0 +1,139 @@
+# Maintenance commands for the dataset database
+#
+# USAGE:
+#   python manageDatabase.py create-indexes
+#   python manageDatabase.py create-vulnerability-fixes
+#   python manageDatabase.py refresh-vulnerability-fixes [--full]
+#   python manageDatabase.py push-reviews --version VFinal [--final --provider P --model M --prompt zero-shot]
+#   python manageDatabase.py pull-reviews --version VFinal [--final --provider P --model M --prompt zero-shot]
+#
+# push-reviews copies the code reviews of LLMs/Results/<version>/<prompt>/<sha>.json
+# into ds_generated_review (or the chosen provider/model/prompt into
+# ds_generated_review_final with --final), and pull-reviews does the opposite.
+# Both stream the rows with COPY and merge them in a single statement.
+#
+# The connection is configured with the same db_* variables of the .env file
+# used by the experiments.
+
+from dotenv import load_dotenv
+from utils.db_utils import DatabaseConnection
+from utils.llms_utils.llms_utils import iter_code_reviews, save_code_reviews, get_model_provider
+import argparse
+import os
+
+def get_database() -> DatabaseConnection:
+    """
+    Connect to the database configured in the environment.
+
+    Returns:
+        DatabaseConnection: The database connection.
+    """
+    load_dotenv()
+    return DatabaseConnection(
+        db_host=os.getenv("db_host"),
+        db_user=os.getenv("db_user"),
+        db_password=os.getenv("db_password"),
+        db_port=os.getenv("db_port"),
+        db_name=os.getenv("db_name")
+    )
+
+def create_indexes(args: argparse.Namespace):
+    """
+    Create the indexes used by the experiments queries.
+    """
+    db = get_database()
+    for index in db.create_indexes():
+        print(f"Index {index} ready")
+
+def create_vulnerability_fixes(args: argparse.Namespace):
+    """
+    Create and fill the summary table of the confirmed vulnerability fixes.
+    """
+    db = get_database()
+    print(f"{db.create_vulnerability_fixes()} vulnerability fixes")
+
+def refresh_vulnerability_fixes(args: argparse.Namespace):
+    """
+    Recompute the vulnerability fixes whose evaluations changed.
+    """
+    db = get_database()
+    print(f"{db.refresh_vulnerability_fixes(full=args.full)} commits refreshed")
+
+def push_reviews(args: argparse.Namespace):
+    """
+    Copy the local code reviews of a version into the database.
+    """
+    db = get_database()
+    if args.final:
+        rows = (
+            (sha, code_review)
+            for sha, provider, model, _, code_review in iter_code_reviews(args.version, args.path, [args.prompt])
+            if provider == args.provider and model == args.model
+        )
+        counts = db.copy_reviews_in(rows, table="ds_generated_review_final")
+    else:
+        rows = (
+            (sha, model, prompt_name, code_review)
+            for sha, _, model, prompt_name, code_review in iter_code_reviews(args.version, args.path, args.prompts)
+        )
+        counts = db.copy_reviews_in(rows, table="ds_generated_review")
+    print(f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['skipped']} skipped")
+
+def pull_reviews(args: argparse.Namespace):
+    """
+    Copy the code reviews of the database into the local results of a version.
+    """
+    db = get_database()
+    if args.final:
+        code_reviews = (
+            (sha, args.provider, args.model, args.prompt, code_review)
+            for sha, code_review in db.copy_reviews_out(table="ds_generated_review_final")
+        )
+    else:
+        code_reviews = (
+            (sha, get_model_provider(model), model, prompt_name, code_review)
+            for sha, model, prompt_name, code_review in db.copy_reviews_out(table="ds_generated_review", prompts=args.prompts)
+        )
+    print(f"{save_code_reviews(code_reviews, args.version, args.path)} code reviews saved")
+
+def add_reviews_arguments(subparser: argparse.ArgumentParser):
+    """
+    Add the arguments shared by push-reviews and pull-reviews.
+    """
+    subparser.add_argument("--version", required=True, help="The version of the experiment")
+    subparser.add_argument("--path", default="LLMs/Results", help="The base path where results are stored")
+    subparser.add_argument("--prompts", nargs="*", help="Only sync these prompts")
+    subparser.add_argument("--final", action="store_true", help="Sync ds_generated_review_final instead of ds_generated_review")
+    subparser.add_argument("--provider", help="The provider of the final reviews (with --final)")
+    subparser.add_argument("--model", help="The model of the final reviews (with --final)")
+    subparser.add_argument("--prompt", help="The prompt of the final reviews (with --final)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance commands for the dataset database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparser = subparsers.add_parser("create-indexes", help="Create the indexes used by the experiments queries")
+    subparser.set_defaults(func=create_indexes)
+
+    subparser = subparsers.add_parser("create-vulnerability-fixes", help="Create and fill the summary table of the vulnerability fixes")
+    subparser.set_defaults(func=create_vulnerability_fixes)
+
+    subparser = subparsers.add_parser("refresh-vulnerability-fixes", help="Recompute the vulnerability fixes whose evaluations changed")
+    subparser.add_argument("--full", action="store_true", help="Recompute every vulnerability fix")
+    subparser.set_defaults(func=refresh_vulnerability_fixes)
+
+    subparser = subparsers.add_parser("push-reviews", help="Copy the local code reviews into the database")
+    add_reviews_arguments(subparser)
+    subparser.set_defaults(func=push_reviews)
+
+    subparser = subparsers.add_parser("pull-reviews", help="Copy the code reviews of the database into the local results")
+    add_reviews_arguments(subparser)
+    subparser.set_defaults(func=pull_reviews)
+
+    args = parser.parse_args()
+    if getattr(args, "final", False) and not (args.provider and args.model and args.prompt):
+        parser.error("--final requires --provider, --model and --prompt")
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
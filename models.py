@@ -1,11 +1,34 @@
-from sqlalchemy.orm import DeclarativeBase, relationship
-from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, Text, BigInteger
+from sqlalchemy.orm import DeclarativeBase, relationship, deferred, undefer_group
+from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, Text, BigInteger, DateTime
 from sqlalchemy.schema import PrimaryKeyConstraint, ForeignKeyConstraint
 
 
 class Base(DeclarativeBase):
     pass
 
+# Large text columns are deferred: they are only loaded when accessed, or up front
+# when their group is requested with load_column_groups.
+#   diff:   patches and diff hunks
+#   review: generated code reviews
+#   file:   full file contents
+COLUMN_GROUPS = ('diff', 'review', 'file')
+
+def load_column_groups(*groups: str) -> list:
+    """
+    Build the loader options that load the given deferred column groups
+    together with the rest of the columns.
+
+    Args:
+        *groups (str): The column groups, from COLUMN_GROUPS.
+
+    Returns:
+        list: The options to pass to query(...).options() or select(...).options().
+    """
+    for group in groups:
+        if group not in COLUMN_GROUPS:
+            raise ValueError(f"Column group {group} does not exist.")
+    return [undefer_group(group) for group in groups]
+
 class Repo(Base):
     __tablename__ = 'repo'
 
@@ -73,7 +96,7 @@ class File(Base):
     additions = Column(Integer)
     deletions = Column(Integer)
     changes = Column(Integer)
-    patch = Column(Text)
+    patch = deferred(Column(Text), group='diff')
     blob_url = Column(String)
     raw_url = Column(String)
     #content = Column(Text)
@@ -88,7 +111,7 @@ class Comment(Base):
     created_at = Column(String)
     author = Column(String)
     author_type = Column(String)
-    diff_hunk = Column(Text)
+    diff_hunk = deferred(Column(Text), group='diff')
     path = Column(String)
     commit_id = Column(String)
     original_commit_id = Column(String)
@@ -202,7 +225,7 @@ class Eval_Model_Info(Base):
     original_commit = Column(String, primary_key=True)
     fix_commit = Column(String, primary_key=True)
     file = Column(String)
-    diff = Column(String)
+    diff = deferred(Column(String), group='diff')
     __table_args__= (
         PrimaryKeyConstraint('comment_id', 'original_commit', 'fix_commit'),
         ForeignKeyConstraint(['comment_id', 'original_commit', 'fix_commit'], ['review.comment_id', 'review.original_commit', 'review.fix_commit']),
@@ -247,6 +270,14 @@ class DS_Discrepancies(Base):
     mentions_security = Column(Boolean)
     comment = Column(Text)
 
+class DS_Vulnerability_Fix(Base):
+    __tablename__ = 'ds_vulnerability_fix'
+
+    sha = Column(String, primary_key=True)
+    owner = Column(String)
+    name = Column(String)
+    refreshed_at = Column(DateTime)
+
 class DS_Generated_Review(Base):
     __tablename__ = 'ds_generated_review'
 
@@ -298,12 +329,12 @@ class DS_Generated_Review_Final(Base):
     name = Column(String)
     message = Column(String)
     filename = Column(String)
-    patch = Column(Text)
+    patch = deferred(Column(Text), group='diff')
     raw_url = Column(String)
-    review = Column(Text)
+    review = deferred(Column(Text), group='review')
     usable = Column(Boolean)
-    full_file = Column(Text)
-    pre_diff_code = Column(Text)
+    full_file = deferred(Column(Text), group='file')
+    pre_diff_code = deferred(Column(Text), group='file')
 
     __table_args__= (
         PrimaryKeyConstraint('sha'),
@@ -6,7 +6,8 @@
 # The prompts will be designed to generate code reviews for these commits.
 # The prompts used will be in the folder LLMs/Prompts under a VX folder
 # where X is the version of the experiment.
-# The results will be saved in the folder LLMs/Results under a VX folder
+# The results will be saved in the results store (LLMs/Results/results.sqlite3)
+# and exported to the folder LLMs/Results under a VX folder
 # where X is the version of the experiment.
 # This script is meant to be run without any arguments and generate the
 # necessary files for every prompt design experiment, if it is not already done.
@@ -14,7 +15,6 @@
 from dotenv import load_dotenv
 import os
 from utils import *
-import copy
 import pandas as pd
 import shutil
 
@@ -26,6 +26,12 @@ db_password = os.getenv("db_password")
 db_port = os.getenv("db_port")
 db_name = os.getenv("db_name")
 
+# Providers run through their batch API (cheaper, results within 24h), e.g. batch_providers=Sonnet
+batch_providers = [p.strip() for p in os.getenv("batch_providers", "").split(",") if p.strip()]
+
+# Prompts generated together by the local models, 1 to generate them one by one
+local_batch_size = int(os.getenv("local_batch_size", "16"))
+
 
 # Repeat the process for each version of the experiment.
 folder = "LLMs/Prompts"
@@ -54,42 +60,21 @@ for version in versions:
     # Read the available models
     models = get_models(least_expensive=False)
 
+    # Load the details of every commit at once
+    commit_infos = util.get_commit_infos(shas)
+
     # Create the results folder if it does not exist
     results_folder = f"LLMs/Results/{version}"
     if not os.path.exists(results_folder):
         os.makedirs(results_folder)
     
-    # Iterate over the models
-    for provider, model in models.items():
-        print(f"Running prompts for {provider} - {model}")
-        llm = create_llm(provider, model)
-
-        for sha in shas:
-            print(f'Iterating over sha {sha}')
-            # Get the commit info
-            commit_info = util.get_commit_info(sha)
-
-            # Generate the code review for all prompts
-            for original_prompt in prompts:
-                prompt = copy.deepcopy(original_prompt)
-                print(f'Using prompt {prompt["name"]}')
-                # Check if the result already exists
-                if generated_prompt_model(sha, provider, model, prompt['name'], version):
-                    continue
-                
-                # If the prompt is self-reflection, get the code review from the zero-shot prompt
-                if prompt['name'] == 'self-reflection':
-                    prompt['code_review'] = get_code_review(sha, provider, model, 'zero-shot', version)
-                
-                # Generate the code review
-                code_review, prompt_used = llm.generate(commit_info, prompt)
-
-                # Save the code review
-                save_code_review(code_review, sha, provider, model, prompt['name'], version, prompt_used=prompt_used)
-
-            print(f'-'*100)
-        
-        llm.end_model()
+    # Generate the missing code reviews, API providers concurrently or with batches
+    scheduler = GenerationScheduler(models, prompts, version, batch_providers=batch_providers, local_batch_size=local_batch_size)
+    generated = scheduler.run(shas, commit_infos)
+    print(f"Generated {generated} code reviews")
+
+    # Export the results store as the JSON results files
+    export_code_reviews(version)
 
     # Compile the results in a pandas DataFrame
     headers = ['url']
@@ -99,7 +84,7 @@ for version in versions:
 
     dataFrame = pd.DataFrame(columns=headers)
     for sha in shas:
-        commit_info = util.get_commit_info(sha)
+        commit_info = commit_infos[sha]
 
         raw_url = commit_info.get("raw_url", "")
         parts = raw_url.split("/")
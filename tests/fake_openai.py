@@ -0,0 +1,150 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.parser import BytesParser
+from email.policy import default
+from urllib.parse import urlsplit
+from typing import Callable
+import threading
+import json
+import time
+
+class FakeOpenAI:
+    """
+    Local fake of the files and batches endpoints of the OpenAI API, to point a
+    client at with base_url. Batches are answered as soon as they are created, by
+    respond(custom_id, body), and complete on the second status check.
+
+    respond returns (status_code, response_body): 200 goes to the output file, other
+    status codes to the error file. None stands for a request the batch never ran,
+    written to the error file with an error and no response, as when a batch expires.
+    """
+    def __init__(self, respond: Callable[[str, dict], tuple[int, dict]]):
+        self.respond = respond
+        self.files = {}
+        self.batches = {}
+        # The requests of every uploaded batch file, in upload order
+        self.uploads = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_file(self, content: bytes, purpose: str, filename: str) -> dict:
+        with self.lock:
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed", "content": content,
+            }
+        return self.files[file_id]
+
+    def create_batch(self, params: dict) -> dict:
+        requests = [json.loads(line) for line in self.files[params["input_file_id"]]["content"].decode("utf-8").splitlines() if line.strip()]
+        self.uploads.append(requests)
+
+        output, errors = [], []
+        for i, request in enumerate(requests):
+            result = self.respond(request["custom_id"], request["body"])
+            line = {"id": f"batch_req_{i}", "custom_id": request["custom_id"], "response": None, "error": None}
+            if result is None:
+                line["error"] = {"code": "batch_expired", "message": "This request could not be executed before the completion window expired."}
+                errors.append(line)
+                continue
+            status_code, body = result
+            line["response"] = {"status_code": status_code, "request_id": f"req_{i}", "body": body}
+            (output if status_code == 200 else errors).append(line)
+
+        def jsonl(lines):
+            if not lines:
+                return None
+            return self.add_file(("\n".join(json.dumps(line) for line in lines) + "\n").encode("utf-8"), "batch_output", "output.jsonl")["id"]
+
+        results = (jsonl(output), jsonl(errors))
+        with self.lock:
+            batch_id = f"batch_{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": params["endpoint"], "input_file_id": params["input_file_id"],
+                "completion_window": params["completion_window"], "created_at": int(time.time()), "status": "validating",
+                "output_file_id": None, "error_file_id": None,
+                "request_counts": {"total": len(requests), "completed": len(output), "failed": len(errors)},
+                "results": results,
+            }
+        return self.batch_json(batch_id)
+
+    def retrieve_batch(self, batch_id: str) -> dict:
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+            elif batch["status"] == "in_progress":
+                batch["status"] = "completed"
+                batch["output_file_id"], batch["error_file_id"] = batch["results"]
+        return self.batch_json(batch_id)
+
+    def list_batches(self) -> dict:
+        # Most recent first, in a single page
+        data = [self.batch_json(batch_id) for batch_id in reversed(list(self.batches))]
+        return {"object": "list", "data": data, "first_id": data[0]["id"] if data else None, "last_id": data[-1]["id"] if data else None, "has_more": False}
+
+    def batch_json(self, batch_id: str) -> dict:
+        return {key: value for key, value in self.batches[batch_id].items() if key != "results"}
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, data: dict, status: int = 200):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self):
+                if self.path == "/v1/files":
+                    message = BytesParser(policy=default).parsebytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + self.read_body()
+                    )
+                    fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+                    file = fake.add_file(fields["file"].get_payload(decode=True), fields["purpose"].get_content().strip(), fields["file"].get_filename())
+                    self.send_json({key: value for key, value in file.items() if key != "content"})
+                elif self.path == "/v1/batches":
+                    self.send_json(fake.create_batch(json.loads(self.read_body())))
+                else:
+                    self.send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+            def do_GET(self):
+                parts = urlsplit(self.path).path.strip("/").split("/")
+                if parts == ["v1", "batches"]:
+                    self.send_json(fake.list_batches())
+                elif parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in fake.batches:
+                    self.send_json(fake.retrieve_batch(parts[2]))
+                elif parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content" and parts[2] in fake.files:
+                    content = fake.files[parts[2]]["content"]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                else:
+                    self.send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+        return Handler
@@ -0,0 +1,58 @@
+from utils import commit_cache
+from utils.commit_cache import CommitCache
+import json
+import pytest
+
+SHAS = [f"{i:040x}" for i in range(3)]
+
+def make_cache(tmp_path):
+    return CommitCache(str(tmp_path / "commits"), legacy_path=str(tmp_path))
+
+def test_lookups_do_not_touch_the_filesystem(tmp_path, monkeypatch):
+    (tmp_path / f"{SHAS[1]}.json").write_text(json.dumps({"sha": SHAS[1]}))
+    cache = make_cache(tmp_path)
+    cache.put(SHAS[0], {"sha": SHAS[0]})
+
+    def checked(method):
+        def check(path, *args, **kwargs):
+            assert not str(path).startswith(str(tmp_path)), f"{path} was checked for a single SHA"
+            return method(path, *args, **kwargs)
+        return check
+    for module, name in ((commit_cache.os, "stat"), (commit_cache.os, "listdir"), (commit_cache.os.path, "isfile"), (commit_cache.os.path, "getsize")):
+        monkeypatch.setattr(module, name, checked(getattr(module, name)))
+
+    assert SHAS[2] not in cache
+    assert cache.get(SHAS[2]) is None
+    assert cache.get(SHAS[0]) == {"sha": SHAS[0]}
+    assert SHAS[1] in cache.legacy_shas
+    monkeypatch.undo()
+
+    # The legacy file was found by the listing made when the cache was opened
+    assert cache.get(SHAS[1]) == {"sha": SHAS[1]}
+    assert not (tmp_path / f"{SHAS[1]}.json").exists()
+    assert SHAS[1] in make_cache(tmp_path)
+
+def test_refresh_reads_the_commits_stored_by_others(tmp_path):
+    cache, other = make_cache(tmp_path), make_cache(tmp_path)
+    other.put(SHAS[0], {"sha": SHAS[0]})
+    (tmp_path / f"{SHAS[1]}.json").write_text(json.dumps({"sha": SHAS[1]}))
+
+    assert cache.get(SHAS[0]) is None
+    assert cache.get(SHAS[1]) is None
+
+    cache.refresh()
+    assert cache.get(SHAS[0]) == {"sha": SHAS[0]}
+    assert cache.get(SHAS[1]) == {"sha": SHAS[1]}
+
+@pytest.mark.parametrize("compression", ["gzip", "none"])
+def test_migrate_legacy(tmp_path, compression):
+    for sha in SHAS:
+        (tmp_path / f"{sha}.json").write_text(json.dumps({"sha": sha}))
+    (tmp_path / "shas.json").write_text("[]")
+
+    cache = CommitCache(str(tmp_path / "commits"), compression=compression, legacy_path=str(tmp_path))
+    assert cache.migrate_legacy() == len(SHAS)
+
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == ["shas.json"]
+    reopened = CommitCache(str(tmp_path / "commits"), compression=compression, legacy_path=str(tmp_path))
+    assert [reopened.get(sha) for sha in SHAS] == [{"sha": sha} for sha in SHAS]
@@ -0,0 +1,43 @@
+from filter import KEYWORDS_CACHE_FILE, KeywordMatcher, contains_keyword, load_keyword_matcher, load_security_keywords, _keywords_cache
+import json
+import os
+
+def write_keywords(folder, name, keywords):
+    (folder / name).write_text("\n".join(keywords) + "\n")
+
+def test_labels_keep_the_keyword_spelling(tmp_path):
+    write_keywords(tmp_path, "security_keywords_1.txt", ["overflow", "cve", "stack overflow"])
+    write_keywords(tmp_path, "security_keywords_2.txt", ["CVE", "TOCTOU", " Overflow "])
+
+    matcher = load_keyword_matcher(str(tmp_path))
+
+    # Deduplicated case-insensitively, the first spelling wins
+    assert matcher.keywords == ["overflow", "cve", "stack overflow", "TOCTOU"]
+    message = "Fix TOCTOU race and stack overflow (CVE-2024-1)"
+    assert matcher.match(message) == (True, ["overflow", "cve", "stack overflow", "TOCTOU"])
+    assert matcher.match(message) == contains_keyword(message, matcher.keywords)
+
+def test_matcher_reports_the_keywords_as_given():
+    matcher = KeywordMatcher(["CVE", "Use After Free"])
+    assert matcher.match("fix cve in use after free path") == (True, ["CVE", "Use After Free"])
+
+def test_cache_stores_the_keyword_list_with_the_file_mtimes(tmp_path):
+    write_keywords(tmp_path, "security_keywords_1.txt", ["CVE", "xss"])
+
+    assert load_security_keywords(str(tmp_path)) == ["CVE", "xss"]
+
+    with open(tmp_path / KEYWORDS_CACHE_FILE, encoding="utf-8") as f:
+        stored = json.load(f)
+    assert stored["keywords"] == ["CVE", "xss"]
+    stat = os.stat(tmp_path / "security_keywords_1.txt")
+    assert stored["files"] == [["security_keywords_1.txt", stat.st_size, stat.st_mtime_ns]]
+
+    # A new process takes the keywords from the cache instead of reading the files
+    _keywords_cache.clear()
+    write_keywords(tmp_path, "security_keywords_1.txt", ["RCE", "xss"])
+    os.utime(tmp_path / "security_keywords_1.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_security_keywords(str(tmp_path)) == ["CVE", "xss"]
+
+    # A modified file invalidates it
+    os.utime(tmp_path / "security_keywords_1.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_security_keywords(str(tmp_path)) == ["RCE", "xss"]
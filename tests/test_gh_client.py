@@ -0,0 +1,169 @@
+import pytest
+import asyncio
+import time
+
+web = pytest.importorskip("aiohttp.web")
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+
+from utils.gh_rate_limit import retry_delay
+from utils.http_cache import HttpCache
+from utils import gh_client
+from utils.gh_client import GitHubClient
+
+SHA = "a" * 40
+
+class StubGitHub:
+    """
+    Local stand-in of the GitHub API, recording the requests it receives.
+    """
+    def __init__(self):
+        self.requests = []
+        self.commits = {}
+        self.raw_files = {}
+        # Responses returned before the regular one, by path
+        self.failures = {}
+        self.etag = '"v1"'
+        self.base_url = None
+
+    async def commit(self, request: web.Request) -> web.Response:
+        self.requests.append((request.path_qs, dict(request.headers)))
+        failures = self.failures.get(request.path, [])
+        if failures:
+            status, headers = failures.pop(0)
+            return web.Response(status=status, headers=headers)
+
+        ref = request.match_info["ref"]
+        if request.headers.get("If-None-Match") == self.etag:
+            return web.Response(status=304)
+
+        page = int(request.query.get("page", 1))
+        pages = self.commits[ref]
+        headers = {"ETag": self.etag, "X-RateLimit-Remaining": "4000", "X-RateLimit-Reset": "9999999999"}
+        if page < len(pages):
+            headers["Link"] = f'<{self.base_url}/repos/owner/repo/commits/{ref}?page={page + 1}>; rel="next"'
+        return web.json_response(pages[page - 1], headers=headers)
+
+    async def raw(self, request: web.Request) -> web.Response:
+        self.requests.append((request.path_qs, dict(request.headers)))
+        return web.Response(text=self.raw_files[request.match_info["name"]])
+
+    def add_commit(self, ref: str, pages: list[list[str]]):
+        self.commits[ref] = [
+            {
+                "sha": ref,
+                "commit": {"message": f"Fix {ref}"},
+                "files": [
+                    {"filename": name, "status": "modified", "patch": f"@@ {name}", "raw_url": f"{self.base_url}/owner/repo/raw/{ref}/{name}"}
+                    for name in names
+                ],
+            }
+            for names in pages
+        ]
+        for names in pages:
+            for name in names:
+                self.raw_files[name] = f"class {name} {{}}"
+
+def run_with_stub(tmp_path, monkeypatch, test, **client_args):
+    """
+    Run test(stub, client) against a stub server, with a fresh HTTP cache.
+    """
+    monkeypatch.setattr(gh_client, "http_cache", HttpCache(str(tmp_path / "cache")))
+    monkeypatch.setattr("utils.gh_utils.http_cache", gh_client.http_cache)
+
+    async def main():
+        stub = StubGitHub()
+        app = web.Application()
+        app.router.add_get("/repos/owner/repo/commits/{ref}", stub.commit)
+        app.router.add_get("/owner/repo/raw/{ref}/{name}", stub.raw)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        stub.base_url = f"http://{host}:{port}"
+        try:
+            async with GitHubClient(token="token", base_url=stub.base_url, **client_args) as client:
+                await test(stub, client)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+def test_follows_commit_pages(tmp_path, monkeypatch):
+    async def test(stub, client):
+        stub.add_commit(SHA, [["A.java", "B.java"], ["C.java"], ["D.txt", "E.java"]])
+
+        details = await client.get_commit_details("owner", "repo", SHA, all_files=True)
+
+        assert [file["filename"] for file in details["files"]] == ["A.java", "B.java", "C.java", "E.java"]
+        assert [file["raw_content"] for file in details["files"]] == [f"class {name} {{}}" for name in ("A.java", "B.java", "C.java", "E.java")]
+        assert details["filename"] == "A.java"
+        pages = [path for path, _ in stub.requests if path.startswith("/repos/")]
+        assert pages == [f"/repos/owner/repo/commits/{SHA}", f"/repos/owner/repo/commits/{SHA}?page=2", f"/repos/owner/repo/commits/{SHA}?page=3"]
+
+        # Every page is pinned to the SHA, so a second call is served from the cache
+        stub.requests.clear()
+        again = await client.get_commit_details("owner", "repo", SHA, all_files=True)
+        assert again == details
+        assert stub.requests == []
+
+    run_with_stub(tmp_path, monkeypatch, test)
+
+def test_revalidates_with_conditional_request(tmp_path, monkeypatch):
+    async def test(stub, client):
+        stub.add_commit("main", [["A.java"]])
+
+        first = await client.get_commit_details("owner", "repo", "main")
+        second = await client.get_commit_details("owner", "repo", "main")
+
+        assert second == first
+        commit_requests = [headers for path, headers in stub.requests if path.startswith("/repos/")]
+        assert len(commit_requests) == 2
+        assert "If-None-Match" not in commit_requests[0]
+        assert commit_requests[1]["If-None-Match"] == stub.etag
+        assert commit_requests[1]["Authorization"] == "Bearer token"
+
+    run_with_stub(tmp_path, monkeypatch, test)
+
+@pytest.mark.parametrize("status, headers, delays", [
+    (403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "0"}, [1, 2]),
+    (403, {"Retry-After": "3"}, [3, 3]),
+    (429, {"Retry-After": "3"}, [3, 3]),
+    # No header tells how long to wait, back off exponentially instead of retrying at once
+    (429, {}, [1, 2]),
+])
+def test_retries_rate_limited_requests(tmp_path, monkeypatch, status, headers, delays):
+    async def test(stub, client):
+        stub.add_commit(SHA, [["A.java"]])
+        stub.failures[f"/repos/owner/repo/commits/{SHA}"] = [(status, headers), (status, headers)]
+        # Record the waits, without waiting
+        waits = []
+        backoff = client.pool.backoff
+        monkeypatch.setattr(client.pool, "backoff", lambda token, seconds: (waits.append(seconds), backoff(token, 0)))
+
+        details = await client.get_commit_details("owner", "repo", SHA)
+
+        assert details["raw_content"] == "class A.java {}"
+        assert len([path for path, _ in stub.requests if path.startswith("/repos/")]) == 3
+        assert waits == delays
+        # The quota of the token is tracked from the headers of the last response
+        assert client.pool.limiters["token"].remaining == 4000
+
+    run_with_stub(tmp_path, monkeypatch, test)
+
+def test_retry_delay_is_capped():
+    assert [retry_delay({}, attempt) for attempt in range(8)] == [1, 2, 4, 8, 16, 32, 60, 60]
+    assert retry_delay({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(time.time() + 30)}, 0) == pytest.approx(30, abs=1)
+
+def test_other_errors_are_not_retried(tmp_path, monkeypatch):
+    async def test(stub, client):
+        stub.add_commit(SHA, [["A.java"]])
+        stub.failures[f"/repos/owner/repo/commits/{SHA}"] = [(404, {})]
+
+        results = await client.get_commits_details([("owner", "repo", SHA)])
+
+        assert "Status code: 404" in str(results[SHA])
+        assert len(stub.requests) == 1
+
+    run_with_stub(tmp_path, monkeypatch, test)
@@ -0,0 +1,195 @@
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+
+from fake_openai import FakeOpenAI
+from utils.llms_utils.batches import BatchRunner, batch_custom_id
+from utils.llms_utils.llms_utils import get_code_review
+from utils.llms_utils.gpt import Gpt
+
+SHAS = [f"{i:040x}" for i in range(3)]
+PROMPT_NAMES = ["zero-shot", "cot", "self-reflection"]
+
+def make_prompts():
+    prompts = []
+    for name in PROMPT_NAMES:
+        content = f"{name}: [Insert fix content here]"
+        if name == "self-reflection":
+            content += "\nPrevious review: [previous_response]"
+        prompts.append({"name": name, "prompt": [{"role": "system", "content": "You review code."}, {"role": "user", "content": content}]})
+    return prompts
+
+def make_commit_infos():
+    return {sha: {"message": f"fix {sha}", "patch": "+ check()"} for sha in SHAS}
+
+def response_body(text: str) -> dict:
+    return {
+        "id": "resp_1", "object": "response", "status": "completed",
+        "output": [
+            {"type": "reasoning", "summary": []},
+            {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": text, "annotations": []}]},
+        ],
+    }
+
+class Responder:
+    """
+    Answers with the reasoning effort and the input of the request, so each saved
+    review shows which request it came from. The first attempt of some requests fails.
+    """
+    def __init__(self, server_error: set[str] = (), expired: set[str] = ()):
+        self.server_error = set(server_error)
+        self.expired = set(expired)
+
+    def __call__(self, custom_id: str, body: dict):
+        if custom_id in self.expired:
+            self.expired.remove(custom_id)
+            return None
+        if custom_id in self.server_error:
+            self.server_error.remove(custom_id)
+            return 500, {"error": {"message": "The server had an error while processing your request.", "type": "server_error"}}
+        return 200, response_body(f"{body['reasoning']['effort']} review of {body['input']}")
+
+def make_runner(tmp_path, monkeypatch, fake):
+    monkeypatch.setenv("OpenAI_base_url", fake.base_url)
+    monkeypatch.setenv("OpenAI_API_KEY", "test")
+    llm = Gpt("gpt-5-mini")
+    return BatchRunner(llm, "OpenAI", "V1", path=str(tmp_path), poll_interval=0.01, max_poll_interval=0.01)
+
+def run_batches(tmp_path, monkeypatch, responder):
+    with FakeOpenAI(responder) as fake:
+        runner = make_runner(tmp_path, monkeypatch, fake)
+        saved = runner.run(SHAS, make_prompts(), make_commit_infos())
+    return fake, runner, saved
+
+def stop_after(method):
+    """
+    Wrap a client method so the run stops once it returns, as if it was interrupted.
+    """
+    def stopped(*args, **kwargs):
+        method(*args, **kwargs)
+        raise KeyboardInterrupt
+    return stopped
+
+def test_jsonl_requests(tmp_path, monkeypatch):
+    fake, _, saved = run_batches(tmp_path, monkeypatch, Responder())
+
+    assert saved == len(SHAS) * len(PROMPT_NAMES)
+    # Self-reflection needs the zero-shot reviews, it is submitted in a second batch
+    assert [sorted({request["body"]["input"].split(":")[0] for request in upload}) for upload in fake.uploads] == [["cot", "zero-shot"], ["self-reflection"]]
+
+    input_files = [file for file in fake.files.values() if file["purpose"] == "batch"]
+    assert len(input_files) == 2
+    assert all(file["content"].endswith(b"\n") for file in input_files)
+
+    for request in (request for upload in fake.uploads for request in upload):
+        name, sha = request["custom_id"].rsplit("-", 1)
+        assert request["custom_id"] == batch_custom_id(sha, name)
+        assert request["method"] == "POST"
+        assert request["url"] == "/v1/responses"
+        body = request["body"]
+        assert body["model"] == "gpt-5-mini"
+        assert body["instructions"] == "You review code."
+        assert body["input"].startswith(f"{name}: Commit Message: fix {sha}")
+        assert body["reasoning"] == {"effort": "low" if name == "zero-shot" else "medium"}
+        assert body["max_output_tokens"] == (1024 if name == "zero-shot" else 3072)
+
+def test_results_round_trip_by_custom_id(tmp_path, monkeypatch):
+    _, _, saved = run_batches(tmp_path, monkeypatch, Responder())
+
+    assert saved == len(SHAS) * len(PROMPT_NAMES)
+    for sha in SHAS:
+        for name in PROMPT_NAMES:
+            review = get_code_review(sha, "OpenAI", "gpt-5-mini", name, "V1", str(tmp_path))
+            effort = "low" if name == "zero-shot" else "medium"
+            assert review.startswith(f"{effort} review of {name}: Commit Message: fix {sha}")
+
+        # The self-reflection request was built from the saved zero-shot review
+        zero_shot = get_code_review(sha, "OpenAI", "gpt-5-mini", "zero-shot", "V1", str(tmp_path))
+        assert review.endswith(f"Previous review: {zero_shot}")
+
+def test_failed_requests_from_the_error_file_are_resubmitted(tmp_path, monkeypatch):
+    server_error = batch_custom_id(SHAS[0], "cot")
+    expired = batch_custom_id(SHAS[1], "cot")
+    fake, runner, saved = run_batches(tmp_path, monkeypatch, Responder(server_error={server_error}, expired={expired}))
+
+    assert saved == len(SHAS) * len(PROMPT_NAMES)
+    first_batch = fake.batches["batch_1"]
+    assert first_batch["request_counts"] == {"total": 6, "completed": 4, "failed": 2}
+    assert first_batch["output_file_id"] and first_batch["error_file_id"]
+
+    # Both failures were read from the error file, recorded and sent again with the self-reflection requests
+    errors = dict(runner.ledger.conn.execute("SELECT custom_id, error FROM batch_item WHERE status = 'errored'").fetchall())
+    assert set(errors) == {server_error, expired}
+    assert "server_error" in errors[server_error]
+    assert "batch_expired" in errors[expired]
+    assert {server_error, expired} <= {request["custom_id"] for request in fake.uploads[1]}
+    assert "review of cot" in get_code_review(SHAS[0], "OpenAI", "gpt-5-mini", "cot", "V1", str(tmp_path))
+
+def test_resumes_a_batch_whose_submission_was_not_recorded(tmp_path, monkeypatch):
+    with FakeOpenAI(Responder()) as fake:
+        runner = make_runner(tmp_path, monkeypatch, fake)
+        monkeypatch.setattr(runner.llm.client.batches, "create", stop_after(runner.llm.client.batches.create))
+        with pytest.raises(KeyboardInterrupt):
+            runner.run(SHAS, make_prompts(), make_commit_infos())
+        assert len(runner.ledger.pending_batches("OpenAI", "gpt-5-mini", "V1")) == 1
+
+        runner = make_runner(tmp_path, monkeypatch, fake)
+        saved = runner.run(SHAS, make_prompts(), make_commit_infos())
+
+    assert saved == len(SHAS) * len(PROMPT_NAMES)
+    # The first batch was found by its custom_ids and collected, not submitted again
+    assert [len(upload) for upload in fake.uploads] == [6, 3]
+    assert runner.ledger.pending_batches("OpenAI", "gpt-5-mini", "V1") == []
+    assert runner.ledger.conn.execute("SELECT COUNT(*) FROM batch WHERE batch_id = 'batch_1' AND status = 'collected'").fetchone()[0] == 1
+
+def test_submits_again_a_batch_that_never_reached_the_provider(tmp_path, monkeypatch):
+    with FakeOpenAI(Responder()) as fake:
+        runner = make_runner(tmp_path, monkeypatch, fake)
+        monkeypatch.setattr(runner.llm.client.files, "create", stop_after(runner.llm.client.files.create))
+        with pytest.raises(KeyboardInterrupt):
+            runner.run(SHAS, make_prompts(), make_commit_infos())
+
+        runner = make_runner(tmp_path, monkeypatch, fake)
+        saved = runner.run(SHAS, make_prompts(), make_commit_infos())
+
+    assert saved == len(SHAS) * len(PROMPT_NAMES)
+    assert [len(upload) for upload in fake.uploads] == [6, 3]
+    # The dropped batch does not count as an attempt
+    assert runner.ledger.attempts("OpenAI", "gpt-5-mini", "V1", SHAS[0], "cot") == 1
+
+@pytest.mark.parametrize("other_model, other_prompt", [
+    ("gpt-5", ""),
+    # Another version of the experiment, with the same prompt names
+    ("gpt-5-mini", " Be brief."),
+])
+def test_does_not_adopt_a_batch_of_another_model_or_version(tmp_path, monkeypatch, other_model, other_prompt):
+    with FakeOpenAI(Responder()) as fake:
+        runner = make_runner(tmp_path, monkeypatch, fake)
+        monkeypatch.setattr(runner.llm.client.files, "create", stop_after(runner.llm.client.files.create))
+        with pytest.raises(KeyboardInterrupt):
+            runner.run(SHAS, make_prompts(), make_commit_infos())
+
+        # A batch with the same custom_ids is submitted meanwhile by another experiment
+        prompts = make_prompts()
+        for prompt in prompts:
+            prompt["prompt"][-1]["content"] += other_prompt
+        other = BatchRunner(Gpt(other_model), "OpenAI", "V2", path=str(tmp_path / "other"), poll_interval=0.01, max_poll_interval=0.01)
+        other.run(SHAS, prompts, make_commit_infos())
+
+        runner = make_runner(tmp_path, monkeypatch, fake)
+        saved = runner.run(SHAS, make_prompts(), make_commit_infos())
+
+    assert saved == len(SHAS) * len(PROMPT_NAMES)
+    assert [len(upload) for upload in fake.uploads] == [6, 3, 6, 3]
+    for sha in SHAS:
+        assert get_code_review(sha, "OpenAI", "gpt-5-mini", "cot", "V1", str(tmp_path)) == f"medium review of cot: Commit Message: fix {sha}\n\nDiff:\n+ check()"
+
+@pytest.mark.parametrize("result, expected", [
+    ({"custom_id": "cot-1", "response": {"status_code": 200, "body": response_body(" Looks good. ")}, "error": None}, ("cot-1", "Looks good.", None)),
+    ({"custom_id": "cot-1", "response": {"status_code": 429, "body": {}}, "error": None}, ("cot-1", None, "HTTP 429")),
+    ({"custom_id": "cot-1", "response": {"status_code": 400, "body": {"error": "Bad input"}}, "error": None}, ("cot-1", None, "Bad input")),
+    ({"custom_id": "cot-1", "response": None, "error": {"code": "batch_expired"}}, ("cot-1", None, '{"code": "batch_expired"}')),
+])
+def test_parse_batch_result(result, expected):
+    assert Gpt.parse_batch_result(result) == expected
@@ -0,0 +1,71 @@
+import pytest
+import copy
+import os
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("accelerate")
+
+from utils.llms_utils.qwen import Qwen
+from utils.llms_utils.flan import Flan
+
+# Tiny checkpoints of the same architectures as the least_expensive models, so the tests run on CPU
+CAUSAL_MODEL = os.getenv("HF_TEST_CAUSAL_MODEL", "trl-internal-testing/tiny-Qwen3ForCausalLM")
+SEQ2SEQ_MODEL = os.getenv("HF_TEST_SEQ2SEQ_MODEL", "hf-internal-testing/tiny-random-T5ForConditionalGeneration")
+
+# Short responses keep the tests fast, the batching logic does not depend on the length
+MAX_LENGTH = 24
+
+def load(llm_class, model_name):
+    try:
+        llm = llm_class(model_name)
+    except OSError as error:
+        pytest.skip(f"{model_name} is not available: {error}")
+    # Greedy decoding, so batched and unbatched generation can be compared
+    llm.model.generation_config.do_sample = False
+    build_prompt = llm.build_prompt
+    llm.build_prompt = lambda commit_info, prompt: (build_prompt(commit_info, prompt)[0], MAX_LENGTH)
+    return llm
+
+@pytest.fixture(scope="module", params=[(Qwen, CAUSAL_MODEL), (Flan, SEQ2SEQ_MODEL)], ids=["causal", "seq2seq"])
+def llm(request):
+    llm = load(*request.param)
+    yield llm
+    llm.end_model()
+
+def make_batch():
+    prompts = {
+        name: {"name": name, "prompt": [{"role": "system", "content": "You review code."}, {"role": "user", "content": "Review this fix.\n[Insert fix content here]"}]}
+        for name in ("zero-shot", "cot")
+    }
+    batch = []
+    for i in range(6):
+        # Different lengths, so the batches need padding
+        commit_info = {"sha": f"{i:040x}", "message": "fix " + "overflow " * (i * 3 + 1), "patch": "+ if (len > max) return;\n" * (i + 1)}
+        batch.append((commit_info, prompts["zero-shot" if i % 2 else "cot"]))
+    return batch
+
+def test_padding_side(llm):
+    if isinstance(llm, Qwen):
+        assert llm.tokenizer.padding_side == "left"
+
+def test_padded_batch_matches_unbatched(llm):
+    llm.max_batch_size = 8
+    texts = [llm.format_prompt(llm.build_prompt(commit_info, copy.deepcopy(prompt))[0], "cot") for commit_info, prompt in make_batch()]
+
+    batched = llm.generate_texts(texts, "cot", MAX_LENGTH)
+    unbatched = [llm.generate_texts([text], "cot", MAX_LENGTH)[0] for text in texts]
+
+    assert batched == unbatched
+
+@pytest.mark.parametrize("max_batch_size", [1, 2, 16])
+def test_generate_many_keeps_input_order(llm, max_batch_size):
+    llm.max_batch_size = max_batch_size
+    batch = make_batch()
+
+    results = llm.generate_many(batch)
+    expected = [llm.generate(commit_info, copy.deepcopy(prompt)) for commit_info, prompt in batch]
+
+    assert len(results) == len(batch)
+    assert [prompt_used for _, prompt_used in results] == [prompt_used for _, prompt_used in expected]
+    assert [text for text, _ in results] == [text for text, _ in expected]
@@ -0,0 +1,29 @@
+from utils.http_cache import HttpCache
+import threading
+
+def test_concurrent_store_of_same_blob(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    body = b"identical file content\n" * 50000
+    workers = 8
+    barrier = threading.Barrier(workers)
+    errors = []
+
+    def store(i):
+        barrier.wait()
+        try:
+            cache.store(f"https://raw.githubusercontent.com/o/r/{i:040x}/A.java", body, {"ETag": f'"{i}"'})
+        except Exception as error:
+            errors.append(error)
+
+    for _ in range(10):
+        threads = [threading.Thread(target=store, args=(i,)) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    for i in range(workers):
+        meta = cache.lookup(f"https://raw.githubusercontent.com/o/r/{i:040x}/A.java")
+        assert cache.read_body(meta) == body
+    assert not list(tmp_path.rglob("*.tmp"))
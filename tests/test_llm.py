@@ -0,0 +1,44 @@
+from utils.llms_utils.llm import LLM
+import asyncio
+import copy
+import pytest
+
+PROMPT = {"name": "zero-shot", "prompt": [{"role": "system", "content": "You review code."}, {"role": "user", "content": "[Insert fix content here]"}]}
+COMMIT_INFO = {"message": "fix overflow", "patch": "+ check()"}
+
+class EmptyLLM(LLM):
+    """
+    Answers with blank responses a given number of times, recording the length of each request.
+    """
+    def __init__(self, empty_responses: int, retry_max: int = 3):
+        super().__init__("empty-model", retry_max)
+        self.empty_responses = empty_responses
+        self.lengths = []
+
+    def ask(self, message, max_length=1024, name='zero-shot'):
+        self.lengths.append(max_length)
+        return "  \n" if len(self.lengths) <= self.empty_responses else " Looks good. "
+
+    async def ask_async(self, message, max_length=1024, name='zero-shot'):
+        return self.ask(message, max_length, name)
+
+def generate_both(empty_responses: int):
+    sync_llm, async_llm = EmptyLLM(empty_responses), EmptyLLM(empty_responses)
+    sync_result = sync_llm.generate(COMMIT_INFO, copy.deepcopy(PROMPT))
+    async_result = asyncio.run(async_llm.generate_async(COMMIT_INFO, copy.deepcopy(PROMPT)))
+    return (sync_result, sync_llm.lengths), (async_result, async_llm.lengths)
+
+@pytest.mark.parametrize("empty_responses, text, lengths", [
+    (0, "Looks good.", [1024]),
+    (2, "Looks good.", [1024, 2048, 3072]),
+    # Every attempt was blank
+    (3, "", [1024, 2048, 3072]),
+])
+def test_generate_and_generate_async_share_the_retry_policy(empty_responses, text, lengths):
+    for (code_review, prompt_used), asked in generate_both(empty_responses):
+        assert code_review == text
+        assert asked == lengths
+        assert prompt_used[-1]["content"].startswith("Commit Message: fix overflow")
+
+def test_retry_lengths_after_a_first_attempt():
+    assert list(EmptyLLM(0, retry_max=4).retry_lengths(100, start=1)) == [200, 300, 400]
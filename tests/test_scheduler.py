@@ -0,0 +1,163 @@
+from utils.llms_utils.llms_utils import get_code_review, generated_prompt_model, save_code_review
+from utils.llms_utils.scheduler import GenerationScheduler
+from utils.llms_utils.llm import LLM
+import asyncio
+import pytest
+
+SHAS = [f"{i:040x}" for i in range(6)]
+
+def make_prompts(names):
+    prompts = []
+    for name in names:
+        content = "[Insert fix content here]"
+        if name == "self-reflection":
+            content = "Previous review: [previous_response]\n" + content
+        prompts.append({"name": name, "prompt": [{"role": "system", "content": "You review code."}, {"role": "user", "content": content}]})
+    return prompts
+
+def make_commit_infos():
+    return {sha: {"sha": sha, "message": f"fix {sha[-2:]}", "patch": "+ check()"} for sha in SHAS}
+
+class FakeLLM(LLM):
+    """
+    Answers with the prompt technique and the commit message, tracking the requests in flight.
+    """
+    def __init__(self, model_name, fail_on=None, delay=0.01):
+        super().__init__(model_name)
+        self.fail_on = fail_on or set()
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+
+    def answer(self, message, name):
+        content = message[-1]['content']
+        if (name, content.split("fix ")[-1][:2]) in self.fail_on:
+            raise RuntimeError(f"{name} failed")
+        return f"{name} review of {content.splitlines()[0]}"
+
+    def ask(self, message, max_length=1024, name='zero-shot'):
+        return self.answer(message, name)
+
+    async def ask_async(self, message, max_length=1024, name='zero-shot'):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return self.answer(message, name)
+        finally:
+            self.in_flight -= 1
+
+class FakeLocalLLM(FakeLLM):
+    """
+    Local model recording the size of each generate_many call.
+    """
+    def __init__(self, model_name, fail_on=None, delay=0.01):
+        super().__init__(model_name, fail_on, delay)
+        self.batches = []
+
+    def generate_many(self, batch_prompts):
+        self.batches.append([prompt['name'] for _, prompt in batch_prompts])
+        return super().generate_many(batch_prompts)
+
+def run_scheduler(tmp_path, prompt_names, llm_class=FakeLLM, **kwargs):
+    llms = {}
+    fail_on = kwargs.pop("fail_on", None)
+
+    def factory(provider, model):
+        llms[provider] = llm_class(model, fail_on=fail_on)
+        return llms[provider]
+
+    scheduler = GenerationScheduler({"Fake": "fake-model"}, make_prompts(prompt_names), "V1", path=str(tmp_path), llm_factory=factory, **kwargs)
+    return scheduler, llms
+
+@pytest.mark.parametrize("prompt_names", [
+    ["zero-shot", "cot", "self-reflection"],
+    ["cot", "self-reflection", "zero-shot"],  # The order get_prompts returns
+    ["self-reflection", "zero-shot"],
+])
+def test_self_reflection_waits_for_zero_shot(tmp_path, prompt_names):
+    scheduler, _ = run_scheduler(tmp_path, prompt_names, max_concurrency={"Fake": 4})
+
+    assert scheduler.run(SHAS, make_commit_infos()) == len(SHAS) * len(prompt_names)
+
+    for sha in SHAS:
+        zero_shot = get_code_review(sha, "Fake", "fake-model", "zero-shot", "V1", str(tmp_path))
+        self_reflection = get_code_review(sha, "Fake", "fake-model", "self-reflection", "V1", str(tmp_path))
+        assert zero_shot == f"zero-shot review of Commit Message: fix {sha[-2:]}"
+        assert self_reflection.startswith("self-reflection review of Previous review: " + zero_shot)
+
+def test_failed_dependency_skips_dependents_only(tmp_path):
+    failing = SHAS[2]
+    scheduler, _ = run_scheduler(tmp_path, ["cot", "self-reflection", "zero-shot"], fail_on={("zero-shot", failing[-2:])})
+
+    with pytest.raises(RuntimeError, match="2 code reviews could not be generated"):
+        scheduler.run(SHAS, make_commit_infos())
+
+    assert generated_prompt_model(failing, "Fake", "fake-model", "cot", "V1", str(tmp_path))
+    assert not generated_prompt_model(failing, "Fake", "fake-model", "zero-shot", "V1", str(tmp_path))
+    assert not generated_prompt_model(failing, "Fake", "fake-model", "self-reflection", "V1", str(tmp_path))
+    for sha in SHAS:
+        if sha != failing:
+            assert generated_prompt_model(sha, "Fake", "fake-model", "self-reflection", "V1", str(tmp_path))
+
+    # A second run only generates what is missing
+    scheduler, _ = run_scheduler(tmp_path, ["cot", "self-reflection", "zero-shot"])
+    assert scheduler.run(SHAS, make_commit_infos()) == 2
+
+@pytest.mark.parametrize("limit", [1, 3])
+def test_concurrency_cap(tmp_path, limit):
+    scheduler, llms = run_scheduler(tmp_path, ["zero-shot", "cot"], max_concurrency={"Fake": limit})
+
+    scheduler.run(SHAS, make_commit_infos())
+
+    assert llms["Fake"].peak == limit
+
+def test_local_batches_wait_for_zero_shot(tmp_path):
+    scheduler, llms = run_scheduler(tmp_path, ["cot", "self-reflection", "zero-shot"], llm_class=FakeLocalLLM, local_batch_size=16)
+
+    assert scheduler.run(SHAS, make_commit_infos()) == len(SHAS) * 3
+
+    # cot and zero-shot first, self-reflection once the zero-shot reviews are saved
+    batches = llms["Fake"].batches
+    assert "self-reflection" not in batches[0]
+    assert all(len(batch) <= 16 for batch in batches)
+    for sha in SHAS:
+        zero_shot = get_code_review(sha, "Fake", "fake-model", "zero-shot", "V1", str(tmp_path))
+        assert get_code_review(sha, "Fake", "fake-model", "self-reflection", "V1", str(tmp_path)).startswith(
+            "self-reflection review of Previous review: " + zero_shot)
+
+def test_local_batch_prompt_error_fails_its_task_only(tmp_path):
+    missing = SHAS[1]
+    for sha in SHAS:
+        if sha != missing:
+            save_code_review(f"zero-shot review of {sha}", sha, "Fake", "fake-model", "zero-shot", "V1", str(tmp_path))
+    scheduler, _ = run_scheduler(tmp_path, ["cot", "self-reflection"], llm_class=FakeLocalLLM, local_batch_size=16)
+
+    with pytest.raises(RuntimeError, match="1 code reviews could not be generated"):
+        scheduler.run(SHAS, make_commit_infos())
+
+    assert not generated_prompt_model(missing, "Fake", "fake-model", "self-reflection", "V1", str(tmp_path))
+    assert generated_prompt_model(missing, "Fake", "fake-model", "cot", "V1", str(tmp_path))
+    for sha in SHAS:
+        if sha != missing:
+            assert generated_prompt_model(sha, "Fake", "fake-model", "self-reflection", "V1", str(tmp_path))
+
+@pytest.mark.parametrize("local", [False, True])
+def test_failing_provider_does_not_stop_the_others(tmp_path, local):
+    def factory(provider, model):
+        if provider == "Broken":
+            raise OSError(f"{model} could not be loaded")
+        return FakeLLM(model)
+
+    models = {"Broken": "broken-model", "Fake": "fake-model"}
+    # Local providers run one after the other in the same lane, the broken one first
+    max_concurrency = {"Broken": 1, "Fake": 1} if local else {"Broken": 4, "Fake": 4}
+    scheduler = GenerationScheduler(models, make_prompts(["zero-shot", "cot"]), "V1", path=str(tmp_path), llm_factory=factory, max_concurrency=max_concurrency)
+
+    with pytest.raises(RuntimeError, match="broken-model could not be loaded"):
+        scheduler.run(SHAS, make_commit_infos())
+
+    assert [key for key, _ in scheduler.errors] == [("Broken", "broken-model")]
+    for sha in SHAS:
+        assert generated_prompt_model(sha, "Fake", "fake-model", "cot", "V1", str(tmp_path))
+        assert not generated_prompt_model(sha, "Broken", "broken-model", "cot", "V1", str(tmp_path))
@@ -1,7 +1,8 @@
 from .os_utils import exists_or_create_folder
 from .utils import Utils
-from .llms_utils.llms_utils import get_models, generated_prompt_model, save_code_review, create_llm, get_code_review, get_code_reviews
+from .llms_utils.llms_utils import get_models, generated_prompt_model, save_code_review, create_llm, register_llm, get_code_review, get_code_reviews, export_code_reviews
 from .llms_utils.llm import LLM
+from .llms_utils.scheduler import GenerationScheduler
 
 def get_prompts(version: str, path: str = "LLMs/Prompts") -> list[dict]:
     """
@@ -23,6 +24,9 @@ __all__ = [
     'save_code_review',
     'get_code_review',
     'get_code_reviews',
+    'export_code_reviews',
     'create_llm',
-    'LLM'
+    'register_llm',
+    'LLM',
+    'GenerationScheduler'
 ]
\ No newline at end of file
@@ -0,0 +1,205 @@
+import threading
+import gzip
+import json
+import os
+import re
+
+try:
+    import zstandard
+except ImportError:  # Optional, gzip is used when it is not installed
+    zstandard = None
+
+EXTENSIONS = {
+    "none": ".json",
+    "gzip": ".json.gz",
+    "zstd": ".json.zst",
+}
+
+LEGACY_FILE = re.compile(r"^[0-9a-f]{40}\.json$")
+
+class CommitCache:
+    """
+    On-disk store of the commit details fetched from GitHub.
+
+    Commits are stored as compact JSON, optionally compressed, under directories
+    sharded by the SHA prefix (ab/cd/abcd...json.gz), and written atomically with
+    a write-then-rename. An append-only index lists the stored SHAs; it is loaded
+    into memory once, so lookups never hit the filesystem for a missing SHA. The
+    entries appended by other processes are picked up by refresh(), meant to be
+    called once per batch of lookups. Commits in the legacy flat layout
+    (LLMs/Results/<sha>.json) are found with a single listing of that folder and
+    moved into the store on first access.
+    """
+    def __init__(self, path: str = "LLMs/Results/commits", compression: str = "gzip", legacy_path: str = "LLMs/Results"):
+        """
+        Args:
+            path (str): The folder of the store.
+            compression (str): "gzip", "zstd" (needs the zstandard package, falls back to gzip) or "none".
+            legacy_path (str): The folder of the legacy flat layout, None to ignore it.
+        """
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Compression {compression} is not supported.")
+        if compression == "zstd" and zstandard is None:
+            compression = "gzip"
+
+        self.path = path
+        self.compression = compression
+        self.legacy_path = legacy_path
+        self.index_path = os.path.join(path, "index.txt")
+        self.index = {}
+        self.index_offset = 0
+        self.legacy_shas = set()
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        """
+        Pick up the commits stored by other processes since the last refresh and list the
+        legacy layout again. It costs one stat and one directory listing, call it once per
+        batch of lookups rather than once per SHA.
+        """
+        with self.lock:
+            self._read_index()
+            self._list_legacy()
+
+    def _read_index(self):
+        """
+        Read the entries appended to the index since the last read, possibly by other processes.
+        """
+        try:
+            size = os.stat(self.index_path).st_size
+        except FileNotFoundError:
+            return
+        if size == self.index_offset:
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self.index_offset)
+            data = f.read()
+        # Ignore a partially written last line, it is read once complete
+        complete = data[:data.rfind(b"\n") + 1]
+        self.index_offset += len(complete)
+        for line in complete.decode("utf-8").splitlines():
+            if line.strip():
+                sha, extension = line.split(" ", 1)
+                self.index[sha] = extension
+
+    def _list_legacy(self):
+        """
+        List the commits left in the legacy flat layout.
+        """
+        if not self.legacy_path or not os.path.isdir(self.legacy_path):
+            self.legacy_shas = set()
+            return
+        self.legacy_shas = {f[:-len(".json")] for f in os.listdir(self.legacy_path) if LEGACY_FILE.match(f)}
+
+    def _file_path(self, sha: str, extension: str) -> str:
+        return os.path.join(self.path, sha[:2], sha[2:4], f"{sha}{extension}")
+
+    @staticmethod
+    def _encode(data: dict, extension: str) -> bytes:
+        raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        if extension == EXTENSIONS["gzip"]:
+            return gzip.compress(raw)
+        if extension == EXTENSIONS["zstd"]:
+            return zstandard.ZstdCompressor().compress(raw)
+        return raw
+
+    @staticmethod
+    def _decode(raw: bytes, extension: str) -> dict:
+        if extension == EXTENSIONS["gzip"]:
+            raw = gzip.decompress(raw)
+        elif extension == EXTENSIONS["zstd"]:
+            raw = zstandard.ZstdDecompressor().decompress(raw)
+        return json.loads(raw)
+
+    def __contains__(self, sha: str) -> bool:
+        return self.contains(sha)
+
+    def contains(self, sha: str) -> bool:
+        """
+        Check if a commit is in the store, from the index in memory.
+
+        Args:
+            sha (str): The commit SHA.
+
+        Returns:
+            bool: True if the commit is stored.
+        """
+        return sha in self.index
+
+    def get(self, sha: str) -> dict:
+        """
+        Read a commit from the store, migrating it from the legacy layout if needed.
+        Only the commit file is opened, a missing commit is answered from memory.
+
+        Args:
+            sha (str): The commit SHA.
+
+        Returns:
+            dict: The commit details, or None if the commit is not stored.
+        """
+        extension = self.index.get(sha)
+        if extension is not None:
+            with open(self._file_path(sha, extension), "rb") as f:
+                return self._decode(f.read(), extension)
+
+        if sha in self.legacy_shas:
+            legacy_file = os.path.join(self.legacy_path, f"{sha}.json")
+            try:
+                with open(legacy_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                # Migrated meanwhile by another process, which indexed it
+                with self.lock:
+                    self.legacy_shas.discard(sha)
+                    self._read_index()
+                return self.get(sha) if sha in self.index else None
+            self.put(sha, data)
+            os.remove(legacy_file)
+            with self.lock:
+                self.legacy_shas.discard(sha)
+            return data
+
+        return None
+
+    def put(self, sha: str, data: dict):
+        """
+        Store a commit atomically.
+
+        Args:
+            sha (str): The commit SHA.
+            data (dict): The commit details.
+        """
+        extension = EXTENSIONS[self.compression]
+        file_path = self._file_path(sha, extension)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._encode(data, extension))
+        os.replace(tmp_path, file_path)
+
+        with self.lock:
+            if self.index.get(sha) != extension:
+                # A single short append is atomic, so concurrent writers never interleave lines
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(f"{sha} {extension}\n")
+                self.index[sha] = extension
+
+    def migrate_legacy(self) -> int:
+        """
+        Move every commit of the legacy flat layout into the store.
+
+        Returns:
+            int: The number of commits migrated.
+        """
+        self.refresh()
+        migrated = 0
+        for sha in sorted(self.legacy_shas):
+            if self.contains(sha):
+                os.remove(os.path.join(self.legacy_path, f"{sha}.json"))
+                with self.lock:
+                    self.legacy_shas.discard(sha)
+            elif self.get(sha) is not None:
+                migrated += 1
+        return migrated
@@ -1,71 +1,356 @@
+from psycopg2.extras import execute_values
+from contextlib import contextmanager
+from typing import Iterator, Iterable, Callable
+import tempfile
 import psycopg2
-import random
-from sqlalchemy import create_engine
+import csv
+import io
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import DBAPIError, OperationalError
 from sqlalchemy.orm import sessionmaker
-from models import DS_Generated_Review_Final
+
+# Indexes backing the queries of DatabaseConnection, created by create_indexes
+INDEXES = {
+    # GROUP BY sha over the evaluated commits, answered with an index-only scan
+    "ix_ds_eval_sha_security": "CREATE INDEX IF NOT EXISTS ix_ds_eval_sha_security ON ds_eval (sha, security)",
+    "ix_ds_discrepancies_security": "CREATE INDEX IF NOT EXISTS ix_ds_discrepancies_security ON ds_discrepancies (security, sha)",
+    # Covering index, so owner and name are read without visiting the table
+    "ix_ds_commit_sha_repo": "CREATE INDEX IF NOT EXISTS ix_ds_commit_sha_repo ON ds_commit (sha) INCLUDE (owner, name)",
+}
+
+# Summary table of the confirmed vulnerability fixes: both evaluators agreed the commit
+# is security related, or the discrepancy resolution said so. Triggers record the SHAs
+# whose evaluations change, so refresh_vulnerability_fixes only recomputes those.
+VULNERABILITY_FIX_DDL = [
+    "CREATE TABLE IF NOT EXISTS ds_vulnerability_fix ("
+    "sha VARCHAR PRIMARY KEY, "
+    "owner VARCHAR, "
+    "name VARCHAR, "
+    "refreshed_at TIMESTAMP NOT NULL DEFAULT now())",
+    "CREATE TABLE IF NOT EXISTS ds_vulnerability_fix_dirty (sha VARCHAR PRIMARY KEY)",
+    "CREATE OR REPLACE FUNCTION ds_vulnerability_fix_mark_dirty() RETURNS trigger AS $$ "
+    "BEGIN "
+    "IF TG_OP IN ('UPDATE', 'DELETE') THEN "
+    "INSERT INTO ds_vulnerability_fix_dirty (sha) VALUES (OLD.sha) ON CONFLICT DO NOTHING; "
+    "END IF; "
+    "IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+    "INSERT INTO ds_vulnerability_fix_dirty (sha) VALUES (NEW.sha) ON CONFLICT DO NOTHING; "
+    "END IF; "
+    "RETURN NULL; "
+    "END; "
+    "$$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS ds_eval_vulnerability_fix ON ds_eval",
+    "CREATE TRIGGER ds_eval_vulnerability_fix AFTER INSERT OR UPDATE OR DELETE ON ds_eval "
+    "FOR EACH ROW EXECUTE FUNCTION ds_vulnerability_fix_mark_dirty()",
+    "DROP TRIGGER IF EXISTS ds_discrepancies_vulnerability_fix ON ds_discrepancies",
+    "CREATE TRIGGER ds_discrepancies_vulnerability_fix AFTER INSERT OR UPDATE OR DELETE ON ds_discrepancies "
+    "FOR EACH ROW EXECUTE FUNCTION ds_vulnerability_fix_mark_dirty()",
+    "DROP TRIGGER IF EXISTS ds_commit_vulnerability_fix ON ds_commit",
+    "CREATE TRIGGER ds_commit_vulnerability_fix AFTER UPDATE OF owner, name ON ds_commit "
+    "FOR EACH ROW EXECUTE FUNCTION ds_vulnerability_fix_mark_dirty()",
+]
+
+VULNERABILITY_FIXES_QUERY = (
+    "SELECT sha FROM ds_eval "
+    "WHERE security IS NOT NULL {filter}"
+    "GROUP BY sha "
+    "HAVING COUNT(*) = 2 AND SUM(CASE WHEN security THEN 1 ELSE 0 END) = 2 "
+    "UNION "
+    "SELECT sha FROM ds_discrepancies "
+    "WHERE security = true {filter}"
+)
+
+# Tables synchronized with COPY: the columns streamed, the primary key and the
+# extra columns filled from ds_commit when a row is inserted
+COPY_TABLES = {
+    "ds_generated_review": {
+        "columns": ["sha", "model", "prompt", "review"],
+        "key": ["sha", "model", "prompt"],
+        "commit_columns": [],
+    },
+    "ds_generated_review_final": {
+        "columns": ["sha", "review"],
+        "key": ["sha"],
+        "commit_columns": ["owner", "name", "message"],
+    },
+}
+
+class _CsvRowsFile(io.TextIOBase):
+    """
+    Read-only file object producing the CSV encoding of an iterable of rows,
+    so COPY FROM STDIN can stream rows without materializing them.
+    """
+    def __init__(self, rows: Iterable):
+        self.rows = iter(rows)
+        self.buffer = ""
+        self.line = io.StringIO()
+        # Quoting every field keeps empty strings apart from NULLs (empty unquoted fields)
+        self.writer = csv.writer(self.line, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.buffer += self.line.getvalue()
+            self.line.seek(0)
+            self.line.truncate()
+            self.count += 1
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def readline(self, size: int = -1) -> str:
+        return self.read(size)
 
 class DatabaseConnection:
-    def __init__(self, db_host: str, db_user: str, db_password: str, db_port: int, db_name: str):
-        # Connect to the PostgreSQL database
-        self.conn = psycopg2.connect(
-            host=db_host,
-            user=db_user,
+    def __init__(self, db_host: str, db_user: str, db_password: str, db_port: int, db_name: str,
+                 pool_size: int = 5, max_overflow: int = 10, pool_recycle: int = 1800, retries: int = 3):
+        """
+        Create the connection pool to the PostgreSQL database.
+        Every method checks out its own connection, so they can be called concurrently
+        from several threads, and stale connections are replaced thanks to pre-ping.
+
+        Args:
+            pool_size (int): The number of connections kept open in the pool.
+            max_overflow (int): The number of extra connections opened under load.
+            pool_recycle (int): The seconds after which a connection is replaced.
+            retries (int): The attempts of an operation when the connection drops.
+        """
+        DATABASE_URL = URL.create(
+            "postgresql+psycopg2",
+            username=db_user,
             password=db_password,
+            host=db_host,
             port=db_port,
             database=db_name
         )
 
-        # Create a cursor object
-        self.cur = self.conn.cursor()
+        self.engine = create_engine(
+            DATABASE_URL,
+            echo=False,
+            future=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=True,
+            pool_recycle=pool_recycle
+        )
 
-        DATABASE_URL = f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False, future=True)
+        self.retries = retries
+        self.vulnerability_fix_table = None
 
-        self.engine = create_engine(DATABASE_URL, echo=False, future=True)
+    def create_indexes(self) -> list[str]:
+        """
+        Create the indexes used to sample the vulnerability fixes and to look up
+        the repository of a commit, if they do not exist yet.
 
-        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False, future=True)
+        Returns:
+            list[str]: The names of the indexes.
+        """
+        def operation():
+            with self.engine.begin() as conn:
+                for ddl in INDEXES.values():
+                    conn.execute(text(ddl))
 
+        self.run(operation)
+        return list(INDEXES)
 
-    def get_vulnerability_fixes(self, version: str) -> list[str]:
+    def create_vulnerability_fixes(self) -> int:
         """
-        Retrieve vulnerability-fixing commits from the database for the given version.
-        Returns a list of commit SHAs.
+        Create the ds_vulnerability_fix summary table with the triggers keeping track
+        of its changes, and fill it.
+
+        Returns:
+            int: The number of vulnerability fixes.
         """
-        query = (
-            "SELECT sha FROM ds_eval "
-            "WHERE security IS NOT NULL "
-            "GROUP BY sha "
-            "HAVING COUNT(*) = 2 AND SUM(CASE WHEN security THEN 1 ELSE 0 END) = 2 "
-            "UNION "
-            "SELECT sha FROM ds_discrepancies "
-            "WHERE security = true"
+        def operation():
+            with self.engine.begin() as conn:
+                for ddl in VULNERABILITY_FIX_DDL:
+                    conn.execute(text(ddl))
+
+        self.run(operation)
+        self.vulnerability_fix_table = True
+        return self.refresh_vulnerability_fixes(full=True)
+
+    def has_vulnerability_fixes(self) -> bool:
+        """
+        Check if the ds_vulnerability_fix summary table exists.
+        """
+        if self.vulnerability_fix_table is None:
+            def operation():
+                with self.engine.connect() as conn:
+                    return conn.execute(text("SELECT to_regclass('ds_vulnerability_fix') IS NOT NULL")).scalar()
+
+            self.vulnerability_fix_table = bool(self.run(operation))
+        return self.vulnerability_fix_table
+
+    def refresh_vulnerability_fixes(self, full: bool = False) -> int:
+        """
+        Bring the ds_vulnerability_fix summary table up to date. Only the SHAs whose
+        evaluations, discrepancy resolution or repository changed since the last refresh
+        are recomputed, unless a full refresh is requested.
+
+        Args:
+            full (bool): If True, recompute every vulnerability fix.
+
+        Returns:
+            int: The number of SHAs recomputed.
+        """
+        insert = (
+            "INSERT INTO ds_vulnerability_fix (sha, owner, name) "
+            "SELECT f.sha, c.owner, c.name FROM (" + VULNERABILITY_FIXES_QUERY + ") AS f "
+            "LEFT JOIN ds_commit c ON c.sha = f.sha"
         )
 
+        def operation():
+            with self.engine.begin() as conn:
+                if full:
+                    conn.execute(text("DELETE FROM ds_vulnerability_fix_dirty"))
+                    conn.execute(text("DELETE FROM ds_vulnerability_fix"))
+                    conn.execute(text(insert.format(filter="")))
+                    return conn.execute(text("SELECT COUNT(*) FROM ds_vulnerability_fix")).scalar()
 
-        self.cur.execute(query)
-        results = self.cur.fetchall()
-        
-        shas = [result[0] for result in results]
-        
-        random.shuffle(shas)
+                shas = [row[0] for row in conn.execute(text("DELETE FROM ds_vulnerability_fix_dirty RETURNING sha"))]
+                if shas:
+                    conn.execute(text("DELETE FROM ds_vulnerability_fix WHERE sha = ANY(:shas)"), {"shas": shas})
+                    conn.execute(text(insert.format(filter="AND sha = ANY(:shas) ")), {"shas": shas})
+                return len(shas)
+
+        return self.run(operation)
+
+    def run(self, operation: Callable):
+        """
+        Run a database operation, retrying it on a fresh connection when the
+        connection is dropped (e.g. a server restart during a long generation run).
+
+        Args:
+            operation (Callable): A function without arguments doing the work.
+
+        Returns:
+            The result of the operation.
+        """
+        for attempt in range(self.retries):
+            try:
+                return operation()
+            except (DBAPIError, psycopg2.OperationalError) as e:
+                if isinstance(e, DBAPIError) and not isinstance(e, OperationalError) and not e.connection_invalidated:
+                    raise
+                if attempt == self.retries - 1:
+                    raise
+                print(f"Database connection lost, retrying ({attempt + 1}/{self.retries - 1}): {e}")
+                time.sleep(2 ** attempt)
+
+    @contextmanager
+    def raw_connection(self):
+        """
+        Check out a raw psycopg2 connection from the pool, for features SQLAlchemy
+        does not expose (server-side cursors, execute_values, COPY).
+        Closing it returns it to the pool, which rolls back anything not committed.
+        """
+        conn = self.engine.raw_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get_vulnerability_fixes(self, version: str, limit: int = 0, seed: str = None, refresh: bool = True) -> list[str]:
+        """
+        Retrieve vulnerability-fixing commits from the database for the given version.
+        The commits are sampled in SQL: ordered by a hash of the seed and the SHA, so
+        the same seed always yields the same sample, and cut at the limit.
+        They are read from the ds_vulnerability_fix summary table when it exists.
+
+        Args:
+            version (str): The version of the experiment.
+            limit (int): The maximum number of commits to retrieve (0 for no limit).
+            seed (str): The seed of the sampling order, None for a random order.
+            refresh (bool): If True, recompute the changed SHAs of the summary table first.
+
+        Returns:
+            list[str]: A list of commit SHAs.
+        """
+        if self.has_vulnerability_fixes():
+            if refresh:
+                self.refresh_vulnerability_fixes()
+            query = "SELECT sha FROM ds_vulnerability_fix AS fixes "
+        else:
+            query = "SELECT sha FROM (" + VULNERABILITY_FIXES_QUERY.format(filter="") + ") AS fixes "
+        params = {}
+        if seed is None:
+            query += "ORDER BY random()"
+        else:
+            query += "ORDER BY md5(:seed || sha), sha"
+            params["seed"] = seed
+
+        if limit > 0:
+            query += " LIMIT :limit"
+            params["limit"] = limit
+
+        def operation():
+            with self.engine.connect() as conn:
+                return conn.execute(text(query), params).fetchall()
+
+        results = self.run(operation)
+
+        return [result[0] for result in results]
 
-        return shas
-    
     def get_commit_info(self, sha: str) -> dict:
         """
         Retrieve commit details from the database for the given SHA.
         Returns a dictionary with commit details.
         """
-        query = "SELECT owner, name FROM ds_commit WHERE sha = %s"
-        self.cur.execute(query, (sha,))
-        result = self.cur.fetchone()
-        
-        if result:
-            return {
-                "owner": result[0],
-                "name": result[1]
+        return self.get_commit_infos([sha]).get(sha, {})
+
+    def get_commit_infos(self, shas: list[str]) -> dict:
+        """
+        Retrieve the repository of many commits in a single query, from the
+        ds_vulnerability_fix summary table when it exists, and from ds_commit
+        for the commits that are not there.
+
+        Args:
+            shas (list[str]): The commit SHAs.
+
+        Returns:
+            dict: The owner and name of each commit found, keyed by SHA.
+        """
+        if not shas:
+            return {}
+
+        queries = ["SELECT sha, owner, name FROM ds_commit WHERE sha = ANY(:shas)"]
+        if self.has_vulnerability_fixes():
+            queries.insert(0, "SELECT sha, owner, name FROM ds_vulnerability_fix WHERE sha = ANY(:shas) AND owner IS NOT NULL")
+
+        def operation():
+            results = []
+            pending = list(dict.fromkeys(shas))
+            with self.engine.connect() as conn:
+                for query in queries:
+                    if not pending:
+                        break
+                    rows = conn.execute(text(query), {"shas": pending}).fetchall()
+                    results.extend(rows)
+                    found = {row[0] for row in rows}
+                    pending = [sha for sha in pending if sha not in found]
+            return results
+
+        results = self.run(operation)
+
+        return {
+            result[0]: {
+                "owner": result[1],
+                "name": result[2]
             }
-        
-        return {}
+            for result in results
+        }
 
     def get_vulnerability_commits(self, generated: bool = True, limit: int = 0) -> list[dict]:
         """
@@ -78,26 +363,65 @@ class DatabaseConnection:
         Returns:
             list[dict]: A list of vulnerability-fixing commit information.
         """
+        return list(self.iter_vulnerability_commits(generated, limit))
+
+    def iter_vulnerability_commits(self, generated: bool = True, limit: int = 0, after_sha: str = None, itersize: int = 100, page_size: int = 1000) -> Iterator[dict]:
+        """
+        Lazily retrieve vulnerability-fixing commits from the database, ordered by SHA.
+        Rows are streamed through a server-side cursor, itersize at a time, over keyset
+        pages of page_size commits (sha > last sha seen), so memory stays flat whatever
+        the size of the table. If the connection drops, streaming resumes after the
+        last commit yielded.
+
+        Args:
+            generated (bool): If True, include those already generated.
+            limit (int): The maximum number of commits to retrieve (0 for no limit).
+            after_sha (str): Only retrieve commits with a SHA greater than this one, to resume a run.
+            itersize (int): The number of rows fetched from the server per round trip.
+            page_size (int): The number of commits read per server-side cursor and transaction.
+
+        Returns:
+            Iterator[dict]: A generator of vulnerability-fixing commit information.
+        """
         query = "SELECT sha, message, patch FROM ds_generated_review_final WHERE usable = true"
         if not generated:
             query += " and review is null"
-        
-        if limit > 0:
-            query += f" LIMIT {limit}"
-        
-        self.cur.execute(query)
-        results = self.cur.fetchall()
-
-        commits = []
-        for result in results:
-            commits.append({
-                "sha": result[0],
-                "message": result[1],
-                "patch": result[2]
-            })
-
-        return commits
-    
+
+        last_sha = after_sha
+        count = 0
+        attempt = 0
+        while limit <= 0 or count < limit:
+            page_limit = page_size if limit <= 0 else min(page_size, limit - count)
+            page_query = query + (" AND sha > %s" if last_sha is not None else "") + " ORDER BY sha LIMIT %s"
+            params = ((last_sha,) if last_sha is not None else ()) + (page_limit,)
+
+            rows = 0
+            try:
+                with self.raw_connection() as conn:
+                    with conn.cursor(name="ds_vulnerability_commits") as cur:
+                        cur.itersize = itersize
+                        cur.execute(page_query, params)
+                        for result in cur:
+                            rows += 1
+                            count += 1
+                            last_sha = result[0]
+                            yield {
+                                "sha": result[0],
+                                "message": result[1],
+                                "patch": result[2]
+                            }
+            except psycopg2.OperationalError as e:
+                attempt += 1
+                if attempt >= self.retries:
+                    raise
+                print(f"Database connection lost, resuming after {last_sha} ({attempt}/{self.retries - 1}): {e}")
+                time.sleep(2 ** (attempt - 1))
+                continue
+
+            attempt = 0
+            if rows < page_limit:
+                break
+
     def save_generated_code_review(self, sha: str, code_review: str):
         """
         Save the generated code review for a given commit SHA.
@@ -106,8 +430,197 @@ class DatabaseConnection:
             sha (str): The commit SHA.
             code_review (str): The generated code review.
         """
-        with self.SessionLocal() as session:
-            existing_entry = session.query(DS_Generated_Review_Final).filter_by(sha=sha).first()
-            if existing_entry:
-                existing_entry.review = code_review
-                session.commit()
\ No newline at end of file
+        self.save_generated_code_reviews([(sha, code_review)])
+
+    def save_generated_code_reviews(self, reviews: list[tuple[str, str]], batch_size: int = 500) -> dict:
+        """
+        Save many generated code reviews in a single transaction.
+        Existing rows get their review updated and missing rows are inserted with the
+        commit information from ds_commit. Reviews of commits not in ds_commit are skipped.
+        When a SHA appears several times, its last review wins.
+
+        Args:
+            reviews (list[tuple[str, str]]): A list of (sha, code_review) tuples.
+            batch_size (int): The number of rows sent per statement.
+
+        Returns:
+            dict: The number of rows inserted, updated and skipped.
+        """
+        query = (
+            "INSERT INTO ds_generated_review_final (sha, owner, name, message, review) "
+            "SELECT v.sha, c.owner, c.name, c.message, v.review "
+            "FROM (VALUES %s) AS v(sha, review) "
+            "JOIN ds_commit c ON c.sha = v.sha "
+            "ON CONFLICT (sha) DO UPDATE SET review = EXCLUDED.review "
+            "RETURNING (xmax = 0) AS inserted"
+        )
+        values = list(dict(reviews).items())
+
+        def operation():
+            counts = {"inserted": 0, "updated": 0, "skipped": len(reviews) - len(values)}
+            with self.raw_connection() as conn:
+                with conn.cursor() as cur:
+                    for start in range(0, len(values), batch_size):
+                        batch = values[start:start + batch_size]
+                        results = execute_values(cur, query, batch, page_size=len(batch), fetch=True)
+                        inserted = sum(1 for result in results if result[0])
+                        counts["inserted"] += inserted
+                        counts["updated"] += len(results) - inserted
+                        counts["skipped"] += len(batch) - len(results)
+                conn.commit()
+            return counts
+
+        return self.run(operation)
+
+    def get_generated_review_finals(self, shas: list[str], groups: tuple[str, ...] = ()) -> list[dict]:
+        """
+        Retrieve rows of ds_generated_review_final loading only the large columns
+        of the requested groups (see models.COLUMN_GROUPS).
+
+        Args:
+            shas (list[str]): The commit SHAs.
+            groups (tuple[str, ...]): The deferred column groups to load, e.g. ("review",).
+
+        Returns:
+            list[dict]: The rows, with the always-loaded columns and those of the groups.
+        """
+        from models import DS_Generated_Review_Final, load_column_groups
+
+        def operation():
+            with self.SessionLocal() as session:
+                rows = (
+                    session.query(DS_Generated_Review_Final)
+                    .options(*load_column_groups(*groups))
+                    .filter(DS_Generated_Review_Final.sha.in_(list(shas)))
+                    .all()
+                )
+                # Only the loaded attributes, deferred ones would hit the database again
+                return [
+                    {key: value for key, value in row.__dict__.items() if not key.startswith("_")}
+                    for row in rows
+                ]
+
+        return self.run(operation)
+
+    def iter_commit_messages(self, only_unlabeled: bool = False, itersize: int = 5000) -> Iterator[tuple[str, str]]:
+        """
+        Lazily retrieve the messages of the commits in ds_commit.
+        A server-side cursor on its own pooled connection is used, so the rows are
+        streamed and other methods can keep using the database meanwhile.
+
+        Args:
+            only_unlabeled (bool): If True, only retrieve commits whose keywords are null.
+            itersize (int): The number of rows fetched from the server per round trip.
+
+        Returns:
+            Iterator[tuple[str, str]]: A generator of (sha, message) tuples.
+        """
+        query = "SELECT sha, message FROM ds_commit"
+        if only_unlabeled:
+            query += " WHERE keywords IS NULL"
+
+        with self.raw_connection() as conn:
+            with conn.cursor(name="ds_commit_messages") as cur:
+                cur.itersize = itersize
+                cur.execute(query)
+                for row in cur:
+                    yield row[0], row[1]
+
+    def update_commit_keywords(self, results: list[tuple[str, list[str]]], separator: str = ",", page_size: int = 1000):
+        """
+        Store the matched security keywords of many commits in a single bulk update.
+
+        Args:
+            results (list[tuple[str, list[str]]]): A list of (sha, matched_keywords) tuples.
+            separator (str): The separator used to join the keywords in the column.
+            page_size (int): The number of rows sent per statement.
+        """
+        query = (
+            "UPDATE ds_commit AS c SET keywords = v.keywords "
+            "FROM (VALUES %s) AS v(sha, keywords) "
+            "WHERE c.sha = v.sha"
+        )
+        values = [(sha, separator.join(keywords)) for sha, keywords in results]
+
+        def operation():
+            with self.raw_connection() as conn:
+                with conn.cursor() as cur:
+                    execute_values(cur, query, values, page_size=page_size)
+                conn.commit()
+
+        self.run(operation)
+
+    def copy_reviews_out(self, table: str = "ds_generated_review", prompts: list[str] = None) -> Iterator[tuple]:
+        """
+        Stream the generated reviews out of the database with COPY ... TO STDOUT.
+        The rows are spooled to a temporary file, so memory stays flat, and are
+        ordered by prompt and SHA when the table has a prompt column.
+
+        Args:
+            table (str): "ds_generated_review" or "ds_generated_review_final".
+            prompts (list[str]): Only export these prompts (ds_generated_review only).
+
+        Returns:
+            Iterator[tuple]: A generator of rows with the columns of the table in COPY_TABLES.
+        """
+        columns = COPY_TABLES[table]["columns"]
+        query = f"SELECT {', '.join(columns)} FROM {table} WHERE review IS NOT NULL"
+        with self.raw_connection() as conn:
+            with conn.cursor() as cur:
+                if prompts:
+                    query += cur.mogrify(" AND prompt = ANY(%s)", (list(prompts),)).decode("utf-8")
+                if "prompt" in columns:
+                    query += " ORDER BY prompt, sha"
+
+                with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024, mode="w+", encoding="utf-8", newline="") as spool:
+                    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", spool)
+                    conn.commit()
+                    spool.seek(0)
+                    for row in csv.reader(spool):
+                        yield tuple(row)
+
+    def copy_reviews_in(self, rows: Iterable[tuple], table: str = "ds_generated_review") -> dict:
+        """
+        Stream generated reviews into the database with COPY ... FROM STDIN into a
+        temporary staging table, merged into the table with a single set-based upsert
+        in one transaction. Rows of commits missing from ds_commit are skipped, and when
+        a key appears several times only one of its rows is kept. The rows are consumed
+        once, so the operation is not retried if the connection drops.
+
+        Args:
+            rows (Iterable[tuple]): Rows with the columns of the table in COPY_TABLES.
+            table (str): "ds_generated_review" or "ds_generated_review_final".
+
+        Returns:
+            dict: The number of rows inserted, updated (changed review) and skipped
+                  (unchanged, duplicated or without commit).
+        """
+        config = COPY_TABLES[table]
+        columns = ", ".join(config["columns"])
+        key = ", ".join(config["key"])
+        values = ", ".join(f"s.{column}" for column in config["columns"])
+        commit_columns = "".join(f", c.{column}" for column in config["commit_columns"])
+        insert_columns = columns + "".join(f", {column}" for column in config["commit_columns"])
+
+        merge = (
+            "WITH merged AS ("
+            f"INSERT INTO {table} ({insert_columns}) "
+            f"SELECT DISTINCT ON ({', '.join('s.' + k for k in config['key'])}) {values}{commit_columns} "
+            "FROM review_staging s JOIN ds_commit c ON c.sha = s.sha "
+            f"ON CONFLICT ({key}) DO UPDATE SET review = EXCLUDED.review "
+            f"WHERE {table}.review IS DISTINCT FROM EXCLUDED.review "
+            "RETURNING (xmax = 0) AS inserted) "
+            "SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM merged"
+        )
+
+        # The review is the last column, rows without one have nothing to merge
+        source = _CsvRowsFile(row for row in rows if row[-1] is not None)
+        with self.raw_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE TEMP TABLE review_staging ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA")
+                cur.copy_expert(f"COPY review_staging ({columns}) FROM STDIN WITH (FORMAT csv)", source)
+                cur.execute(merge)
+                inserted, updated = cur.fetchone()
+            conn.commit()
+
+        return {"inserted": inserted, "updated": updated, "skipped": source.count - inserted - updated}
@@ -0,0 +1,230 @@
+from .gh_utils import github_api_url, auth_headers, next_page_url, merge_commit_page, select_commit_file, select_commit_files, build_commit_details, build_file_details, token_pool, http_cache, MAX_FILE_SIZE, FILE_TOO_LARGE
+from .gh_rate_limit import TokenPool, is_rate_limited, retry_delay
+import asyncio
+import json
+import aiohttp
+
+class GitHubClient:
+    """
+    Asynchronous GitHub client sharing one keep-alive connection pool.
+
+    Every request goes through the same aiohttp session, so connections are reused,
+    and a semaphore bounds the number of requests in flight. Use it as an async
+    context manager:
+
+        async with GitHubClient() as client:
+            details = await client.get_commits_details([(owner, repo, sha), ...])
+    """
+    def __init__(self, token: str = None, base_url: str = None, max_concurrency: int = 16, pool_size: int = 32, timeout: float = 60, pool: TokenPool = None):
+        """
+        Args:
+            token (str): A single GitHub token to use instead of a token pool.
+            base_url (str): The GitHub API URL, e.g. a local stub server when testing.
+            max_concurrency (int): The maximum number of requests in flight.
+            pool_size (int): The maximum number of pooled connections.
+            timeout (float): The total timeout of a request, in seconds.
+            pool (TokenPool): The tokens to spread the requests over, defaults to the pool
+                shared with gh_utils, configured in the environment.
+        """
+        self.pool = pool or (TokenPool([token]) if token else token_pool)
+        self.base_url = (base_url or github_api_url).rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the session and its connection pool.
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    @staticmethod
+    async def read_limited(response: aiohttp.ClientResponse, max_size: int = None) -> bytes:
+        """
+        Read the body of a response in chunks, aborting once it exceeds the size cap.
+
+        Args:
+            response (aiohttp.ClientResponse): The response.
+            max_size (int): The maximum size in bytes, None for no limit.
+
+        Returns:
+            bytes: The body, or None if it is larger than max_size.
+        """
+        if max_size is None:
+            return await response.read()
+
+        if response.content_length is not None and response.content_length > max_size:
+            return None
+
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            body.extend(chunk)
+            if len(body) > max_size:
+                return None
+        return bytes(body)
+
+    async def fetch(self, url: str, api: bool = True, max_size: int = None) -> tuple[int | str, str]:
+        """
+        Perform a GET request through the HTTP cache shared with gh_utils. Resources
+        pinned to a commit SHA are served straight from the cache, the others are
+        revalidated with a conditional request. API requests use the token of the
+        pool with the most remaining calls, waiting for a reset when all are exhausted.
+
+        Args:
+            url (str): The URL of the resource.
+            api (bool): True for GitHub API requests, False for unauthenticated raw downloads.
+            max_size (int): The maximum size in bytes of a raw download, streamed and
+                aborted with FILE_TOO_LARGE when exceeded. None for no limit.
+
+        Returns:
+            tuple[int | str, str]: The status code, or FILE_TOO_LARGE, and the body (None if the request failed).
+        """
+        meta = http_cache.lookup(url)
+        if meta and http_cache.is_immutable(url):
+            return 200, http_cache.read_body(meta).decode("utf-8", errors="replace")
+
+        conditional = http_cache.conditional_headers(meta)
+        attempt = 0
+        while True:
+            token = await self.pool.acquire_async() if api and self.pool else None
+            headers = {**auth_headers(token), **conditional} if api else conditional
+            async with self.semaphore:
+                async with self.session.get(url, headers=headers) as response:
+                    if token:
+                        self.pool.update(token, response.headers)
+                        if is_rate_limited(response.status, response.headers):
+                            self.pool.backoff(token, retry_delay(response.headers, attempt))
+                            attempt += 1
+                            continue
+                    if response.status == 304 and meta:
+                        return 200, http_cache.read_body(meta).decode("utf-8", errors="replace")
+                    if response.status == 200:
+                        body = await self.read_limited(response, None if api else max_size)
+                        if body is None:
+                            return FILE_TOO_LARGE, None
+                        http_cache.store(url, body, response.headers)
+                        return 200, body.decode("utf-8", errors="replace")
+                    return response.status, None
+
+    async def get_commit_data(self, owner: str, repo: str, sha: str) -> tuple[int, dict]:
+        """
+        Get a commit from the GitHub API, with the files of every page, as gh_utils.get_commit_data does.
+
+        Returns:
+            tuple[int, dict]: The status code and the commit (None if the request failed).
+        """
+        url = f"{self.base_url}/repos/{owner}/{repo}/commits/{sha}"
+        status, body = await self.fetch(url)
+        if status != 200:
+            return status, None
+
+        response_data = json.loads(body)
+        while url := next_page_url(url):
+            status, body = await self.fetch(url)
+            if status != 200:
+                return status, None
+            merge_commit_page(response_data, json.loads(body))
+        return 200, response_data
+
+    async def get_commit_details(self, owner: str, repo: str, sha: str, all_files: bool = False, extensions: tuple[str, ...] = (".java",), max_file_size: int = MAX_FILE_SIZE) -> dict:
+        """
+        Get the details of a commit from GitHub, as gh_utils.get_commit_details does.
+
+        Args:
+            owner (str): The owner of the repository.
+            repo (str): The name of the repository.
+            sha (str): The SHA of the commit.
+            all_files (bool): If True, return every matching file under "files" instead of only the first one.
+            extensions (tuple[str, ...]): The accepted file extensions when all_files is True.
+            max_file_size (int): The size cap of each raw file when all_files is True, None for no limit.
+
+        Returns:
+            dict: The details of the commit.
+        """
+        status, response_data = await self.get_commit_data(owner, repo, sha)
+        if status != 200:
+            raise Exception(f"Failed to fetch commit details for {owner}/{repo} with sha {sha}. Status code: {status}")
+
+        if all_files:
+            return await self._get_commit_files(owner, repo, sha, response_data, extensions, max_file_size)
+
+        file = select_commit_file(response_data)
+        if file is None:
+            raise Exception(f"No .java file with a patch in {owner}/{repo} with sha {sha}")
+
+        status, raw_content = await self.fetch(file['raw_url'], api=False)
+        if status != 200:
+            raise Exception(f"Failed to fetch file content for {owner}/{repo} with sha {sha}:\n {file['filename']}")
+
+        return build_commit_details(sha, response_data, file, raw_content)
+
+    async def _get_commit_files(self, owner: str, repo: str, sha: str, response_data: dict, extensions: tuple[str, ...], max_file_size: int) -> dict:
+        """
+        Download every matching file of a commit concurrently, as gh_utils.get_commit_files does.
+        """
+        files = select_commit_files(response_data, extensions)
+        if not files:
+            raise Exception(f"No file matching {extensions} with a patch in {owner}/{repo} with sha {sha}")
+
+        downloads = await asyncio.gather(*(self.fetch(file['raw_url'], api=False, max_size=max_file_size) for file in files))
+
+        files_details = []
+        for file, (file_status, raw_content) in zip(files, downloads):
+            if file_status not in (200, FILE_TOO_LARGE):
+                raise Exception(f"Failed to fetch file content for {owner}/{repo} with sha {sha}:\n {file['filename']}")
+            files_details.append(build_file_details(file, file_status, raw_content))
+
+        commit_details = build_commit_details(sha, response_data, files[0], files_details[0]["raw_content"])
+        commit_details["files"] = files_details
+        return commit_details
+
+    async def get_commits_details(self, commits: list[tuple[str, str, str]], **kwargs) -> dict:
+        """
+        Get the details of many commits in parallel.
+
+        Args:
+            commits (list[tuple[str, str, str]]): A list of (owner, repo, sha) tuples.
+            **kwargs: Additional arguments for get_commit_details, e.g. all_files.
+
+        Returns:
+            dict: The details of each commit keyed by SHA. Commits that could not be
+                  fetched map to the raised exception instead.
+        """
+        results = await asyncio.gather(
+            *(self.get_commit_details(owner, repo, sha, **kwargs) for owner, repo, sha in commits),
+            return_exceptions=True
+        )
+        return {sha: result for (_, _, sha), result in zip(commits, results)}
+
+def fetch_commits_details(commits: list[tuple[str, str, str]], client_args: dict = None, **kwargs) -> dict:
+    """
+    Synchronous helper to fetch many commits in parallel with a GitHubClient.
+
+    Args:
+        commits (list[tuple[str, str, str]]): A list of (owner, repo, sha) tuples.
+        client_args (dict): Arguments for the GitHubClient.
+        **kwargs: Additional arguments for get_commit_details, e.g. all_files.
+
+    Returns:
+        dict: The details of each commit keyed by SHA, or the exception raised while fetching it.
+    """
+    async def run():
+        async with GitHubClient(**(client_args or {})) as client:
+            return await client.get_commits_details(commits, **kwargs)
+
+    return asyncio.run(run())
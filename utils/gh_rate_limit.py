@@ -0,0 +1,229 @@
+import threading
+import asyncio
+import time
+
+class RateLimiter:
+    """
+    Token bucket for the GitHub API quota of one token, fed by response headers.
+
+    The quota is read from the X-RateLimit-Remaining / X-RateLimit-Reset headers of
+    the regular requests, so no extra /rate_limit calls are needed. Each request takes
+    a token before being sent, so concurrent workers never overrun the quota, and only
+    the workers asking for a token while the bucket is empty wait for the reset.
+    It is safe to share between threads and asyncio tasks.
+    """
+    def __init__(self, reserve: int = 5):
+        """
+        Args:
+            reserve (int): The number of calls kept unused, as a safety margin.
+        """
+        self.reserve = reserve
+        self.remaining = None  # Unknown until the first response
+        self.reset = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, headers) -> None:
+        """
+        Update the quota from the headers of a GitHub API response.
+
+        Args:
+            headers: The response headers.
+        """
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+
+        remaining = int(remaining)
+        reset = float(reset)
+        with self.lock:
+            if reset > self.reset or self.remaining is None:
+                # New window: the server count is authoritative
+                self.remaining = remaining
+                self.reset = reset
+            else:
+                # Same window: requests still in flight were already taken from the bucket
+                self.remaining = min(self.remaining, remaining)
+
+    def backoff(self, seconds: float) -> None:
+        """
+        Empty the bucket for the given time, e.g. after a secondary rate limit Retry-After.
+
+        Args:
+            seconds (float): The time to wait, in seconds.
+        """
+        with self.lock:
+            self.remaining = 0
+            self.reset = max(self.reset, time.time() + seconds)
+
+    def try_acquire(self) -> float:
+        """
+        Take a token from the bucket if possible.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until the quota resets.
+        """
+        with self.lock:
+            now = time.time()
+            if self.remaining is not None and self.remaining <= self.reserve and now >= self.reset:
+                # The window is over, the next response will tell the new quota
+                self.remaining = None
+            if self.remaining is None:
+                return 0
+            if self.remaining > self.reserve:
+                self.remaining -= 1
+                return 0
+            return max(self.reset - now, 0.1)
+
+    def acquire(self) -> None:
+        """
+        Block the calling thread until a token is available.
+        """
+        while (wait := self.try_acquire()) > 0:
+            time.sleep(wait + 1)
+
+    async def acquire_async(self) -> None:
+        """
+        Suspend the calling task until a token is available.
+        """
+        while (wait := self.try_acquire()) > 0:
+            await asyncio.sleep(wait + 1)
+
+def is_rate_limited(status_code: int, headers) -> bool:
+    """
+    Check if a GitHub API response was rejected because of a rate limit.
+
+    Args:
+        status_code (int): The status code of the response.
+        headers: The response headers.
+
+    Returns:
+        bool: True if the request should be retried once the limit resets.
+    """
+    if status_code == 429:
+        return True
+    return status_code == 403 and (headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in headers)
+
+def retry_delay(headers, attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Get the time to wait before retrying a rate-limited request.
+
+    Args:
+        headers: The response headers.
+        attempt (int): The number of rate-limited responses already received for the request.
+        base (float): The first wait when the headers give no time, in seconds.
+        cap (float): The longest wait when the headers give no time, in seconds.
+
+    Returns:
+        float: The Retry-After time, else the time until X-RateLimit-Reset when the quota is
+            exhausted, else an exponential backoff, so a bare 429 is not retried at once.
+    """
+    if "Retry-After" in headers:
+        return float(headers["Retry-After"])
+    if headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in headers:
+        wait = float(headers["X-RateLimit-Reset"]) - time.time()
+        if wait > 0:
+            return wait
+    return min(base * 2 ** attempt, cap)
+
+class TokenPool:
+    """
+    Pool of GitHub tokens, each one with its own RateLimiter.
+
+    Every request is sent with the token with the most remaining calls. Exhausted
+    tokens are benched until their reset time, and callers only wait when every
+    token in the pool is exhausted.
+    """
+    def __init__(self, tokens: list[str], reserve: int = 5):
+        """
+        Args:
+            tokens (list[str]): The GitHub tokens.
+            reserve (int): The number of calls kept unused for each token.
+        """
+        tokens = [token for token in dict.fromkeys(tokens) if token]
+        if not tokens:
+            raise ValueError("The token pool needs at least one GitHub token.")
+        self.limiters = {token: RateLimiter(reserve) for token in tokens}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, tokens: str = None, token: str = None, reserve: int = 5) -> "TokenPool":
+        """
+        Build the pool from the environment configuration.
+
+        Args:
+            tokens (str): A comma separated list of tokens (the git_tokens variable).
+            token (str): A single token, used when no list is configured (the git_token variable).
+            reserve (int): The number of calls kept unused for each token.
+
+        Returns:
+            TokenPool: The token pool, or None if no token is configured.
+        """
+        pool = [t.strip() for t in (tokens or "").split(",") if t.strip()]
+        if not pool and token:
+            pool = [token]
+        return cls(pool, reserve) if pool else None
+
+    @property
+    def tokens(self) -> list[str]:
+        return list(self.limiters)
+
+    def try_acquire(self) -> tuple[str, float]:
+        """
+        Take a call from the token with the most remaining calls.
+
+        Returns:
+            tuple[str, float]: The token and 0, or None and the seconds until a token resets.
+        """
+        with self.lock:
+            # Tokens with an unknown quota first, so every token gets probed
+            ranked = sorted(
+                self.limiters.items(),
+                key=lambda item: float("inf") if item[1].remaining is None else item[1].remaining,
+                reverse=True
+            )
+            waits = []
+            for token, limiter in ranked:
+                wait = limiter.try_acquire()
+                if wait == 0:
+                    return token, 0
+                waits.append(wait)
+            return None, min(waits)
+
+    def acquire(self) -> str:
+        """
+        Block the calling thread until a token has calls available.
+
+        Returns:
+            str: The token to use for the request.
+        """
+        while True:
+            token, wait = self.try_acquire()
+            if token is not None:
+                return token
+            time.sleep(wait + 1)
+
+    async def acquire_async(self) -> str:
+        """
+        Suspend the calling task until a token has calls available.
+
+        Returns:
+            str: The token to use for the request.
+        """
+        while True:
+            token, wait = self.try_acquire()
+            if token is not None:
+                return token
+            await asyncio.sleep(wait + 1)
+
+    def update(self, token: str, headers) -> None:
+        """
+        Update the quota of a token from the headers of a GitHub API response.
+        """
+        self.limiters[token].update(headers)
+
+    def backoff(self, token: str, seconds: float) -> None:
+        """
+        Bench a token for the given time.
+        """
+        self.limiters[token].backoff(seconds)
@@ -1,11 +1,198 @@
+from .gh_rate_limit import TokenPool, is_rate_limited, retry_delay
+from .http_cache import HttpCache
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import requests
+import json
 import time
 import os
+import re
 
 load_dotenv()
 
 git_token = os.getenv("git_token")
+# Comma separated list of tokens, to spread the requests over several quotas
+git_tokens = os.getenv("git_tokens")
+github_api_url = os.getenv("github_api_url", "https://api.github.com").rstrip("/")
+
+# Shared keep-alive session, so consecutive calls reuse the TCP+TLS connection
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# Quota of each token, tracked from the headers of every API response
+token_pool = TokenPool.from_env(git_tokens, git_token)
+
+# Responses cache shared by every worker, so commits are only downloaded once
+http_cache = HttpCache(os.getenv("http_cache_path", "LLMs/Cache/http"))
+
+# Next page in the Link header of a paginated response
+NEXT_PAGE = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+# Default size cap of the raw files downloaded when fetching every file of a commit
+MAX_FILE_SIZE = 1024 * 1024
+# Status returned instead of an HTTP status for raw files over the size cap, whose
+# download is aborted, so it cannot be mistaken for a 413 sent by the server
+FILE_TOO_LARGE = "file too large"
+
+def auth_headers(token: str = None) -> dict:
+    """
+    Build the headers for an authenticated GitHub API request.
+
+    Args:
+        token (str): The GitHub token, defaults to the one in the environment.
+
+    Returns:
+        dict: The request headers.
+    """
+    if token is None:
+        token = git_token or (token_pool.tokens[0] if token_pool else None)
+    return {
+        "Authorization": f"Bearer {token}"
+    }
+
+def github_get(url: str, headers: dict = None) -> requests.Response:
+    """
+    Perform an authenticated GET request to the GitHub API with the token of the
+    pool with the most remaining calls, waiting for a reset when all are exhausted.
+
+    Args:
+        url (str): The URL of the resource.
+        headers (dict): Additional request headers.
+
+    Returns:
+        requests.Response: The response.
+    """
+    if token_pool is None:
+        return session.get(url, headers={**auth_headers(), **(headers or {})})
+
+    attempt = 0
+    while True:
+        token = token_pool.acquire()
+        response = session.get(url, headers={**auth_headers(token), **(headers or {})})
+        token_pool.update(token, response.headers)
+        if not is_rate_limited(response.status_code, response.headers):
+            return response
+        response.close()
+        token_pool.backoff(token, retry_delay(response.headers, attempt))
+        attempt += 1
+
+def read_limited(response: requests.Response, max_size: int = None) -> bytes:
+    """
+    Read the body of a streamed response, aborting once it exceeds the size cap.
+
+    Args:
+        response (requests.Response): The response, requested with stream=True.
+        max_size (int): The maximum size in bytes, None for no limit.
+
+    Returns:
+        bytes: The body, or None if it is larger than max_size.
+    """
+    if max_size is None:
+        return response.content
+
+    length = response.headers.get("Content-Length")
+    if length is not None and int(length) > max_size:
+        response.close()
+        return None
+
+    body = bytearray()
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        body.extend(chunk)
+        if len(body) > max_size:
+            response.close()
+            return None
+    return bytes(body)
+
+def cached_get(url: str, api: bool = True, max_size: int = None) -> tuple[int | str, str]:
+    """
+    Perform a GET request through the HTTP cache. Resources pinned to a commit SHA
+    are served straight from the cache, the others are revalidated with a
+    conditional request, whose 304 responses do not count against the quota.
+
+    Args:
+        url (str): The URL of the resource.
+        api (bool): True for GitHub API requests, False for unauthenticated raw downloads.
+        max_size (int): The maximum size in bytes of a raw download, streamed and
+            aborted with FILE_TOO_LARGE when exceeded. None for no limit.
+
+    Returns:
+        tuple[int | str, str]: The status code, or FILE_TOO_LARGE, and the body (None if the request failed).
+    """
+    meta = http_cache.lookup(url)
+    if meta and http_cache.is_immutable(url):
+        return 200, http_cache.read_body(meta).decode("utf-8", errors="replace")
+
+    headers = http_cache.conditional_headers(meta)
+    if api:
+        response = github_get(url, headers)
+    else:
+        response = session.get(url, headers=headers, stream=max_size is not None)
+    # Release the pooled connection of streamed responses whatever the status
+    with response:
+        if response.status_code == 304 and meta:
+            return 200, http_cache.read_body(meta).decode("utf-8", errors="replace")
+        if response.status_code == 200:
+            body = read_limited(response, None if api else max_size)
+            if body is None:
+                return FILE_TOO_LARGE, None
+            http_cache.store(url, body, response.headers)
+            return 200, body.decode("utf-8", errors="replace")
+        return response.status_code, None
+
+def next_page_url(url: str) -> str:
+    """
+    Get the next page of a paginated resource already fetched with cached_get.
+
+    Args:
+        url (str): The URL of the current page.
+
+    Returns:
+        str: The URL of the next page, or None if it is the last one.
+    """
+    meta = http_cache.lookup(url)
+    match = NEXT_PAGE.search((meta or {}).get("link") or "")
+    return match.group(1) if match else None
+
+def merge_commit_page(response_data: dict, page: dict) -> dict:
+    """
+    Add the files of another page of a commit, which the API lists 300 at a time.
+
+    Args:
+        response_data (dict): The commit, as returned by the first page.
+        page (dict): The commit, as returned by a later page.
+
+    Returns:
+        dict: The commit with the files of both pages.
+    """
+    response_data['files'] = response_data.get('files', []) + page.get('files', [])
+    return response_data
+
+def get_commit_data(owner: str, repo: str, sha: str) -> tuple[int, dict]:
+    """
+    Get a commit from the GitHub API, with the files of every page.
+
+    Args:
+        owner (str): The owner of the repository.
+        repo (str): The name of the repository.
+        sha (str): The SHA of the commit.
+
+    Returns:
+        tuple[int, dict]: The status code and the commit (None if the request failed).
+    """
+    url = f"{github_api_url}/repos/{owner}/{repo}/commits/{sha}"
+    status, body = cached_get(url)
+    if status != 200:
+        return status, None
+
+    response_data = json.loads(body)
+    while url := next_page_url(url):
+        status, body = cached_get(url)
+        if status != 200:
+            return status, None
+        merge_commit_page(response_data, json.loads(body))
+    return 200, response_data
 
 def get_remaining_calls() -> int:
     """
@@ -14,10 +201,7 @@ def get_remaining_calls() -> int:
     Returns:
         int: The number of remaining API calls.
     """
-    headers = {
-        "Authorization": f"Bearer {git_token}"
-    }
-    response = requests.get("https://api.github.com/rate_limit", headers=headers)
+    response = session.get(f"{github_api_url}/rate_limit", headers=auth_headers())
     if response.status_code == 200:
         data = response.json()
         return data["rate"]["remaining"]
@@ -27,10 +211,7 @@ def wait_for_rate_limit_reset():
     """
     Wait until the rate limit resets.
     """
-    headers = {
-        "Authorization": f"Bearer {git_token}"
-    }
-    response = requests.get("https://api.github.com/rate_limit", headers=headers)
+    response = session.get(f"{github_api_url}/rate_limit", headers=auth_headers())
     if response.status_code == 200:
         data = response.json()
         reset_time = data["rate"]["reset"]
@@ -39,7 +220,80 @@ def wait_for_rate_limit_reset():
             wait_time = reset_time - current_time
             time.sleep(wait_time)
 
-def get_commit_details(owner: str, repo: str, sha: str) -> dict:
+def select_commit_files(response_data: dict, extensions: tuple[str, ...] = (".java",)) -> list[dict]:
+    """
+    Select the files of a commit with one of the given extensions and a patch.
+
+    Args:
+        response_data (dict): The commit as returned by the GitHub API.
+        extensions (tuple[str, ...]): The accepted file extensions, empty to accept every file.
+
+    Returns:
+        list[dict]: The matching file entries of the commit.
+    """
+    return [
+        file for file in response_data.get('files', [])
+        if (not extensions or file['filename'].endswith(tuple(extensions))) and 'patch' in file and file['patch'] is not None
+    ]
+
+def select_commit_file(response_data: dict, extensions: tuple[str, ...] = (".java",)) -> dict:
+    """
+    Select the first file of a commit with one of the given extensions and a patch.
+
+    Args:
+        response_data (dict): The commit as returned by the GitHub API.
+        extensions (tuple[str, ...]): The accepted file extensions.
+
+    Returns:
+        dict: The file entry of the commit, or None if there is no matching file.
+    """
+    files = select_commit_files(response_data, extensions)
+    return files[0] if files else None
+
+def build_file_details(file: dict, status: int, raw_content: str) -> dict:
+    """
+    Build the details stored for one file of a commit.
+
+    Args:
+        file (dict): The file entry of the commit.
+        status (int | str): The status code of the raw download, or FILE_TOO_LARGE.
+        raw_content (str): The content of the file after the commit, None if it was not downloaded.
+
+    Returns:
+        dict: The details of the file.
+    """
+    return {
+        "filename": file['filename'],
+        "status": file.get('status'),
+        "patch": file['patch'],
+        "raw_url": file['raw_url'],
+        "raw_content": raw_content,
+        "too_large": status == FILE_TOO_LARGE
+    }
+
+def build_commit_details(sha: str, response_data: dict, file: dict, raw_content: str) -> dict:
+    """
+    Build the commit details stored for a commit.
+
+    Args:
+        sha (str): The SHA of the commit.
+        response_data (dict): The commit as returned by the GitHub API.
+        file (dict): The selected file entry of the commit.
+        raw_content (str): The content of the file after the commit.
+
+    Returns:
+        dict: The details of the commit.
+    """
+    return {
+        "sha": sha,
+        "message": response_data['commit']['message'],
+        "filename": file['filename'],
+        "patch": file['patch'],
+        "raw_url": file['raw_url'],
+        "raw_content": raw_content
+    }
+
+def get_commit_details(owner: str, repo: str, sha: str, all_files: bool = False, extensions: tuple[str, ...] = (".java",), max_file_size: int = MAX_FILE_SIZE, max_workers: int = 8) -> dict:
     """
     Get the details of a commit from GitHub.
 
@@ -47,36 +301,67 @@ def get_commit_details(owner: str, repo: str, sha: str) -> dict:
         owner (str): The owner of the repository.
         repo (str): The name of the repository.
         sha (str): The SHA of the commit.
+        all_files (bool): If True, return every matching file under "files" instead of only the first one.
+        extensions (tuple[str, ...]): The accepted file extensions when all_files is True.
+        max_file_size (int): The size cap of each raw file when all_files is True, None for no limit.
+        max_workers (int): The number of raw files downloaded concurrently when all_files is True.
 
     Returns:
         dict: The details of the commit.
     """
-    headers = {
-        "Authorization": f"Bearer {git_token}"
-    }
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits/{sha}"
-    response = requests.get(url, headers=headers)
+    if all_files:
+        return get_commit_files(owner, repo, sha, extensions, max_file_size, max_workers)
+
+    status, response_data = get_commit_data(owner, repo, sha)
     
-    if response.status_code == 200:
-        response_data = response.json()
-        commit_message = response_data['commit']['message']
-        for file in response_data['files']:
-            if file['filename'].endswith('.java') and 'patch' in file and file['patch'] is not None:
-                raw_url = file['raw_url']
-                file_response = requests.get(raw_url)
-                if file_response.status_code == 200:
-                    file_response = file_response.text
-                    break
-                else:
-                    raise Exception(f"Failed to fetch file content for {owner}/{repo} with sha {sha}:\n {file['filename']}")
-
-        return {
-            "sha": sha,
-            "message": commit_message,
-            "filename": file['filename'],
-            "patch": file['patch'],
-            "raw_url": raw_url,
-            "raw_content": file_response
-        }
+    if status == 200:
+        file = select_commit_file(response_data)
+        if file is None:
+            raise Exception(f"No .java file with a patch in {owner}/{repo} with sha {sha}")
+
+        file_status, raw_content = cached_get(file['raw_url'], api=False)
+        if file_status != 200:
+            raise Exception(f"Failed to fetch file content for {owner}/{repo} with sha {sha}:\n {file['filename']}")
+
+        return build_commit_details(sha, response_data, file, raw_content)
     
-    raise Exception(f"Failed to fetch commit details for {owner}/{repo} with sha {sha}. Status code: {response.status_code}")
+    raise Exception(f"Failed to fetch commit details for {owner}/{repo} with sha {sha}. Status code: {status}")
+
+def get_commit_files(owner: str, repo: str, sha: str, extensions: tuple[str, ...] = (".java",), max_file_size: int = MAX_FILE_SIZE, max_workers: int = 8) -> dict:
+    """
+    Get the details of a commit from GitHub with every matching file, whose raw
+    contents are downloaded concurrently over the shared session. Files over the
+    size cap are kept with a None raw_content and too_large set.
+
+    Args:
+        owner (str): The owner of the repository.
+        repo (str): The name of the repository.
+        sha (str): The SHA of the commit.
+        extensions (tuple[str, ...]): The accepted file extensions, empty to accept every file.
+        max_file_size (int): The size cap of each raw file in bytes, None for no limit.
+        max_workers (int): The number of raw files downloaded concurrently.
+
+    Returns:
+        dict: The details of the commit. The top-level fields describe the first file,
+              as get_commit_details does, and "files" holds the details of every file.
+    """
+    status, response_data = get_commit_data(owner, repo, sha)
+    if status != 200:
+        raise Exception(f"Failed to fetch commit details for {owner}/{repo} with sha {sha}. Status code: {status}")
+
+    files = select_commit_files(response_data, extensions)
+    if not files:
+        raise Exception(f"No file matching {extensions} with a patch in {owner}/{repo} with sha {sha}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        downloads = list(executor.map(lambda file: cached_get(file['raw_url'], api=False, max_size=max_file_size), files))
+
+    files_details = []
+    for file, (file_status, raw_content) in zip(files, downloads):
+        if file_status not in (200, FILE_TOO_LARGE):
+            raise Exception(f"Failed to fetch file content for {owner}/{repo} with sha {sha}:\n {file['filename']}")
+        files_details.append(build_file_details(file, file_status, raw_content))
+
+    commit_details = build_commit_details(sha, response_data, files[0], files_details[0]["raw_content"])
+    commit_details["files"] = files_details
+    return commit_details
@@ -0,0 +1,127 @@
+import threading
+import hashlib
+import json
+import os
+import re
+
+# A full commit SHA in the path means the resource can never change
+IMMUTABLE_URL = re.compile(r"/(?:commits|raw|blob)/[0-9a-f]{40}(?:[/?]|$)")
+
+class HttpCache:
+    """
+    Persistent cache of HTTP responses keyed by URL.
+
+    For each URL a small metadata file stores the ETag / Last-Modified validators, the
+    Link header of paginated responses and the digest of the body. Bodies are stored content-addressed by their sha256, so
+    identical files downloaded through different URLs are kept once. All writes go
+    through a temporary file and a rename, so several workers can share one folder.
+    """
+    def __init__(self, path: str = "LLMs/Cache/http"):
+        """
+        Args:
+            path (str): The folder of the cache.
+        """
+        self.path = path
+
+    @staticmethod
+    def _digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _meta_path(self, url: str) -> str:
+        key = self._digest(url.encode("utf-8"))
+        return os.path.join(self.path, "meta", key[:2], f"{key}.json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, "blobs", digest[:2], digest)
+
+    @staticmethod
+    def _write_atomic(file_path: str, data: bytes):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Unique per thread, the workers of a process may write the same blob at once
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def is_immutable(url: str) -> bool:
+        """
+        Check if a URL points to a resource pinned to a commit SHA, which can be
+        served from the cache without revalidation.
+        """
+        return IMMUTABLE_URL.search(url) is not None
+
+    def lookup(self, url: str) -> dict:
+        """
+        Get the cache entry of a URL.
+
+        Args:
+            url (str): The URL of the resource.
+
+        Returns:
+            dict: The metadata of the entry, or None if the URL is not cached.
+        """
+        meta_path = self._meta_path(url)
+        if not os.path.isfile(meta_path):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(self._blob_path(meta["digest"])):
+            return None
+        return meta
+
+    def read_body(self, meta: dict) -> bytes:
+        """
+        Read the body of a cache entry.
+        """
+        with open(self._blob_path(meta["digest"]), "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def conditional_headers(meta: dict) -> dict:
+        """
+        Build the headers of a conditional request for a cache entry.
+
+        Args:
+            meta (dict): The metadata of the entry, or None.
+
+        Returns:
+            dict: The If-None-Match / If-Modified-Since headers.
+        """
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, url: str, body: bytes, headers) -> dict:
+        """
+        Store a successful response.
+
+        Args:
+            url (str): The URL of the resource.
+            body (bytes): The body of the response.
+            headers: The response headers.
+
+        Returns:
+            dict: The metadata of the new entry.
+        """
+        digest = self._digest(body)
+        blob_path = self._blob_path(digest)
+        if not os.path.isfile(blob_path):
+            self._write_atomic(blob_path, body)
+
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "link": headers.get("Link"),
+            "digest": digest,
+        }
+        self._write_atomic(self._meta_path(url), json.dumps(meta).encode("utf-8"))
+        return meta
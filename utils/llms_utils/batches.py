@@ -0,0 +1,329 @@
+from .llms_utils import PROMPT_DEPENDENCIES, generated_prompt_model, get_code_review, save_code_review
+from ..os_utils import exists_or_create_folder
+from .llm import LLM
+import hashlib
+import sqlite3
+import uuid
+import copy
+import json
+import time
+import os
+import re
+
+# Batch APIs only accept short identifiers made of these characters
+CUSTOM_ID = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+
+# Margin for the clock of the provider when looking up a batch by its creation time, in seconds
+CLOCK_SKEW = 300
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS batch ("
+    "batch_id TEXT PRIMARY KEY, "
+    "provider TEXT NOT NULL, "
+    "model TEXT NOT NULL, "
+    "version TEXT NOT NULL, "
+    "status TEXT NOT NULL, "  # pending until the provider returns its id, submitted, then collected once its results are saved
+    "submitted_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS batch_item ("
+    "batch_id TEXT NOT NULL, "
+    "custom_id TEXT NOT NULL, "
+    "sha TEXT NOT NULL, "
+    "prompt TEXT NOT NULL, "
+    "prompt_used TEXT NOT NULL, "
+    "status TEXT NOT NULL, "  # submitted, succeeded or errored
+    "error TEXT, "
+    "PRIMARY KEY (batch_id, custom_id))",
+    "CREATE INDEX IF NOT EXISTS batch_item_sha_prompt ON batch_item (sha, prompt)",
+]
+
+def batch_custom_id(sha: str, prompt_name: str) -> str:
+    """
+    Build the custom_id of a (sha, prompt) request. It is "<prompt>-<sha>" when that
+    is a valid identifier, otherwise a hash of both, so ids never collide across prompts.
+
+    Args:
+        sha (str): The commit SHA.
+        prompt_name (str): The name of the prompt.
+
+    Returns:
+        str: The custom_id, matching ^[a-zA-Z0-9_-]{1,64}$.
+    """
+    custom_id = f"{prompt_name}-{sha}"
+    if CUSTOM_ID.match(custom_id):
+        return custom_id
+    return hashlib.sha256(f"{prompt_name}\0{sha}".encode("utf-8")).hexdigest()
+
+class BatchLedger:
+    """
+    Persisted ledger of the submitted batch jobs and their requests, so a run
+    interrupted while batches are processing resumes polling them instead of
+    submitting them again.
+    """
+    def __init__(self, path: str = "LLMs/Results/batches.sqlite3"):
+        """
+        Args:
+            path (str): The path of the SQLite database.
+        """
+        self.path = path
+        exists_or_create_folder(os.path.dirname(path) or ".")
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            for ddl in SCHEMA:
+                self.conn.execute(ddl)
+
+    def reserve_batch(self, provider: str, model: str, version: str, items: list[dict]) -> str:
+        """
+        Record a batch and its requests before submitting it, under a local id
+        replaced by the id of the provider once the submission returns.
+
+        Returns:
+            str: The local id of the batch.
+        """
+        ledger_id = f"pending-{uuid.uuid4().hex}"
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO batch (batch_id, provider, model, version, status, submitted_at) VALUES (?, ?, ?, ?, 'pending', ?)",
+                (ledger_id, provider, model, version, time.time())
+            )
+            self.conn.executemany(
+                "INSERT INTO batch_item (batch_id, custom_id, sha, prompt, prompt_used, status) VALUES (?, ?, ?, ?, ?, 'submitted')",
+                [(ledger_id, item['custom_id'], item['sha'], item['prompt'], json.dumps(item['message'])) for item in items]
+            )
+        return ledger_id
+
+    def set_batch_id(self, ledger_id: str, batch_id: str):
+        """
+        Record the id the provider gave to a reserved batch.
+        """
+        with self.conn:
+            self.conn.execute("UPDATE batch SET batch_id = ?, status = 'submitted' WHERE batch_id = ?", (batch_id, ledger_id))
+            self.conn.execute("UPDATE batch_item SET batch_id = ? WHERE batch_id = ?", (batch_id, ledger_id))
+
+    def drop_batch(self, ledger_id: str):
+        """
+        Forget a reserved batch that never reached the provider, so its requests are submitted again.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM batch_item WHERE batch_id = ?", (ledger_id,))
+            self.conn.execute("DELETE FROM batch WHERE batch_id = ?", (ledger_id,))
+
+    def pending_batches(self, provider: str, model: str, version: str) -> list[tuple[str, float]]:
+        """
+        Get the reserved batches whose submission was not recorded, with the time they were reserved.
+        """
+        return self.conn.execute(
+            "SELECT batch_id, submitted_at FROM batch WHERE provider = ? AND model = ? AND version = ? AND status = 'pending' ORDER BY submitted_at",
+            (provider, model, version)
+        ).fetchall()
+
+    def open_batches(self, provider: str, model: str, version: str) -> list[str]:
+        """
+        Get the batches whose results were not collected yet.
+        """
+        rows = self.conn.execute(
+            "SELECT batch_id FROM batch WHERE provider = ? AND model = ? AND version = ? AND status = 'submitted' ORDER BY submitted_at",
+            (provider, model, version)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_items(self, batch_id: str) -> dict[str, dict]:
+        """
+        Get the requests of a batch, by custom_id.
+        """
+        rows = self.conn.execute(
+            "SELECT custom_id, sha, prompt, prompt_used FROM batch_item WHERE batch_id = ?",
+            (batch_id,)
+        ).fetchall()
+        return {custom_id: {"sha": sha, "prompt": prompt, "prompt_used": json.loads(prompt_used)} for custom_id, sha, prompt, prompt_used in rows}
+
+    def set_item_status(self, batch_id: str, custom_id: str, status: str, error: str = None):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE batch_item SET status = ?, error = ? WHERE batch_id = ? AND custom_id = ?",
+                (status, error, batch_id, custom_id)
+            )
+
+    def close_batch(self, batch_id: str):
+        """
+        Mark a batch as collected, every request not answered is marked as errored.
+        """
+        with self.conn:
+            self.conn.execute("UPDATE batch_item SET status = 'errored', error = 'No result' WHERE batch_id = ? AND status = 'submitted'", (batch_id,))
+            self.conn.execute("UPDATE batch SET status = 'collected' WHERE batch_id = ?", (batch_id,))
+
+    def attempts(self, provider: str, model: str, version: str, sha: str, prompt_name: str) -> int:
+        """
+        Get the number of batches a (sha, prompt) request was submitted in.
+        """
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM batch_item i JOIN batch b ON b.batch_id = i.batch_id "
+            "WHERE i.sha = ? AND i.prompt = ? AND b.provider = ? AND b.model = ? AND b.version = ?",
+            (sha, prompt_name, provider, model, version)
+        ).fetchone()
+        return row[0]
+
+class BatchRunner:
+    """
+    Generates the code reviews of a provider through its batch API.
+
+    The missing (sha, prompt) reviews are recorded in the ledger and submitted in
+    batches, polled with an exponential backoff and their results saved straight into
+    the results store. Errored or expired requests are submitted again, up to
+    max_attempts times. Prompts listed in PROMPT_DEPENDENCIES are submitted in a
+    later round, once the review they depend on is saved.
+
+    The LLM must implement submit_batch, get_batch_status and iter_batch_results.
+    find_batch lets it resume a batch whose submission was interrupted.
+    """
+    def __init__(self, llm: LLM, provider: str, version: str, path: str = "LLMs/Results", ledger: BatchLedger = None,
+                 batch_size: int = 10000, max_attempts: int = 3, poll_interval: float = 30, max_poll_interval: float = 600):
+        """
+        Args:
+            llm (LLM): The LLM of the provider.
+            provider (str): The name of the provider.
+            version (str): The version of the experiment.
+            path (str): The base path where results are stored.
+            ledger (BatchLedger): The ledger of the batches, <path>/batches.sqlite3 by default.
+            batch_size (int): The maximum number of requests per batch.
+            max_attempts (int): The number of times a request is submitted before giving up.
+            poll_interval (float): The first wait between two status checks, in seconds.
+            max_poll_interval (float): The longest wait between two status checks, in seconds.
+        """
+        self.llm = llm
+        self.provider = provider
+        self.model = llm.model_name
+        self.version = version
+        self.path = path
+        self.ledger = ledger or BatchLedger(os.path.join(path, "batches.sqlite3"))
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+
+    def pending_items(self, shas: list[str], prompts: list[dict], commit_infos: dict) -> list[dict]:
+        """
+        Build the requests of the reviews still missing that can be submitted now.
+
+        Returns:
+            list[dict]: The requests, with their custom_id, sha, prompt name, messages and max_length.
+        """
+        batch_prompts = []
+        for sha in shas:
+            for original_prompt in prompts:
+                name = original_prompt['name']
+                if generated_prompt_model(sha, self.provider, self.model, name, self.version, self.path):
+                    continue
+                if self.ledger.attempts(self.provider, self.model, self.version, sha, name) >= self.max_attempts:
+                    continue
+
+                prompt = copy.deepcopy(original_prompt)
+                dependency = PROMPT_DEPENDENCIES.get(name)
+                if dependency:
+                    if not generated_prompt_model(sha, self.provider, self.model, dependency, self.version, self.path):
+                        continue
+                    prompt['code_review'] = get_code_review(sha, self.provider, self.model, dependency, self.version, self.path)
+
+                batch_prompts.append(({**commit_infos[sha], "sha": sha}, prompt))
+        return self.llm.batch_requests(batch_prompts)
+
+    def submit(self, items: list[dict]) -> list[str]:
+        """
+        Submit the requests in batches of at most batch_size. Each batch is recorded in
+        the ledger before it is submitted, so a run stopped in between finds it again.
+
+        Returns:
+            list[str]: The ids of the batches.
+        """
+        batch_ids = []
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            ledger_id = self.ledger.reserve_batch(self.provider, self.model, self.version, chunk)
+            batch_id = self.llm.submit_batch(chunk)
+            self.ledger.set_batch_id(ledger_id, batch_id)
+            print(f"Submitted batch {batch_id} for {self.provider} - {self.model} with {len(chunk)} requests")
+            batch_ids.append(batch_id)
+        return batch_ids
+
+    def resolve_pending(self):
+        """
+        Look up the batches a previous run reserved but did not record as submitted.
+        A batch the provider confirms is resumed, the others are dropped and submitted again.
+        """
+        for ledger_id, reserved_at in self.ledger.pending_batches(self.provider, self.model, self.version):
+            items = self.ledger.get_items(ledger_id)
+            batch_id = self.llm.find_batch(items, reserved_at - CLOCK_SKEW)
+            if batch_id is None:
+                print(f"Batch of {len(items)} requests for {self.provider} - {self.model} could not be found, submitting it again")
+                self.ledger.drop_batch(ledger_id)
+            else:
+                print(f"Found batch {batch_id} for {self.provider} - {self.model}, whose submission was not recorded")
+                self.ledger.set_batch_id(ledger_id, batch_id)
+
+    def wait(self, batch_id: str):
+        """
+        Poll a batch until it ends, waiting longer after each check.
+        """
+        interval = self.poll_interval
+        while self.llm.get_batch_status(batch_id) != "ended":
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+    def collect(self, batch_id: str) -> int:
+        """
+        Save the results of an ended batch into the results store.
+
+        Returns:
+            int: The number of code reviews saved.
+        """
+        items = self.ledger.get_items(batch_id)
+        saved = 0
+        for custom_id, text, error in self.llm.iter_batch_results(batch_id):
+            item = items.get(custom_id)
+            if item is None:
+                continue
+            if error is None and text and text.strip():
+                save_code_review(text.strip(), item['sha'], self.provider, self.model, item['prompt'], self.version, self.path, prompt_used=item['prompt_used'])
+                self.ledger.set_item_status(batch_id, custom_id, "succeeded")
+                saved += 1
+            else:
+                self.ledger.set_item_status(batch_id, custom_id, "errored", error or "Empty response")
+        self.ledger.close_batch(batch_id)
+        print(f"Collected batch {batch_id}: {saved}/{len(items)} code reviews saved")
+        return saved
+
+    def run(self, shas: list[str], prompts: list[dict], commit_infos: dict) -> int:
+        """
+        Generate every missing code review, resuming the batches of a previous run first.
+
+        Args:
+            shas (list[str]): The commit SHAs of the experiment.
+            prompts (list[dict]): The prompts of the experiment.
+            commit_infos (dict): The details of each commit, by SHA.
+
+        Returns:
+            int: The number of code reviews saved.
+
+        Raises:
+            RuntimeError: If some code reviews are still missing after max_attempts submissions.
+        """
+        saved = 0
+        self.resolve_pending()
+        for batch_id in self.ledger.open_batches(self.provider, self.model, self.version):
+            print(f"Resuming batch {batch_id} for {self.provider} - {self.model}")
+            self.wait(batch_id)
+            saved += self.collect(batch_id)
+
+        while items := self.pending_items(shas, prompts, commit_infos):
+            for batch_id in self.submit(items):
+                self.wait(batch_id)
+                saved += self.collect(batch_id)
+
+        missing = sum(
+            1 for sha in shas for prompt in prompts
+            if not generated_prompt_model(sha, self.provider, self.model, prompt['name'], self.version, self.path)
+        )
+        if missing:
+            raise RuntimeError(f"{missing} code reviews of {self.provider} - {self.model} could not be generated with batches")
+
+        return saved
@@ -2,18 +2,18 @@
 # commits with Google's model with different prompts
 
 from transformers import T5ForConditionalGeneration, AutoTokenizer, BitsAndBytesConfig
-from .llm import LLM
+from .hf_llm import HuggingFaceLLM
 import torch
-import gc
 
-class Flan(LLM):
+class Flan(HuggingFaceLLM):
     """
     Class to handle the Flan models for code review generation.
     """
     def __init__(self, model_name: str):
         super().__init__(model_name)
+        # bitsandbytes quantization needs a GPU, on CPU the model is loaded unquantized
         quantization_config = BitsAndBytesConfig(
-            load_in_8_bit=True)
+            load_in_8_bit=True) if torch.cuda.is_available() else None
         self.model = T5ForConditionalGeneration.from_pretrained(model_name, device_map="auto", quantization_config=quantization_config)
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model.eval()
@@ -34,50 +34,49 @@ class Flan(LLM):
             or 2048  # FLAN-UL2 typical context
         )
 
-    def end_model(self):
-        del self.model
-        del self.tokenizer
-        gc.collect()
-        torch.cuda.empty_cache()
-        for i in range(torch.cuda.device_count()):
-            with torch.cuda.device(i):
-                torch.cuda.empty_cache()
-
-    def ask(self, message: list[dict], max_length: int = 1024, name: str = 'zero-shot') -> str:
+    def format_prompt(self, message: list[dict], name: str = 'zero-shot') -> str:
         """
-        Generate a response from the Flan model based on the input message.
-        
+        Apply the chat template if the tokenizer has one, otherwise join the messages.
+
         Args:
             message (list[dict]): The input message for the LLM.
-            max_length (int): The maximum length of the generated response.
             name (str): The name of the prompt technique.
 
         Returns:
-            str: The generated response from the LLM.
+            str: The prompt text.
         """
         if self.tokenizer.chat_template is not None:
-            prompt = self.tokenizer.apply_chat_template(
+            return self.tokenizer.apply_chat_template(
                 message,
+                tokenize=False,
                 add_generation_prompt=True,
                 enable_thinking= (name != 'zero-shot')
             )
-        else:
-            prompt = "\n".join([f"{m['role']}: {m['content']}" for m in message])
-        
-        # Tokenize with truncation to avoid "sequence length > max" errors
+        return "\n".join([f"{m['role']}: {m['content']}" for m in message])
+
+    def generate_texts(self, texts: list[str], name: str = 'zero-shot', max_length: int = 1024) -> list[str]:
+        """
+        Generate the responses of several prompts in a single padded batch.
+
+        Args:
+            texts (list[str]): The prompt texts, as returned by format_prompt.
+            name (str): The name of the prompt technique.
+            max_length (int): The maximum length of the generated responses.
+
+        Returns:
+            list[str]: The responses, in the order of the texts.
+        """
+        # Tokenize with truncation to avoid "sequence length > max" errors; the encoder
+        # reads the attention mask, so the padding side does not change the outputs
         enc = self.tokenizer(
-            prompt,
+            texts,
             return_tensors="pt",
             truncation=True,
             max_length=self.max_ctx,
-            padding=False,
+            padding=True,
         )
         enc = {k: v.to(self.model.device) for k, v in enc.items()}
 
-        # Optional hard ceiling on total length (input + output), extra safety
-        total_cap = self.max_ctx + max_length
-
-        #inputs = self.tokenizer(prompt, return_tensors="pt").input_ids.to(self.model.device)
         with torch.no_grad():
             outputs = self.model.generate(
                 **enc,
@@ -86,4 +85,4 @@ class Flan(LLM):
                 pad_token_id=self.model.config.pad_token_id,
             )
 
-        return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
@@ -1,45 +1,200 @@
 # File to generate code reviews from vulnerability-fixing
 # commits with OpenAI's model with different prompts
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, NotFoundError
 from dotenv import load_dotenv
+from typing import Iterator
 from .llm import LLM
+import json
 import os
 
+# Statuses of a batch once it will not process more requests
+BATCH_ENDED = ("completed", "failed", "expired", "cancelled")
+
 class Gpt(LLM):
     """
     Class to handle the OpenAI models for code review generation.
     """
+    max_concurrency = 32
+
     def __init__(self, model_name: str):
         super().__init__(model_name)
         load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OpenAI_API_KEY"))
+        # OpenAI_base_url points the client to a compatible server, e.g. a local fake of the API
+        self.base_url = os.getenv("OpenAI_base_url") or None
+        self.client = OpenAI(api_key=os.getenv("OpenAI_API_KEY"), base_url=self.base_url)
+        self.async_client = None
     
-    def ask(self, message: list[dict], max_length: int = 1024, name: str = 'zero-shot') -> str:
+    def request_args(self, message: list[dict], max_length: int = 1024, name: str = 'zero-shot') -> dict:
         """
-        Generate a response from the OpenAI model based on the input message.
-        
+        Build the arguments of a Responses API request.
+
         Args:
             message (list[dict]): The input message for the LLM.
             max_length (int): The maximum length of the generated response.
             name (str): The name of the prompt technique.
 
         Returns:
-            str: The generated response from the LLM.
+            dict: The arguments of responses.create.
         """
-        
         input_message = next((m['content'] for m in message if m.get('role') == 'user'), '')
         instruction = next((m['content'] for m in message if m.get('role') == 'system'), '')
 
         reasoning = {"effort": "medium"}
         if name == 'zero-shot':
             reasoning = {"effort": "low"}
-        response = self.client.responses.create(
-            reasoning=reasoning,
-            model=self.model_name,
-            input=input_message,
-            max_output_tokens=max_length,
-            instructions=instruction,
-        )
+        return {
+            "reasoning": reasoning,
+            "model": self.model_name,
+            "input": input_message,
+            "max_output_tokens": max_length,
+            "instructions": instruction,
+        }
+
+    def ask(self, message: list[dict], max_length: int = 1024, name: str = 'zero-shot') -> str:
+        """
+        Generate a response from the OpenAI model based on the input message.
+        
+        Args:
+            message (list[dict]): The input message for the LLM.
+            max_length (int): The maximum length of the generated response.
+            name (str): The name of the prompt technique.
+
+        Returns:
+            str: The generated response from the LLM.
+        """
+        response = self.client.responses.create(**self.request_args(message, max_length, name))
 
         text = response.output_text
         return text.strip()
+
+    async def ask_async(self, message: list[dict], max_length: int = 1024, name: str = 'zero-shot') -> str:
+        """
+        Asynchronous version of ask, using the AsyncOpenAI client.
+        """
+        # Created on first use, inside the event loop that runs the requests
+        if self.async_client is None:
+            self.async_client = AsyncOpenAI(api_key=os.getenv("OpenAI_API_KEY"), base_url=self.base_url)
+        response = await self.async_client.responses.create(**self.request_args(message, max_length, name))
+
+        text = response.output_text
+        return text.strip()
+
+    def submit_batch(self, requests: list[dict]) -> str:
+        """
+        Upload the requests as a JSONL file and create a batch on the Responses endpoint.
+
+        Args:
+            requests (list[dict]): The requests, each one with its custom_id, message, max_length and prompt name.
+
+        Returns:
+            str: The id of the batch.
+        """
+        lines = [
+            json.dumps({
+                "custom_id": request['custom_id'],
+                "method": "POST",
+                "url": "/v1/responses",
+                "body": self.request_args(request['message'], request['max_length'], request['prompt']),
+            })
+            for request in requests
+        ]
+        input_file = self.client.files.create(
+            file=("batch.jsonl", ("\n".join(lines) + "\n").encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/responses",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def get_batch_status(self, batch_id: str) -> str:
+        """
+        Get the status of a batch.
+
+        Args:
+            batch_id (str): The id of the batch.
+
+        Returns:
+            str: "ended" once the batch completed, failed, expired or was cancelled, "in_progress" otherwise.
+        """
+        batch = self.client.batches.retrieve(batch_id)
+        return "ended" if batch.status in BATCH_ENDED else "in_progress"
+
+    def iter_batch_results(self, batch_id: str) -> Iterator[tuple[str, str, str]]:
+        """
+        Stream the output and error files of an ended batch.
+
+        Args:
+            batch_id (str): The id of the batch.
+
+        Returns:
+            Iterator[tuple[str, str, str]]: A generator of (custom_id, text, error) tuples, error is None on success.
+        """
+        batch = self.client.batches.retrieve(batch_id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            with self.client.files.with_streaming_response.content(file_id) as response:
+                for line in response.iter_lines():
+                    if line.strip():
+                        yield self.parse_batch_result(json.loads(line))
+
+    @staticmethod
+    def parse_batch_result(result: dict) -> tuple[str, str, str]:
+        """
+        Read one line of a batch output or error file.
+
+        Args:
+            result (dict): The line, with the custom_id and the response or error.
+
+        Returns:
+            tuple[str, str, str]: The custom_id, the text of the response and the error, None on success.
+        """
+        response = result.get("response") or {}
+        body = response.get("body") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            error = result.get("error") or body.get("error") or f"HTTP {response.get('status_code')}"
+            return result["custom_id"], None, json.dumps(error) if isinstance(error, dict) else str(error)
+
+        # The raw body has no output_text, join the text of the message outputs
+        text = "".join(
+            content.get("text", "")
+            for output in body.get("output", []) if output.get("type") == "message"
+            for content in output.get("content", []) if content.get("type") == "output_text"
+        )
+        return result["custom_id"], text.strip(), None
+
+    def find_batch(self, items: dict[str, dict], created_after: float) -> str:
+        """
+        Find a batch on the Responses endpoint whose input file holds exactly these
+        requests: the same custom_ids, each one for this model and with the same input.
+
+        Args:
+            items (dict[str, dict]): The requests of the batch by custom_id, as returned by BatchLedger.get_items.
+            created_after (float): The earliest creation time of the batch, as a timestamp.
+
+        Returns:
+            str: The id of the batch, or None if it was not found.
+        """
+        # The input of each request, which tells the experiment version apart as well
+        wanted = {
+            custom_id: self.request_args(item['prompt_used'], name=item['prompt'])['input']
+            for custom_id, item in items.items()
+        }
+        # Listed from the most recent
+        for batch in self.client.batches.list(limit=100):
+            if batch.created_at < created_after:
+                break
+            if batch.endpoint != "/v1/responses":
+                continue
+            try:
+                with self.client.files.with_streaming_response.content(batch.input_file_id) as response:
+                    requests = [json.loads(line) for line in response.iter_lines() if line.strip()]
+            except NotFoundError:
+                continue
+            submitted = {request["custom_id"]: request["body"].get("input") for request in requests}
+            if submitted == wanted and all(request["body"].get("model") == self.model_name for request in requests):
+                return batch.id
+        return None
@@ -0,0 +1,172 @@
+# Base class of the models run locally with Hugging Face Transformers,
+# with batched generation sized to the available memory
+from .llm import LLM
+import torch
+import copy
+import gc
+
+class HuggingFaceLLM(LLM):
+    """
+    Base class of the local Hugging Face models (Qwen, Flan).
+
+    Subclasses load self.model and self.tokenizer, and implement format_prompt and
+    generate_texts, which generates a padded batch of prompts in one model.generate call.
+    generate_many groups the prompts by prompt technique and length, so each
+    micro-batch wastes little padding, and sizes the micro-batches to the memory left
+    on the accelerator, halving them when generation runs out of memory.
+    """
+    # Upper bound of the sequences generated together, also used on CPU
+    max_batch_size = 16
+    # Share of the free accelerator memory the key/value cache of a micro-batch may use
+    memory_fraction = 0.8
+
+    def end_model(self):
+        del self.model
+        del self.tokenizer
+        gc.collect()
+        torch.cuda.empty_cache()
+        for i in range(torch.cuda.device_count()):
+            with torch.cuda.device(i):
+                torch.cuda.empty_cache()
+
+    def format_prompt(self, message: list[dict], name: str = 'zero-shot') -> str:
+        """
+        Turn the messages into the text given to the tokenizer.
+
+        Args:
+            message (list[dict]): The input message for the LLM.
+            name (str): The name of the prompt technique.
+
+        Returns:
+            str: The prompt text.
+        """
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def generate_texts(self, texts: list[str], name: str = 'zero-shot', max_length: int = 1024) -> list[str]:
+        """
+        Generate the responses of several prompts of the same technique in a single padded batch.
+
+        Args:
+            texts (list[str]): The prompt texts, as returned by format_prompt.
+            name (str): The name of the prompt technique.
+            max_length (int): The maximum length of the generated responses.
+
+        Returns:
+            list[str]: The responses, in the order of the texts.
+        """
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def ask(self, message: list[dict], max_length: int = 1024, name: str = 'zero-shot') -> str:
+        """
+        Generate a response from the model based on the input message.
+
+        Args:
+            message (list[dict]): The input message for the LLM.
+            max_length (int): The maximum length of the generated response.
+            name (str): The name of the prompt technique.
+
+        Returns:
+            str: The generated response from the LLM.
+        """
+        return self.generate_texts([self.format_prompt(message, name)], name, max_length)[0]
+
+    def kv_bytes_per_token(self) -> int:
+        """
+        Estimate the memory of the key/value cache of one token.
+        """
+        cfg = self.model.config
+        layers = getattr(cfg, "num_hidden_layers", None) or getattr(cfg, "num_layers", None) or 32
+        hidden = getattr(cfg, "hidden_size", None) or getattr(cfg, "d_model", None) or 4096
+        heads = getattr(cfg, "num_attention_heads", None) or getattr(cfg, "num_heads", None)
+        kv_heads = getattr(cfg, "num_key_value_heads", None)
+        if heads and kv_heads:
+            # Grouped-query attention caches fewer heads than it attends with
+            hidden = kv_heads * (getattr(cfg, "head_dim", None) or hidden // heads)
+        element_size = torch.tensor([], dtype=self.model.dtype).element_size()
+        return 2 * layers * hidden * element_size
+
+    def micro_batch_size(self, tokens_per_sequence: int) -> int:
+        """
+        Get the number of sequences of the given length that fit in the free accelerator memory.
+
+        Args:
+            tokens_per_sequence (int): The prompt length plus the maximum length of the response.
+
+        Returns:
+            int: The micro-batch size, max_batch_size on CPU.
+        """
+        device = self.model.device
+        if device.type != "cuda":
+            return self.max_batch_size
+        free, _ = torch.cuda.mem_get_info(device)
+        size = int(free * self.memory_fraction // (self.kv_bytes_per_token() * tokens_per_sequence))
+        return max(1, min(size, self.max_batch_size))
+
+    @staticmethod
+    def is_out_of_memory(error: Exception) -> bool:
+        return isinstance(error, torch.cuda.OutOfMemoryError) or "out of memory" in str(error).lower()
+
+    def generate_group(self, texts: list[str], name: str, max_length: int) -> list[str]:
+        """
+        Generate the responses of prompts of the same technique, longest first, in
+        micro-batches sized to the free memory.
+
+        Returns:
+            list[str]: The responses, in the order of the texts.
+        """
+        lengths = [len(self.tokenizer(text, add_special_tokens=False).input_ids) for text in texts]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+
+        results = [None] * len(texts)
+        limit = self.max_batch_size
+        start = 0
+        while start < len(order):
+            # Sorted by length, so the first sequence is the longest of the micro-batch
+            size = min(limit, self.micro_batch_size(lengths[order[start]] + max_length), len(order) - start)
+            chunk = order[start:start + size]
+            try:
+                texts_chunk = self.generate_texts([texts[i] for i in chunk], name, max_length)
+            except Exception as error:
+                if size == 1 or not self.is_out_of_memory(error):
+                    raise
+                gc.collect()
+                torch.cuda.empty_cache()
+                limit = max(1, size // 2)
+                print(f"Out of memory with {size} sequences, retrying with {limit}")
+                continue
+
+            for i, text in zip(chunk, texts_chunk):
+                results[i] = text
+            start += size
+        return results
+
+    def generate_many(self, batch_prompts: list[tuple[dict, dict]]) -> list[tuple[str, list[dict]]]:
+        """
+        Generate the code reviews of a batch of prompts on the local model.
+
+        Args:
+            batch_prompts (list[tuple[dict, dict]]): A list of tuples, each containing commit_info and prompt.
+
+        Returns:
+            list[tuple[str, list[dict]]]: The code review and the prompt used of each prompt, in input order.
+        """
+        messages = []
+        groups = {}
+        for i, (commit_info, prompt) in enumerate(batch_prompts):
+            message, max_length = self.build_prompt(commit_info, copy.deepcopy(prompt))
+            messages.append(message)
+            groups.setdefault((prompt['name'], max_length), []).append(i)
+
+        texts = [None] * len(batch_prompts)
+        for (name, max_length), indices in groups.items():
+            generated = self.generate_group([self.format_prompt(messages[i], name) for i in indices], name, max_length)
+            for i, text in zip(indices, generated):
+                texts[i] = text.strip()
+
+                # The batched generation was the first attempt, retry empty responses as generate does
+                for length in self.retry_lengths(max_length, start=1):
+                    if texts[i]:
+                        break
+                    texts[i] = self.ask(messages[i], max_length=length, name=name).strip()
+
+        return [(text, message) for text, message in zip(texts, messages)]
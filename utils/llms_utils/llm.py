@@ -1,10 +1,16 @@
+from typing import Iterator
+import asyncio
+import copy
 
 class LLM:
     """
     Base class for Language Model (LLM) providers.
     This class should be extended by specific LLM implementations.
     """
-    
+    # Requests the scheduler may send to one instance at the same time. Local models
+    # keep 1 and run one after the other; API providers raise it.
+    max_concurrency = 1
+
     def __init__(self, model_name: str, retry_max: int = 5):
         self.model_name = model_name
         self.retry_max = retry_max
@@ -24,17 +30,33 @@ class LLM:
         """
         raise NotImplementedError("Subclasses should implement this method.")
     
-    def generate(self, commit_info: dict, prompt: dict) -> tuple[str, list[dict]]:
+    async def ask_async(self, message: str, *args, **kwargs) -> str:
         """
-        Call the proper method to generate a code review based on the prompt technique.
+        Asynchronous version of ask. Subclasses with an asynchronous client should
+        override it; by default ask runs in a worker thread so the event loop is not blocked.
+
+        Args:
+            message (str): The input message for the LLM.
+            *args: Additional positional arguments for the LLM.
+            **kwargs: Additional keyword arguments for the LLM.
+
+        Returns:
+            str: The generated response from the LLM.
+        """
+        return await asyncio.to_thread(self.ask, message, *args, **kwargs)
+
+    def build_prompt(self, commit_info: dict, prompt: dict) -> tuple[list[dict], int]:
+        """
+        Fill the prompt with the commit and, for self-reflection, the previous code review.
+        The messages of the prompt are updated in place.
 
         Args:
             commit_info (dict): Information about the commit.
             prompt (dict): The prompt to use for code review generation.
 
         Returns:
-            str: The generated code review from the LLM.
-            list[dict]: The prompt used for the generation.
+            list[dict]: The messages to send to the LLM.
+            int: The maximum length of the response.
         """
         commit_text = f'Commit Message: {commit_info["message"]}\n\nDiff:\n{commit_info["patch"]}'
 
@@ -47,20 +69,65 @@ class LLM:
                 
                 if prompt['name'] == 'self-reflection':
                     prompt_element['content'] = prompt_element['content'].replace('[previous_response]', prompt['code_review'])
-        
-        retry_count = 0
-        while retry_count < self.retry_max:
-            text = self.ask(message=prompt['prompt'], name=prompt['name'], max_length=max_length*(1+retry_count))
-            text = text.strip()
-            if text != '' and text != None:
-                break
-            retry_count += 1
-            print(f"Retrying {self.model_name} generation, attempt {retry_count}/{self.retry_max}")
-        
-        if retry_count == self.retry_max:
-            return '', prompt['prompt']
-
-        return text, prompt['prompt']
+
+        return prompt['prompt'], max_length
+
+    def retry_lengths(self, max_length: int, start: int = 0) -> Iterator[int]:
+        """
+        Retry policy of the generation: an empty response is requested again, up to
+        retry_max times in total, allowing a longer response each time.
+
+        Args:
+            max_length (int): The maximum length of the first response.
+            start (int): The number of attempts already made.
+
+        Returns:
+            Iterator[int]: A generator of the maximum length of each attempt.
+        """
+        for retry_count in range(start, self.retry_max):
+            if retry_count:
+                print(f"Retrying {self.model_name} generation, attempt {retry_count}/{self.retry_max}")
+            yield max_length * (1 + retry_count)
+
+    def generate(self, commit_info: dict, prompt: dict) -> tuple[str, list[dict]]:
+        """
+        Call the proper method to generate a code review based on the prompt technique.
+
+        Args:
+            commit_info (dict): Information about the commit.
+            prompt (dict): The prompt to use for code review generation.
+
+        Returns:
+            str: The generated code review from the LLM.
+            list[dict]: The prompt used for the generation.
+        """
+        message, max_length = self.build_prompt(commit_info, prompt)
+
+        for length in self.retry_lengths(max_length):
+            text = self.ask(message=message, name=prompt['name'], max_length=length).strip()
+            if text:
+                return text, message
+        return '', message
+
+    async def generate_async(self, commit_info: dict, prompt: dict) -> tuple[str, list[dict]]:
+        """
+        Asynchronous version of generate, sending the requests with ask_async.
+
+        Args:
+            commit_info (dict): Information about the commit.
+            prompt (dict): The prompt to use for code review generation.
+
+        Returns:
+            str: The generated code review from the LLM.
+            list[dict]: The prompt used for the generation.
+        """
+        message, max_length = self.build_prompt(commit_info, prompt)
+
+        for length in self.retry_lengths(max_length):
+            text = (await self.ask_async(message=message, name=prompt['name'], max_length=length)).strip()
+            if text:
+                return text, message
+        return '', message
     
     def end_model(self):
         """
@@ -69,13 +136,103 @@ class LLM:
         """
         pass
 
+    def generate_many(self, batch_prompts: list[tuple[dict, dict]]) -> list[tuple[str, list[dict]]]:
+        """
+        Generate the code reviews of several prompts. Local models override it to
+        generate them together; by default they are generated one by one.
+
+        Args:
+            batch_prompts (list[tuple[dict, dict]]): A list of tuples, each containing commit_info and prompt.
+
+        Returns:
+            list[tuple[str, list[dict]]]: The code review and the prompt used of each prompt, in input order.
+        """
+        return [self.generate(commit_info, copy.deepcopy(prompt)) for commit_info, prompt in batch_prompts]
+
+    def batch_requests(self, batch_prompts: list[tuple[dict, dict]]) -> list[dict]:
+        """
+        Build the requests of a batch. The custom_id of each request is batch_custom_id(sha, prompt name).
+
+        Args:
+            batch_prompts (list[tuple[dict, dict]]): A list of tuples, each containing commit_info and prompt.
+
+        Returns:
+            list[dict]: The requests, each one with its custom_id, sha, prompt name, message and max_length.
+        """
+        from .batches import batch_custom_id
+
+        requests = []
+        for commit_info, prompt in batch_prompts:
+            message, max_length = self.build_prompt(commit_info, copy.deepcopy(prompt))
+            requests.append({
+                "custom_id": batch_custom_id(commit_info["sha"], prompt['name']),
+                "sha": commit_info["sha"],
+                "prompt": prompt['name'],
+                "message": message,
+                "max_length": max_length,
+            })
+        return requests
+
     def generate_batch(self, batch_prompts: list[tuple[dict, dict]]) -> str:
         """
-        Generate responses for a batch of prompts.
+        Generate responses for a batch of prompts through the batch API of the provider.
+        BatchRunner can poll the batch and save its results.
 
         Args:
             batch_prompts (list[tuple[dict, dict]]): A list of tuples, each containing commit_info and prompt.
         Returns:
             str: the reference to the batch job created.
         """
-        pass
+        return self.submit_batch(self.batch_requests(batch_prompts))
+
+    def submit_batch(self, requests: list[dict]) -> str:
+        """
+        Submit requests to the batch API of the provider, for providers that have one.
+
+        Args:
+            requests (list[dict]): The requests, each one with its custom_id, message, max_length and prompt name.
+
+        Returns:
+            str: The id of the batch.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support batches.")
+
+    def get_batch_status(self, batch_id: str) -> str:
+        """
+        Get the status of a batch.
+
+        Args:
+            batch_id (str): The id of the batch.
+
+        Returns:
+            str: "ended" once every request is processed, "in_progress" otherwise.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support batches.")
+
+    def iter_batch_results(self, batch_id: str) -> Iterator[tuple[str, str, str]]:
+        """
+        Read the results of an ended batch.
+
+        Args:
+            batch_id (str): The id of the batch.
+
+        Returns:
+            Iterator[tuple[str, str, str]]: A generator of (custom_id, text, error) tuples, error is None on success.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support batches.")
+
+    def find_batch(self, items: dict[str, dict], created_after: float) -> str:
+        """
+        Find a batch whose submission was not recorded, e.g. because the run stopped
+        right after submitting it. Only a batch confirmed to hold exactly these requests
+        for this model may be returned, since its results are saved by custom_id.
+        Providers that cannot confirm it return None, and the requests are submitted again.
+
+        Args:
+            items (dict[str, dict]): The requests of the batch by custom_id, as returned by BatchLedger.get_items.
+            created_after (float): The earliest creation time of the batch, as a timestamp.
+
+        Returns:
+            str: The id of the batch, or None if it was not found.
+        """
+        return None
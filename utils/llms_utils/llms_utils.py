@@ -1,20 +1,73 @@
-
-from ..os_utils import exists_or_create_folder, exists_file, read_json_file, write_json_file
-from .sonnet import Sonnet
-from .flan import Flan
-from .qwen import Qwen
-from .gpt import Gpt
+from ..results_store import ResultsStore
 from .llm import LLM
-import json
+from typing import Iterable, Iterator
+import importlib
 import os
 
-LLM_REGISTRY : dict[str, type[LLM]] = {
-    "OpenAI": Gpt,
-    "Google": Flan,
-    "Qwen": Qwen,
-    "Sonnet": Sonnet
+# Entry point group where third-party packages register their providers, e.g. in pyproject.toml:
+#   [project.entry-points."dataset_generation.llms"]
+#   MyProvider = "my_package.my_module:MyLLM"
+LLM_ENTRY_POINT_GROUP = "dataset_generation.llms"
+
+# Providers as "module:Class" references, imported only when requested, so using one
+# provider never pays the import cost (transformers, torch, openai...) of the others.
+LLM_REGISTRY : dict[str, str | type[LLM]] = {
+    "OpenAI": f"{__package__}.gpt:Gpt",
+    "Google": f"{__package__}.flan:Flan",
+    "Qwen": f"{__package__}.qwen:Qwen",
+    "Sonnet": f"{__package__}.sonnet:Sonnet"
+}
+
+# Prompts that need the review of another prompt for the same (sha, provider, model)
+PROMPT_DEPENDENCIES = {
+    "self-reflection": "zero-shot",
 }
 
+# Name of the results store database inside the results folder
+RESULTS_STORE_FILE = "results.sqlite3"
+
+RESULTS_STORES : dict[str, ResultsStore] = {}
+
+def register_llm(provider: str, llm_class: str | type[LLM]):
+    """
+    Register a provider, replacing any existing one with the same name.
+
+    Args:
+        provider (str): The name of the provider.
+        llm_class (str | type[LLM]): The LLM subclass, or a "module:Class" reference imported on first use.
+    """
+    LLM_REGISTRY[provider] = llm_class
+
+def get_llm_class(provider: str) -> type[LLM]:
+    """
+    Resolve the LLM class of a provider, importing its module if needed.
+    Providers not in the registry are looked up in the LLM_ENTRY_POINT_GROUP entry points.
+
+    Args:
+        provider (str): The name of the provider.
+
+    Returns:
+        type[LLM]: The LLM subclass of the provider.
+    """
+    llm_class = LLM_REGISTRY.get(provider)
+    if llm_class is None:
+        from importlib.metadata import entry_points
+
+        for entry_point in entry_points(group=LLM_ENTRY_POINT_GROUP):
+            if entry_point.name == provider:
+                llm_class = entry_point.value
+                break
+
+    if llm_class is None:
+        raise ValueError(f"Provider {provider} is not supported.")
+
+    if isinstance(llm_class, str):
+        module_name, class_name = llm_class.split(":")
+        llm_class = getattr(importlib.import_module(module_name), class_name)
+        LLM_REGISTRY[provider] = llm_class
+
+    return llm_class
+
 def create_llm(provider: str, model: str) -> LLM:
     """
     Create an instance of the LLM based on the provider and model.
@@ -26,10 +79,7 @@ def create_llm(provider: str, model: str) -> LLM:
     Returns:
         LLM: An instance of the LLM class for the specified provider and model.
     """
-    if provider not in LLM_REGISTRY:
-        raise ValueError(f"Provider {provider} is not supported.")
-    
-    llm_class = LLM_REGISTRY[provider]
+    llm_class = get_llm_class(provider)
     return llm_class(model_name=model)
 
 def get_models(least_expensive: bool = False, OpenAI: bool = True, Google: bool = True, Qwen: bool = True, Sonnet: bool = True) -> dict:
@@ -51,6 +101,55 @@ def get_models(least_expensive: bool = False, OpenAI: bool = True, Google: bool
 
     return models
 
+def get_results_store(path: str = "LLMs/Results") -> ResultsStore:
+    """
+    Get the results store of a base path, shared by every call in the process.
+
+    Args:
+        path (str): The base path where results are stored.
+
+    Returns:
+        ResultsStore: The results store, at <path>/results.sqlite3.
+    """
+    store = RESULTS_STORES.get(path)
+    if store is None:
+        store = RESULTS_STORES.setdefault(path, ResultsStore(os.path.join(path, RESULTS_STORE_FILE)))
+    return store
+
+def _get_version_store(version: str, path: str) -> ResultsStore:
+    """
+    Get the results store of a base path, importing the legacy JSON results of the version on first use.
+    """
+    store = get_results_store(path)
+    store.import_json(version, path)
+    return store
+
+def import_code_reviews(version: str, path: str = "LLMs/Results") -> int:
+    """
+    Import the JSON results files of a version into the results store, again if they were already imported.
+
+    Args:
+        version (str): The version of the experiment.
+        path (str): The base path where results are stored.
+
+    Returns:
+        int: The number of code reviews imported.
+    """
+    return get_results_store(path).import_json(version, path, force=True)
+
+def export_code_reviews(version: str, path: str = "LLMs/Results") -> int:
+    """
+    Write the code reviews of a version as JSON results files (<path>/<version>/<prompt>/<sha>.json).
+
+    Args:
+        version (str): The version of the experiment.
+        path (str): The base path where results are stored.
+
+    Returns:
+        int: The number of files written.
+    """
+    return _get_version_store(version, path).export_json(version, path)
+
 def generated_prompt_model(sha: str, provider: str, model: str, prompt_name: str, version: str, path: str = "LLMs/Results") -> bool:
     """
     Check if the result for the given SHA, provider, model, and prompt already exists.
@@ -65,22 +164,11 @@ def generated_prompt_model(sha: str, provider: str, model: str, prompt_name: str
     Returns:
         bool: True if the result exists, False otherwise.
     """
-    
-    results_folder = os.path.join(path, version, prompt_name)
-    exists_or_create_folder(results_folder)
-
-    if not exists_file(results_folder, f"{sha}.json"):
-        return False
-    
-    generated_review = read_json_file(results_folder, f"{sha}.json")
-    if provider not in generated_review or model not in generated_review[provider] or generated_review[provider][model] is None or generated_review[provider][model] == "":
-        return False
-
-    return True
+    return _get_version_store(version, path).exists(version, prompt_name, sha, provider, model)
 
 def save_code_review(code_review: str, sha: str, provider: str, model: str, prompt_name: str, version: str, path: str = "LLMs/Results", prompt_used: str = None):
     """
-    Save the generated code review to a file.
+    Save the generated code review to the results store.
     
     Args:
         code_review (str): The generated code review.
@@ -91,33 +179,7 @@ def save_code_review(code_review: str, sha: str, provider: str, model: str, prom
         path (str): The base path where results are stored.
         prompt_used (str): The name of the prompt used for generation.
     """
-    
-    results_folder = os.path.join(path, version, prompt_name)
-    exists_or_create_folder(results_folder)
-
-    generated_reviews = {}
-    if exists_file(results_folder, f"{sha}.json"):
-        generated_reviews = read_json_file(results_folder, f"{sha}.json")
-
-    generated_reviews[provider] = generated_reviews.get(provider, {})
-    generated_reviews[provider][model] = code_review
-
-    if prompt_used:
-        if "prompt_used" in generated_reviews:
-            p1 = json.dumps(generated_reviews["prompt_used"])
-            p2 = json.dumps(prompt_used)
-            if p1 != p2:
-                if prompt_name == "self-reflection":
-                    generated_reviews[provider]["prompt_used"] = prompt_used
-                else:
-                    raise ValueError(f"Prompt used does not match existing prompt")
-            del generated_reviews["prompt_used"]
-        if prompt_name != "self-reflection":
-            generated_reviews["prompt_used"] = prompt_used
-        else:
-            generated_reviews[provider]["prompt_used"] = prompt_used
-
-    write_json_file(results_folder, f"{sha}.json", generated_reviews)
+    _get_version_store(version, path).save(code_review, sha, provider, model, prompt_name, version, prompt_used)
 
 def get_code_review(sha: str, provider: str, model: str, prompt_name: str, version: str, path: str = "LLMs/Results") -> str:
     """
@@ -133,16 +195,14 @@ def get_code_review(sha: str, provider: str, model: str, prompt_name: str, versi
     Returns:
         str: The generated code review if it exists, otherwise an empty string.
     """
+    store = _get_version_store(version, path)
+    found, code_review = store.get(version, prompt_name, sha, provider, model)
+    if not found:
+        if not store.has_sha(version, prompt_name, sha):
+            raise FileNotFoundError(f"No results found for SHA {sha} in {version}/{prompt_name}")
+        raise ValueError(f"No review found for provider {provider} and model {model} in {version}/{prompt_name}")
     
-    results_folder = os.path.join(path, version, prompt_name)
-    if not exists_file(results_folder, f"{sha}.json"):
-        raise FileNotFoundError(f"No results found for SHA {sha} in {results_folder}")
-
-    generated_reviews = read_json_file(results_folder, f"{sha}.json")
-    if provider not in generated_reviews or model not in generated_reviews[provider]:
-        raise ValueError(f"No review found for provider {provider} and model {model} in {results_folder}")
-    
-    return generated_reviews[provider][model]
+    return code_review
 
 def get_code_reviews(sha: str, prompt_name: str, version: str, path: str = "LLMs/Results") -> dict:
     """
@@ -157,9 +217,52 @@ def get_code_reviews(sha: str, prompt_name: str, version: str, path: str = "LLMs
     Returns:
         dict: A dictionary containing code reviews for all providers and models.
     """
-    
-    results_folder = os.path.join(path, version, prompt_name)
-    if not exists_file(results_folder, f"{sha}.json"):
-        raise FileNotFoundError(f"No results found for SHA {sha} in {results_folder}")
+    generated_reviews = _get_version_store(version, path).get_reviews(version, prompt_name, sha)
+    if not generated_reviews:
+        raise FileNotFoundError(f"No results found for SHA {sha} in {version}/{prompt_name}")
+
+    return generated_reviews
+
+def iter_code_reviews(version: str, path: str = "LLMs/Results", prompt_names: list[str] = None) -> Iterator[tuple[str, str, str, str, str]]:
+    """
+    Lazily read every code review stored for a version, ordered by prompt and SHA.
+
+    Args:
+        version (str): The version of the experiment.
+        path (str): The base path where results are stored.
+        prompt_names (list[str]): Only read these prompts, None for all of them.
+
+    Returns:
+        Iterator[tuple[str, str, str, str, str]]: A generator of (sha, provider, model, prompt_name, code_review) tuples.
+    """
+    yield from _get_version_store(version, path).iter_reviews(version, prompt_names)
+
+def save_code_reviews(code_reviews: Iterable[tuple[str, str, str, str, str]], version: str, path: str = "LLMs/Results") -> int:
+    """
+    Save many code reviews at once, in a single transaction.
+
+    Args:
+        code_reviews (Iterable[tuple[str, str, str, str, str]]): (sha, provider, model, prompt_name, code_review) tuples.
+        version (str): The version of the experiment.
+        path (str): The base path where results are stored.
+
+    Returns:
+        int: The number of code reviews saved.
+    """
+    return _get_version_store(version, path).save_many(code_reviews, version)
+
+def get_model_provider(model: str) -> str:
+    """
+    Get the provider of a model identifier, as returned by get_models.
 
-    return read_json_file(results_folder, f"{sha}.json")
+    Args:
+        model (str): The model identifier.
+
+    Returns:
+        str: The provider of the model, or the model itself if it is unknown.
+    """
+    for least_expensive in (False, True):
+        for provider, provider_model in get_models(least_expensive=least_expensive).items():
+            if provider_model == model:
+                return provider
+    return model
@@ -2,67 +2,72 @@
 # commits with Qwen's model with different prompts using Hugging Face Transformers
 
 from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
-from .llm import LLM
+from .hf_llm import HuggingFaceLLM
 import torch
-import gc
 
-class Qwen(LLM):
+class Qwen(HuggingFaceLLM):
     """
     Class to handle the Qwen models for code review generation.
     """
     def __init__(self, model_name: str):
         super().__init__(model_name)
         self.model_name = model_name
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # Left padding keeps the prompts of a batch aligned with their generated tokens
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, padding_side="left")
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        # bitsandbytes quantization needs a GPU, on CPU the model is loaded unquantized
         quantization_config = BitsAndBytesConfig(
-            load_in_8_bit=True)
+            load_in_8_bit=True) if torch.cuda.is_available() else None
         self.model = AutoModelForCausalLM.from_pretrained(model_name, device_map="auto", quantization_config=quantization_config)
         self.model.eval()
         self.device = self.model.device
     
-    def end_model(self):
-        del self.model
-        del self.tokenizer
-        gc.collect()
-        torch.cuda.empty_cache()
-        for i in range(torch.cuda.device_count()):
-            with torch.cuda.device(i):
-                torch.cuda.empty_cache()
-
-    def ask(self, message: list[dict], max_length: int = 1024, name: str = 'zero-shot') -> str:
+    def format_prompt(self, message: list[dict], name: str = 'zero-shot') -> str:
         """
-        Generate a response from the Qwen model based on the input message.
-        
+        Apply the chat template, with thinking enabled except for zero-shot.
+
         Args:
             message (list[dict]): The input message for the LLM.
-            max_length (int): The maximum length of the generated response.
             name (str): The name of the prompt technique.
 
         Returns:
-            str: The generated response from the LLM.
+            str: The prompt text.
         """
-        input_ids = self.tokenizer.apply_chat_template(
+        return self.tokenizer.apply_chat_template(
             message,
+            tokenize=False,
             add_generation_prompt=True,
-            return_tensors="pt",
             enable_thinking= (name != 'zero-shot')
-        ).to(self.device)
+        )
+
+    def generate_texts(self, texts: list[str], name: str = 'zero-shot', max_length: int = 1024) -> list[str]:
+        """
+        Generate the responses of several prompts in a single left-padded batch.
+
+        Args:
+            texts (list[str]): The prompt texts, as returned by format_prompt.
+            name (str): The name of the prompt technique.
+            max_length (int): The maximum length of the generated responses.
 
-        # Create attention_mask manually
-        attention_mask = (input_ids != self.tokenizer.eos_token_id).long()
+        Returns:
+            list[str]: The responses without the thinking part, in the order of the texts.
+        """
+        # The attention mask of the tokenizer masks the padding, unlike comparing with the eos token
+        enc = self.tokenizer(texts, return_tensors="pt", padding=True, add_special_tokens=False).to(self.device)
 
         with torch.no_grad():
             output = self.model.generate(
-                input_ids=input_ids,
+                **enc,
                 max_new_tokens=max_length,
-                attention_mask=attention_mask
+                pad_token_id=self.tokenizer.pad_token_id
             )
 
-        text = self.tokenizer.decode(output[0], skip_special_tokens=True)
-
-        text = text.split('<think>')[-1] if '</think>' not in text else text
-        text = text.split('</think>')[-1] if '</think>' in text else text
-        # Remove all \n at the start of the text
-        text = text.lstrip('\n')
+        responses = []
+        for text in self.tokenizer.batch_decode(output[:, enc["input_ids"].shape[1]:], skip_special_tokens=True):
+            text = text.split('<think>')[-1] if '</think>' not in text else text
+            text = text.split('</think>')[-1] if '</think>' in text else text
+            # Remove all \n at the start of the text
+            responses.append(text.lstrip('\n'))
 
-        return text
\ No newline at end of file
+        return responses
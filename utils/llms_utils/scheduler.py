@@ -0,0 +1,316 @@
+from .batches import BatchRunner
+from .llms_utils import PROMPT_DEPENDENCIES, create_llm, get_llm_class, generated_prompt_model, get_code_review, save_code_review
+from typing import Callable
+from .llm import LLM
+import asyncio
+import copy
+
+class GenerationScheduler:
+    """
+    Scheduler of the code review generation of an experiment.
+
+    It builds the (provider, model, sha, prompt) work graph, skipping the reviews
+    already generated, and runs it from one event loop with one lane per provider.
+    Providers whose max_concurrency is above 1 (the API providers) run concurrently,
+    each one with a semaphore bounding its requests in flight. Local providers keep
+    the default of 1 and run one after the other in a single lane, so only one model
+    is loaded at a time; their blocking calls run in a worker thread. A prompt
+    listed in PROMPT_DEPENDENCIES only starts once the review it depends on is saved.
+    Providers listed in batch_providers go through their batch API with a BatchRunner,
+    and local models generate local_batch_size prompts at once with generate_many.
+    """
+    def __init__(self, models: dict, prompts: list[dict], version: str, path: str = "LLMs/Results",
+                 llm_factory: Callable[[str, str], LLM] = create_llm, max_concurrency: dict = None,
+                 batch_providers: list[str] = None, batch_args: dict = None, local_batch_size: int = 1):
+        """
+        Args:
+            models (dict): The model of each provider, as returned by get_models.
+            prompts (list[dict]): The prompts of the experiment.
+            version (str): The version of the experiment.
+            path (str): The base path where results are stored.
+            llm_factory (Callable[[str, str], LLM]): Builds the LLM of a (provider, model), create_llm by default.
+            max_concurrency (dict): Concurrency limit per provider, overriding the max_concurrency of its LLM class.
+            batch_providers (list[str]): The providers to run through their batch API.
+            batch_args (dict): Extra arguments of the BatchRunner, e.g. poll_interval.
+            local_batch_size (int): The prompts given at once to the generate_many of local models, 1 to send them one by one.
+        """
+        self.models = models
+        self.prompts = prompts
+        self.version = version
+        self.path = path
+        self.llm_factory = llm_factory
+        self.max_concurrency = max_concurrency or {}
+        self.batch_providers = set(batch_providers or [])
+        self.batch_args = batch_args or {}
+        self.local_batch_size = local_batch_size
+        self.errors = []
+
+    def get_max_concurrency(self, provider: str) -> int:
+        """
+        Get the concurrency limit of a provider.
+
+        Args:
+            provider (str): The name of the provider.
+
+        Returns:
+            int: The number of requests the provider may have in flight.
+        """
+        if provider in self.max_concurrency:
+            return max(1, self.max_concurrency[provider])
+        try:
+            return max(1, get_llm_class(provider).max_concurrency)
+        except (ValueError, ImportError):
+            return 1
+
+    def build_tasks(self, shas: list[str]) -> dict[str, list[dict]]:
+        """
+        Build the tasks still to run for each provider.
+
+        Args:
+            shas (list[str]): The commit SHAs of the experiment.
+
+        Returns:
+            dict[str, list[dict]]: The tasks of each provider, in sha then prompt order.
+                Each task has the provider, model, sha, prompt and the key of the task it depends on, or None.
+        """
+        tasks = {}
+        for provider, model in self.models.items():
+            provider_tasks = []
+            for sha in shas:
+                # Every missing prompt first, so dependencies are found whatever the prompt order
+                pending = [
+                    prompt for prompt in self.prompts
+                    if not generated_prompt_model(sha, provider, model, prompt['name'], self.version, self.path)
+                ]
+                pending_names = {prompt['name'] for prompt in pending}
+                for prompt in pending:
+                    dependency = PROMPT_DEPENDENCIES.get(prompt['name'])
+                    depends_on = (provider, model, sha, dependency) if dependency in pending_names else None
+                    provider_tasks.append({
+                        "key": (provider, model, sha, prompt['name']),
+                        "provider": provider,
+                        "model": model,
+                        "sha": sha,
+                        "prompt": prompt,
+                        "depends_on": depends_on,
+                    })
+            tasks[provider] = provider_tasks
+        return tasks
+
+    def task_prompt(self, task: dict) -> dict:
+        """
+        Copy the prompt of a task, adding the review it depends on.
+        """
+        prompt = copy.deepcopy(task['prompt'])
+
+        # The self-reflection prompt revises the zero-shot review of the same model
+        dependency = PROMPT_DEPENDENCIES.get(prompt['name'])
+        if dependency:
+            prompt['code_review'] = get_code_review(task['sha'], task['provider'], task['model'], dependency, self.version, self.path)
+        return prompt
+
+    async def run_task(self, llm: LLM, task: dict, commit_info: dict, semaphore: asyncio.Semaphore, done: dict):
+        """
+        Generate and save the code review of a task, once the task it depends on is done.
+
+        Args:
+            llm (LLM): The LLM of the provider.
+            task (dict): The task, as built by build_tasks.
+            commit_info (dict): The details of the commit.
+            semaphore (asyncio.Semaphore): Bounds the requests in flight of the provider.
+            done (dict): The completion future of each task of the provider, by key.
+        """
+        try:
+            if task['depends_on'] is not None:
+                await done[task['depends_on']]
+
+            prompt = self.task_prompt(task)
+
+            async with semaphore:
+                code_review, prompt_used = await llm.generate_async(commit_info, prompt)
+            save_code_review(code_review, task['sha'], task['provider'], task['model'], prompt['name'], self.version, self.path, prompt_used=prompt_used)
+        except Exception as error:
+            print(f"Failed {task['provider']} - {task['model']} - {task['prompt']['name']} for sha {task['sha']}: {error}")
+            self.errors.append((task['key'], error))
+            done[task['key']].set_exception(error)
+            return False
+
+        print(f"Generated {task['provider']} - {task['model']} - {task['prompt']['name']} for sha {task['sha']}")
+        done[task['key']].set_result(True)
+        return True
+
+    async def run_local_batches(self, llm: LLM, tasks: list[dict], commit_infos: dict) -> int:
+        """
+        Run the tasks of a local model with its generate_many, local_batch_size prompts
+        at a time. Tasks with a dependency go in a later batch, once the review they need is saved.
+
+        Returns:
+            int: The number of code reviews generated.
+        """
+        waiting = {}
+        ready = []
+        for task in tasks:
+            if task['depends_on'] is None:
+                ready.append(task)
+            else:
+                waiting.setdefault(task['depends_on'], []).append(task)
+
+        def fail(task: dict, error: Exception):
+            print(f"Failed {task['provider']} - {task['model']} - {task['prompt']['name']} for sha {task['sha']}: {error}")
+            self.errors.append((task['key'], error))
+            for dependent in waiting.pop(task['key'], []):
+                fail(dependent, error)
+
+        generated = 0
+        while ready:
+            chunk, ready = ready[:self.local_batch_size], ready[self.local_batch_size:]
+
+            # A prompt that cannot be built only fails its own task
+            batch_tasks = []
+            batch_prompts = []
+            for task in chunk:
+                try:
+                    batch_prompts.append((commit_infos[task['sha']], self.task_prompt(task)))
+                    batch_tasks.append(task)
+                except Exception as error:
+                    fail(task, error)
+            if not batch_tasks:
+                continue
+
+            try:
+                # Generation blocks, keep the other providers running meanwhile
+                results = await asyncio.to_thread(llm.generate_many, batch_prompts)
+            except Exception as error:
+                for task in batch_tasks:
+                    fail(task, error)
+                continue
+
+            for task, (code_review, prompt_used) in zip(batch_tasks, results):
+                save_code_review(code_review, task['sha'], task['provider'], task['model'], task['prompt']['name'], self.version, self.path, prompt_used=prompt_used)
+                print(f"Generated {task['provider']} - {task['model']} - {task['prompt']['name']} for sha {task['sha']}")
+                generated += 1
+                ready.extend(waiting.pop(task['key'], []))
+
+        return generated
+
+    async def run_provider(self, provider: str, tasks: list[dict], commit_infos: dict) -> int:
+        """
+        Run the tasks of a provider, at most get_max_concurrency(provider) at a time.
+
+        Returns:
+            int: The number of code reviews generated.
+        """
+        if not tasks:
+            return 0
+
+        model = self.models[provider]
+        print(f"Running prompts for {provider} - {model}")
+        try:
+            # Loading a local model blocks, keep the other providers running meanwhile
+            llm = await asyncio.to_thread(self.llm_factory, provider, model)
+            try:
+                if self.local_batch_size > 1 and self.get_max_concurrency(provider) == 1:
+                    return await self.run_local_batches(llm, tasks, commit_infos)
+
+                semaphore = asyncio.Semaphore(self.get_max_concurrency(provider))
+                loop = asyncio.get_running_loop()
+                done = {task['key']: loop.create_future() for task in tasks}
+                results = await asyncio.gather(*(
+                    self.run_task(llm, task, commit_infos[task['sha']], semaphore, done) for task in tasks
+                ))
+                # Failures were already reported, do not warn about unretrieved future exceptions
+                for future in done.values():
+                    if future.done() and not future.cancelled():
+                        future.exception()
+            finally:
+                await asyncio.to_thread(llm.end_model)
+        except Exception as error:
+            # Only this provider fails, the other lanes keep running
+            self.fail_provider(provider, error)
+            return 0
+
+        return sum(results)
+
+    def run_batches(self, provider: str, shas: list[str], commit_infos: dict) -> int:
+        """
+        Run the tasks of a provider through its batch API. It blocks while polling,
+        so it runs in a worker thread.
+
+        Returns:
+            int: The number of code reviews generated.
+        """
+        model = self.models[provider]
+        print(f"Running prompts for {provider} - {model} with batches")
+        try:
+            llm = self.llm_factory(provider, model)
+            try:
+                return BatchRunner(llm, provider, self.version, self.path, **self.batch_args).run(shas, self.prompts, commit_infos)
+            finally:
+                llm.end_model()
+        except Exception as error:
+            self.fail_provider(provider, error)
+            return 0
+
+    def fail_provider(self, provider: str, error: Exception):
+        """
+        Record the failure of a whole provider, e.g. when its model cannot be loaded.
+        """
+        print(f"Failed {provider} - {self.models[provider]}: {error}")
+        self.errors.append(((provider, self.models[provider]), error))
+
+    async def run_sequentially(self, providers: list[str], tasks: dict, commit_infos: dict) -> int:
+        """
+        Run the providers one after the other.
+        """
+        generated = 0
+        for provider in providers:
+            generated += await self.run_provider(provider, tasks[provider], commit_infos)
+        return generated
+
+    async def run_async(self, shas: list[str], commit_infos: dict) -> int:
+        """
+        Generate every missing code review of the experiment from the running event loop.
+
+        Args:
+            shas (list[str]): The commit SHAs of the experiment.
+            commit_infos (dict): The details of each commit, by SHA.
+
+        Returns:
+            int: The number of code reviews generated.
+
+        Raises:
+            RuntimeError: If some code reviews could not be generated, once every other task is done.
+        """
+        tasks = self.build_tasks(shas)
+        self.errors = []
+
+        batch_providers = [p for p in tasks if tasks[p] and p in self.batch_providers]
+        concurrent_providers = [p for p in tasks if tasks[p] and p not in self.batch_providers and self.get_max_concurrency(p) > 1]
+        local_providers = [p for p in tasks if tasks[p] and p not in self.batch_providers and self.get_max_concurrency(p) == 1]
+
+        lanes = [asyncio.to_thread(self.run_batches, provider, shas, commit_infos) for provider in batch_providers]
+        lanes += [self.run_provider(provider, tasks[provider], commit_infos) for provider in concurrent_providers]
+        if local_providers:
+            lanes.append(self.run_sequentially(local_providers, tasks, commit_infos))
+        generated = sum(await asyncio.gather(*lanes))
+
+        if self.errors:
+            raise RuntimeError(f"{len(self.errors)} code reviews could not be generated, the first error was: {self.errors[0][1]}")
+
+        return generated
+
+    def run(self, shas: list[str], commit_infos: dict) -> int:
+        """
+        Generate every missing code review of the experiment.
+
+        Args:
+            shas (list[str]): The commit SHAs of the experiment.
+            commit_infos (dict): The details of each commit, by SHA.
+
+        Returns:
+            int: The number of code reviews generated.
+
+        Raises:
+            RuntimeError: If some code reviews could not be generated, once every other task is done.
+        """
+        return asyncio.run(self.run_async(shas, commit_infos))
@@ -3,20 +3,44 @@
 from anthropic.types.message_create_params import MessageCreateParamsNonStreaming
 from anthropic.types.messages.batch_create_params import Request
 from dotenv import load_dotenv
+from typing import Iterator
 from .llm import LLM
 import anthropic
-import copy
 import os
 
 class Sonnet(LLM):
     """
     Class to handle the Anthropic models for code review generation.
     """
+    max_concurrency = 32
+
     def __init__(self, model_name: str):
         super().__init__(model_name, retry_max=5)
         load_dotenv()
         self.client = anthropic.Anthropic(api_key=os.getenv("anthropic_api_key"))
+        self.async_client = None
     
+    def request_args(self, message: list[dict], max_length: int = 1024) -> dict:
+        """
+        Build the arguments of a Messages API request.
+
+        Args:
+            message (list[dict]): The input message for the LLM.
+            max_length (int): The maximum length of the generated response.
+
+        Returns:
+            dict: The arguments of messages.create.
+        """
+        input_message = [m for m in message if m.get('role') == 'user']
+        instruction = next((m['content'] for m in message if m.get('role') == 'system'), '')
+
+        return {
+            "max_tokens": max_length,
+            "model": self.model_name,
+            "messages": input_message,
+            "system": instruction,
+        }
+
     def ask(self, message: list[dict], max_length: int = 1024, name: str = 'zero-shot') -> str:
         """
         Generate a response from the Anthropic model based on the input message.
@@ -29,49 +53,68 @@ class Sonnet(LLM):
         Returns:
             str: The generated response from the LLM.
         """
-        input_message = [m for m in message if m.get('role') == 'user']
-        instruction = next((m['content'] for m in message if m.get('role') == 'system'), '')
+        response = self.client.messages.create(**self.request_args(message, max_length))
+        return response.content[0].text if response.content else ""
 
-        response = self.client.messages.create(
-            max_tokens=max_length,
-            model=self.model_name,
-            messages=input_message,
-            system=instruction,
-        )
+    async def ask_async(self, message: list[dict], max_length: int = 1024, name: str = 'zero-shot') -> str:
+        """
+        Asynchronous version of ask, using the AsyncAnthropic client.
+        """
+        # Created on first use, inside the event loop that runs the requests
+        if self.async_client is None:
+            self.async_client = anthropic.AsyncAnthropic(api_key=os.getenv("anthropic_api_key"))
+        response = await self.async_client.messages.create(**self.request_args(message, max_length))
         return response.content[0].text if response.content else ""
 
-    def generate_batch(self, batch_prompts: list[tuple[dict, dict]]) -> str:
+    def submit_batch(self, requests: list[dict]) -> str:
         """
-        Generate responses for a batch of prompts.
+        Create a Message Batch.
 
         Args:
-            batch_prompts (list[tuple[dict, dict]]): A list of tuples containing commit_info and prompt.
+            requests (list[dict]): The requests, each one with its custom_id, message, max_length and prompt name.
+
         Returns:
-            str: the reference to the batch job created.
+            str: The id of the batch.
         """
-        requests = []
-        for commit_info, prompt in batch_prompts:
-            p = copy.deepcopy(prompt)
-            commit_text = f'Commit Message: {commit_info["message"]}\n\nDiff:\n{commit_info["patch"]}'
-
-            for prompt_element in p['prompt']:
-                if prompt_element['role'] == 'user':
-                    prompt_element['content'] = prompt_element['content'].replace('[Insert fix content here]', commit_text)
-
-            input_message = [m for m in p['prompt'] if m.get('role') == 'user']
-            instruction = next((m['content'] for m in p['prompt'] if m.get('role') == 'system'), '')
-
-            requests.append(Request(
-                custom_id=commit_info["sha"],
-                params=MessageCreateParamsNonStreaming(
-                    model=self.model_name,
-                    max_tokens=3072,
-                    messages=input_message,
-                    system=instruction,
-                )
-            ))
-        
-        responses = self.client.messages.batches.create(requests=requests)
+        batch = self.client.messages.batches.create(requests=[
+            Request(
+                custom_id=request['custom_id'],
+                params=MessageCreateParamsNonStreaming(**self.request_args(request['message'], request['max_length']))
+            )
+            for request in requests
+        ])
+        return batch.id
+
+    def get_batch_status(self, batch_id: str) -> str:
+        """
+        Get the status of a Message Batch.
+
+        Args:
+            batch_id (str): The id of the batch.
+
+        Returns:
+            str: "ended" once every request is processed, "in_progress" otherwise.
+        """
+        batch = self.client.messages.batches.retrieve(batch_id)
+        return "ended" if batch.processing_status == "ended" else "in_progress"
+
+    def iter_batch_results(self, batch_id: str) -> Iterator[tuple[str, str, str]]:
+        """
+        Stream the results of an ended Message Batch.
 
-        return responses.id
-            
\ No newline at end of file
+        Args:
+            batch_id (str): The id of the batch.
+
+        Returns:
+            Iterator[tuple[str, str, str]]: A generator of (custom_id, text, error) tuples, error is None on success.
+        """
+        for entry in self.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == "succeeded":
+                message = result.message
+                yield entry.custom_id, message.content[0].text if message.content else "", None
+            elif result.type == "errored":
+                yield entry.custom_id, None, str(result.error)
+            else:
+                # canceled or expired
+                yield entry.custom_id, None, result.type
@@ -0,0 +1,282 @@
+from .os_utils import exists_or_create_folder, read_all_files_in_folder, read_json_file, write_json_file
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+from itertools import groupby
+import threading
+import sqlite3
+import json
+import os
+
+SCHEMA = [
+    # The primary key doubles as the (version, prompt, sha, provider, model) index
+    "CREATE TABLE IF NOT EXISTS code_review ("
+    "version TEXT NOT NULL, "
+    "prompt TEXT NOT NULL, "
+    "sha TEXT NOT NULL, "
+    "provider TEXT NOT NULL, "
+    "model TEXT NOT NULL, "
+    "review TEXT, "
+    "prompt_used TEXT, "
+    "PRIMARY KEY (version, prompt, sha, provider, model)) WITHOUT ROWID",
+    # Versions whose legacy JSON results were already imported
+    "CREATE TABLE IF NOT EXISTS imported_version (version TEXT PRIMARY KEY)",
+]
+
+class ResultsStore:
+    """
+    Store of the generated code reviews, backed by SQLite in WAL mode.
+
+    Existence checks and lookups are single index probes, writes are transactional
+    and can be batched, and several threads or processes can write concurrently.
+    The legacy layout (LLMs/Results/<version>/<prompt>/<sha>.json) is imported once
+    per version and can be produced again with export_json.
+    """
+    def __init__(self, path: str = "LLMs/Results/results.sqlite3"):
+        """
+        Args:
+            path (str): The path of the SQLite database.
+        """
+        self.path = path
+        self.local = threading.local()
+        self.imported = set()
+        exists_or_create_folder(os.path.dirname(path) or ".")
+        with self.transaction() as conn:
+            for ddl in SCHEMA:
+                conn.execute(ddl)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        The connection of the calling thread.
+        """
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the enclosed operations in one write transaction. Nested transactions
+        join the outermost one, so a batch of saves is committed at once.
+        """
+        conn = self.conn
+        if self.local.depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self.local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self.local.depth -= 1
+            if self.local.depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        self.local.depth -= 1
+        if self.local.depth == 0:
+            conn.execute("COMMIT")
+
+    def exists(self, version: str, prompt_name: str, sha: str, provider: str, model: str) -> bool:
+        """
+        Check if a non-empty code review exists.
+        """
+        row = self.conn.execute(
+            "SELECT 1 FROM code_review WHERE version = ? AND prompt = ? AND sha = ? AND provider = ? AND model = ? "
+            "AND review IS NOT NULL AND review != ''",
+            (version, prompt_name, sha, provider, model)
+        ).fetchone()
+        return row is not None
+
+    def has_sha(self, version: str, prompt_name: str, sha: str) -> bool:
+        """
+        Check if any code review was saved for a SHA and prompt.
+        """
+        row = self.conn.execute(
+            "SELECT 1 FROM code_review WHERE version = ? AND prompt = ? AND sha = ? LIMIT 1",
+            (version, prompt_name, sha)
+        ).fetchone()
+        return row is not None
+
+    def get(self, version: str, prompt_name: str, sha: str, provider: str, model: str) -> tuple[bool, str]:
+        """
+        Get a code review.
+
+        Returns:
+            tuple[bool, str]: Whether the code review exists and its text.
+        """
+        row = self.conn.execute(
+            "SELECT review FROM code_review WHERE version = ? AND prompt = ? AND sha = ? AND provider = ? AND model = ?",
+            (version, prompt_name, sha, provider, model)
+        ).fetchone()
+        return (True, row[0]) if row else (False, None)
+
+    def get_reviews(self, version: str, prompt_name: str, sha: str) -> dict:
+        """
+        Get every code review of a SHA and prompt, in the legacy JSON layout:
+        {provider: {model: review}, "prompt_used": prompt} where self-reflection
+        keeps its prompt_used per provider.
+
+        Returns:
+            dict: The code reviews, empty if there are none.
+        """
+        rows = self.conn.execute(
+            "SELECT provider, model, review, prompt_used FROM code_review WHERE version = ? AND prompt = ? AND sha = ? "
+            "ORDER BY provider, model",
+            (version, prompt_name, sha)
+        ).fetchall()
+
+        generated_reviews = {}
+        shared_prompt = None
+        for provider, model, review, prompt_used in rows:
+            generated_reviews[provider] = generated_reviews.get(provider, {})
+            generated_reviews[provider][model] = review
+            if prompt_used is not None:
+                if prompt_name == "self-reflection":
+                    generated_reviews[provider]["prompt_used"] = json.loads(prompt_used)
+                elif shared_prompt is None:
+                    shared_prompt = json.loads(prompt_used)
+        if shared_prompt is not None:
+            generated_reviews["prompt_used"] = shared_prompt
+        return generated_reviews
+
+    def save(self, code_review: str, sha: str, provider: str, model: str, prompt_name: str, version: str, prompt_used=None):
+        """
+        Save a code review. Apart from self-reflection, whose prompt includes the
+        previous review of each model, every model of a SHA and prompt must have
+        been given the same prompt.
+
+        Raises:
+            ValueError: If the prompt used does not match the one already saved.
+        """
+        encoded = json.dumps(prompt_used) if prompt_used else None
+        with self.transaction() as conn:
+            if encoded is not None and prompt_name != "self-reflection":
+                row = conn.execute(
+                    "SELECT prompt_used FROM code_review WHERE version = ? AND prompt = ? AND sha = ? "
+                    "AND prompt_used IS NOT NULL AND NOT (provider = ? AND model = ?) LIMIT 1",
+                    (version, prompt_name, sha, provider, model)
+                ).fetchone()
+                if row and row[0] != encoded:
+                    raise ValueError("Prompt used does not match existing prompt")
+
+            conn.execute(
+                "INSERT INTO code_review (version, prompt, sha, provider, model, review, prompt_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (version, prompt, sha, provider, model) DO UPDATE SET "
+                "review = excluded.review, prompt_used = COALESCE(excluded.prompt_used, code_review.prompt_used)",
+                (version, prompt_name, sha, provider, model, code_review, encoded)
+            )
+
+    def save_many(self, code_reviews: Iterable[tuple[str, str, str, str, str]], version: str) -> int:
+        """
+        Save many code reviews in a single transaction.
+
+        Args:
+            code_reviews (Iterable[tuple[str, str, str, str, str]]): (sha, provider, model, prompt_name, code_review) tuples.
+            version (str): The version of the experiment.
+
+        Returns:
+            int: The number of code reviews saved.
+        """
+        count = 0
+        with self.transaction():
+            for sha, provider, model, prompt_name, code_review in code_reviews:
+                self.save(code_review, sha, provider, model, prompt_name, version)
+                count += 1
+        return count
+
+    def iter_reviews(self, version: str, prompt_names: list[str] = None) -> Iterator[tuple[str, str, str, str, str]]:
+        """
+        Lazily read the code reviews of a version, ordered by prompt and SHA.
+
+        Returns:
+            Iterator[tuple[str, str, str, str, str]]: A generator of (sha, provider, model, prompt_name, code_review) tuples.
+        """
+        cursor = self.conn.execute(
+            "SELECT sha, provider, model, prompt, review FROM code_review WHERE version = ? AND review IS NOT NULL "
+            "ORDER BY prompt, sha, provider, model",
+            (version,)
+        )
+        for row in cursor:
+            if not prompt_names or row[3] in prompt_names:
+                yield row
+
+    def import_json(self, version: str, path: str = "LLMs/Results", force: bool = False) -> int:
+        """
+        Import the legacy JSON results of a version, once.
+
+        Args:
+            version (str): The version of the experiment.
+            path (str): The base path of the legacy results.
+            force (bool): If True, import again even if the version was already imported.
+
+        Returns:
+            int: The number of code reviews imported.
+        """
+        if not force:
+            if version in self.imported:
+                return 0
+            if self.conn.execute("SELECT 1 FROM imported_version WHERE version = ?", (version,)).fetchone():
+                self.imported.add(version)
+                return 0
+
+        count = 0
+        version_folder = os.path.join(path, version)
+        with self.transaction() as conn:
+            if os.path.isdir(version_folder):
+                for prompt_name in sorted(os.listdir(version_folder)):
+                    results_folder = os.path.join(version_folder, prompt_name)
+                    if not os.path.isdir(results_folder):
+                        continue
+                    for f in read_all_files_in_folder(results_folder):
+                        if f.endswith(".json"):
+                            count += self._import_file(conn, version, prompt_name, os.path.splitext(f)[0], read_json_file(results_folder, f))
+            conn.execute("INSERT OR IGNORE INTO imported_version (version) VALUES (?)", (version,))
+        self.imported.add(version)
+        return count
+
+    def _import_file(self, conn: sqlite3.Connection, version: str, prompt_name: str, sha: str, generated_reviews: dict) -> int:
+        """
+        Import the code reviews of one legacy JSON results file.
+        """
+        count = 0
+        shared_prompt = generated_reviews.get("prompt_used")
+        for provider, reviews in generated_reviews.items():
+            if provider == "prompt_used" or not isinstance(reviews, dict):
+                continue
+            prompt_used = reviews.get("prompt_used", shared_prompt)
+            for model, code_review in reviews.items():
+                if model == "prompt_used":
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO code_review (version, prompt, sha, provider, model, review, prompt_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (version, prompt_name, sha, provider, model, code_review, json.dumps(prompt_used) if prompt_used else None)
+                )
+                count += 1
+        return count
+
+    def export_json(self, version: str, path: str = "LLMs/Results") -> int:
+        """
+        Write the code reviews of a version in the legacy JSON layout
+        (<path>/<version>/<prompt>/<sha>.json), for compatibility.
+
+        Returns:
+            int: The number of files written.
+        """
+        rows = self.conn.execute(
+            "SELECT DISTINCT prompt, sha FROM code_review WHERE version = ? ORDER BY prompt, sha",
+            (version,)
+        ).fetchall()
+
+        count = 0
+        for prompt_name, group in groupby(rows, key=lambda row: row[0]):
+            results_folder = os.path.join(path, version, prompt_name)
+            exists_or_create_folder(results_folder)
+            for _, sha in group:
+                write_json_file(results_folder, f"{sha}.json", self.get_reviews(version, prompt_name, sha))
+                count += 1
+        return count
@@ -1,10 +1,17 @@
-from .gh_utils import get_remaining_calls, wait_for_rate_limit_reset, get_commit_details
-from .db_utils import DatabaseConnection
+from .commit_cache import CommitCache
 from .os_utils import exists_or_create_folder, exists_file, read_json_file, write_json_file, read_all_files_in_folder
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 import os
 
+# The database and GitHub modules (SQLAlchemy, psycopg2, requests, aiohttp) are imported
+# when first used, so importing utils stays cheap for callers that only need the LLM or
+# filesystem helpers.
+
 class Utils:
-    def __init__(self, db_host: str, db_user: str, db_password: str, db_port: int, db_name: str):
+    def __init__(self, db_host: str, db_user: str, db_password: str, db_port: int, db_name: str, cache_size: int = 1024, commit_cache_path: str = "LLMs/Results/commits", compression: str = "gzip"):
+
+        from .db_utils import DatabaseConnection
 
         self.db = DatabaseConnection(
             db_host=db_host,
@@ -14,6 +21,22 @@ class Utils:
             db_name=db_name
         )
 
+        # Commit details fetched from GitHub, kept on disk between runs
+        self.commit_cache = CommitCache(commit_cache_path, compression=compression)
+
+        # In-process LRU of the commit details already loaded in this run
+        self.cache_size = cache_size
+        self.commit_infos = OrderedDict()
+
+    def _remember_commit_info(self, sha: str, commit_info: dict):
+        """
+        Keep the commit details in the in-process LRU.
+        """
+        self.commit_infos[sha] = commit_info
+        self.commit_infos.move_to_end(sha)
+        while len(self.commit_infos) > self.cache_size:
+            self.commit_infos.popitem(last=False)
+
     @staticmethod
     def generated_prompt_model(sha, model, prompt_name, version):
         # Check if the result already exists
@@ -75,8 +98,9 @@ class Utils:
             print(f"Using {len(shas)} shas from the file for version {version}.")
             return shas
 
-        # If we don't have enough shas, get more from the database
-        more_shas = self.db.get_vulnerability_fixes(version)
+        # If we don't have enough shas, get more from the database.
+        # The version seeds the sampling, so reruns pick the same commits.
+        more_shas = self.db.get_vulnerability_fixes(version, limit=limit + len(shas) if limit > 0 else 0, seed=version)
 
         # Add the new shas to the existing ones
         shas = list(dict.fromkeys(shas))
@@ -100,17 +124,18 @@ class Utils:
         Returns:
             dict: The commit details.
         """
-        if exists_file("LLMs/Results", f"{sha}.json"):
-            commit_info = read_json_file("LLMs/Results", f"{sha}.json")
+        if sha in self.commit_infos:
+            self.commit_infos.move_to_end(sha)
+            return self.commit_infos[sha]
+
+        commit_info = self.commit_cache.get(sha)
+        if commit_info is not None:
+            self._remember_commit_info(sha, commit_info)
             return commit_info
         
-        repo_info = self.db.get_commit_info(sha)
+        from .gh_utils import get_commit_details
 
-        while True:
-            remaining_calls = get_remaining_calls()
-            if remaining_calls > 5:
-                break
-            wait_for_rate_limit_reset()
+        repo_info = self.db.get_commit_info(sha)
 
         commit_info = get_commit_details(
             owner=repo_info['owner'],
@@ -118,10 +143,70 @@ class Utils:
             sha=sha
         )
 
-        write_json_file("LLMs/Results", f"{sha}.json", commit_info)
+        self.commit_cache.put(sha, commit_info)
+        self._remember_commit_info(sha, commit_info)
 
         return commit_info
 
+    def get_commit_infos(self, shas: list[str], max_workers: int = 8) -> dict:
+        """
+        Get the commit details of many SHAs at once.
+        Cached files are loaded in parallel, the repositories of the missing commits are
+        resolved with a single query and those commits are fetched from GitHub concurrently.
+
+        Args:
+            shas (list[str]): The commit SHAs.
+            max_workers (int): The number of cached files loaded in parallel.
+
+        Returns:
+            dict: The commit details keyed by SHA.
+        """
+        commit_infos = {}
+        pending = []
+        for sha in dict.fromkeys(shas):
+            if sha in self.commit_infos:
+                self.commit_infos.move_to_end(sha)
+                commit_infos[sha] = self.commit_infos[sha]
+            else:
+                pending.append(sha)
+
+        # Pick up the commits stored by other processes once for the whole batch
+        self.commit_cache.refresh()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            loaded = list(executor.map(self.commit_cache.get, pending))
+
+        misses = []
+        for sha, commit_info in zip(pending, loaded):
+            if commit_info is None:
+                misses.append(sha)
+            else:
+                commit_infos[sha] = commit_info
+
+        if misses:
+            from .gh_client import fetch_commits_details
+
+            repo_infos = self.db.get_commit_infos(misses)
+            unknown = [sha for sha in misses if sha not in repo_infos]
+            if unknown:
+                raise ValueError(f"Commits not found in the database: {', '.join(unknown)}")
+
+            fetched = fetch_commits_details([(repo_infos[sha]['owner'], repo_infos[sha]['name'], sha) for sha in misses])
+            failed = {}
+            for sha, commit_info in fetched.items():
+                if isinstance(commit_info, Exception):
+                    failed[sha] = commit_info
+                    continue
+                self.commit_cache.put(sha, commit_info)
+                commit_infos[sha] = commit_info
+
+            if failed:
+                raise Exception(f"Failed to fetch {len(failed)} commits:\n" + "\n".join(str(e) for e in failed.values()))
+
+        for sha, commit_info in commit_infos.items():
+            self._remember_commit_info(sha, commit_info)
+
+        return {sha: commit_infos[sha] for sha in dict.fromkeys(shas)}
+
     def get_commit_details_by_name(self, owner: str, repo: str, sha: str) -> dict:
         """
         Get the commit details for a given SHA.
@@ -133,6 +218,8 @@ class Utils:
         Returns:
             dict: The commit details.
         """
+        from .gh_utils import get_commit_details
+
         return get_commit_details(owner, repo, sha)
 
     def get_vulnerability_commits(self, generated: bool = True, limit: int = 0) -> list[dict]:
@@ -147,6 +234,22 @@ class Utils:
         """
         return self.db.get_vulnerability_commits(generated, limit)
     
+    def iter_vulnerability_commits(self, generated: bool = True, limit: int = 0, after_sha: str = None, itersize: int = 100, page_size: int = 1000):
+        """
+        Lazily get the vulnerability-fixing commits from the database, ordered by SHA,
+        so generation can start with the first commit.
+
+        Args:
+            generated (bool): If True, include those already generated.
+            limit (int): The maximum number of commits to retrieve (0 for no limit).
+            after_sha (str): Only retrieve commits with a SHA greater than this one, to resume a run.
+            itersize (int): The number of rows fetched from the server per round trip.
+            page_size (int): The number of commits read per server-side cursor.
+        Returns:
+            Iterator[dict]: A generator of vulnerability-fixing commit information.
+        """
+        return self.db.iter_vulnerability_commits(generated, limit, after_sha, itersize, page_size)
+
     def save_generated_code_review(self, sha: str, code_review: str):
         """
         Save the generated code review to the database.
@@ -155,4 +258,16 @@ class Utils:
             sha (str): The commit SHA.
             code_review (str): The generated code review.
         """
-        self.db.save_generated_code_review(sha, code_review)
\ No newline at end of file
+        self.db.save_generated_code_review(sha, code_review)
+
+    def save_generated_code_reviews(self, reviews: list[tuple[str, str]], batch_size: int = 500) -> dict:
+        """
+        Save many generated code reviews to the database in a single transaction.
+
+        Args:
+            reviews (list[tuple[str, str]]): A list of (sha, code_review) tuples.
+            batch_size (int): The number of rows sent per statement.
+        Returns:
+            dict: The number of rows inserted, updated and skipped.
+        """
+        return self.db.save_generated_code_reviews(reviews, batch_size)